@@ -1,4 +1,6 @@
 import os
+import sys
+import importlib
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
@@ -18,12 +20,24 @@ def create_app(config_class=Config):
     os.makedirs(app.config["REPORTS_FOLDER"], exist_ok=True)
 
     with app.app_context():
-        from . import models, views, utils, notifications
+        already_imported = __name__ + ".views" in sys.modules
+        from . import models, views, utils, notifications, scheduler, rollups, search, importer, charts, balances, budget_tracking, unread, events, retention, cache
+        # маршруты регистрируются на current_app при импорте views —
+        # для второго экземпляра приложения (тесты) модуль нужно перезагрузить
+        if already_imported and "index" not in app.view_functions:
+            importlib.reload(views)
         db.create_all()
-        # generate recurring occurrences up to today
-        try:
-            utils.generate_recurring_occurrences()
-        except Exception:
-            pass
+        rollups.init_app(app)
+        search.init_app(app)
+        importer.init_app(app)
+        charts.init_app(app)
+        balances.init_app(app)
+        budget_tracking.init_app(app)
+        unread.init_app(app)
+        events.init_app(app)
+        retention.init_app(app)
+        cache.init_app(app)
+        # повторяющиеся операции и уведомления генерирует фоновый планировщик
+        scheduler.init_app(app)
 
     return app
@@ -0,0 +1,117 @@
+"""
+История баланса счёта и общего капитала во времени.
+
+Нарастающий итог считается в SQL оконной функцией ``SUM(SUM(amount)) OVER (ORDER BY day)``
+по дням с операциями, начальная точка — баланс на день до начала периода
+(снимок + операции после него, см. app/balances.py). Дни без операций дозаполняются
+в NumPy, затем ряд сворачивается по шагу: для каждого интервала — баланс на его конец,
+минимум и максимум. Если интервалов больше MAX_POINTS, соседние объединяются.
+
+Общий капитал — все активные счета пользователя плюс активные долги: долг, который
+должны мне, со знаком плюс, мой долг — со знаком минус. Истории погашений у долгов нет,
+поэтому долг входит в капитал текущим остатком начиная с дня создания.
+"""
+from datetime import datetime, timedelta
+from math import ceil
+
+import numpy as np
+from sqlalchemy import case, func, union_all
+
+from .models import db, Account, Debt, DebtType, Transaction
+from .balances import balance_on, balances_on, signed_column
+from .series import GRANULARITIES, bucket_starts
+
+MAX_POINTS = 2000
+MAX_DAYS = 366 * 50
+
+
+def _day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def _running(events):
+    """Дни с движениями и нарастающий итог по ним (оконная функция)"""
+    ev = events.subquery()
+    q = db.select(ev.c.day, func.sum(func.sum(ev.c.amount)).over(order_by=ev.c.day)).group_by(
+        ev.c.day).order_by(ev.c.day)
+    rows = db.session.execute(q).all()
+    days = np.array([day for day, _ in rows], dtype='datetime64[D]')
+    running = np.array([total or 0.0 for _, total in rows], dtype=float)
+    return days, running
+
+
+def _tx_events(start, end):
+    tx = Transaction.__table__
+    return db.select(func.date(tx.c.date).label('day'), signed_column(tx).label('amount')).where(
+        tx.c.date >= _day_start(start), tx.c.date < _day_start(end + timedelta(days=1)))
+
+
+def _validate(start, end, step):
+    if step not in GRANULARITIES:
+        raise ValueError(f"step: одно из {', '.join(GRANULARITIES)}")
+    if start > end:
+        raise ValueError("Начало периода позже конца")
+    if (end - start).days >= MAX_DAYS:
+        raise ValueError("Слишком длинный период")
+
+
+def _sample(base, event_days, running, start, end, step):
+    """Дневной ряд base + нарастающий итог, свёрнутый по шагу"""
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    if len(event_days):
+        idx = np.searchsorted(event_days, days, side='right') - 1
+        daily = base + np.where(idx >= 0, running[np.maximum(idx, 0)], 0.0)
+    else:
+        daily = np.full(len(days), float(base))
+
+    # первая неделя/месяц может начинаться раньше start — такой интервал начинается с 0
+    pos = np.unique(np.searchsorted(days, bucket_starts(start, end, step)))
+    if len(pos) > MAX_POINTS:
+        pos = pos[::ceil(len(pos) / MAX_POINTS)]
+    ends = np.append(pos[1:], len(days)) - 1
+    return {
+        'step': step,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'dates': [str(d) for d in days[ends]],
+        'balance': np.round(daily[ends], 2).tolist(),
+        'min': np.round(np.minimum.reduceat(daily, pos), 2).tolist(),
+        'max': np.round(np.maximum.reduceat(daily, pos), 2).tolist(),
+    }
+
+
+def account_history(account_id, start, end, step='day'):
+    """Баланс счёта на конец каждого интервала [start, end]"""
+    _validate(start, end, step)
+    base = balance_on(account_id, start - timedelta(days=1))
+    events = _tx_events(start, end).where(Transaction.__table__.c.account_id == account_id)
+    return _sample(base or 0.0, *_running(events), start, end, step)
+
+
+def _debt_value():
+    remaining = case((Debt.debt_type == DebtType.credit_card, func.coalesce(Debt.current_balance, 0.0)),
+                     else_=Debt.amount - Debt.paid_amount)
+    return case((Debt.is_owed_to_me == True, remaining), else_=-remaining)
+
+
+def net_worth_history(user_id, start, end, step='day'):
+    """Сумма активных счетов и активных долгов на конец каждого интервала"""
+    _validate(start, end, step)
+    base = sum(balances_on(start - timedelta(days=1), user_id).values())
+
+    tx = Transaction.__table__
+    active = db.select(Account.id).where(Account.is_active == True)
+    if user_id is not None:
+        active = active.where(Account.user_id == user_id)
+    accounts_events = _tx_events(start, end).where(tx.c.account_id.in_(active))
+    # долги, созданные до начала периода, попадают в его первый день
+    start_str = start.isoformat()
+    debts_events = db.select(
+        func.max(func.coalesce(func.date(Debt.created_at), start_str), start_str).label('day'),
+        _debt_value().label('amount'),
+    ).where(Debt.is_active == True, db.or_(
+        Debt.created_at == None, Debt.created_at < _day_start(end + timedelta(days=1))))
+    if user_id is not None:
+        debts_events = debts_events.where(Debt.user_id == user_id)
+
+    return _sample(base, *_running(union_all(accounts_events, debts_events)), start, end, step)
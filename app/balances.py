@@ -0,0 +1,235 @@
+"""
+Балансы счетов по журналу операций.
+
+Источник истины — журнал: баланс = opening_balance + сумма операций по счёту
+(доходы со знаком плюс, расходы — минус). Колонка accounts.balance — кэш этой суммы.
+Изменения Transaction за flush (app/tracking.py) переводятся в приращения и применяются
+в той же транзакции выражением ``balance = balance + :delta`` — без чтения-изменения-записи
+в Python, поэтому параллельные запросы не затирают изменения друг друга. Код, который пишет операции
+в обход ORM, должен сам вызвать apply_deltas().
+
+Баланс на дату берётся из дневных снимков account_snapshots (баланс на конец дня):
+последний снимок не позже нужного дня плюс операции после него. Снимки за прошедший
+день пишет планировщик (take_snapshots); запись операции задним числом удаляет снимки
+счёта начиная с её дня. Сверка кэша с журналом — ``flask --app run verify-balances``.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import case, event, func
+from sqlalchemy.orm import Session
+
+from .models import db, Account, AccountSnapshot, Transaction, TransactionType
+from . import events, tracking
+
+_FIELDS = ('account_id', 'date', 'type', 'amount')
+TOLERANCE = 0.005
+
+
+def signed_amount(type_, amount):
+    return (amount or 0.0) if type_ == TransactionType.income else -(amount or 0.0)
+
+
+def signed_column(table=None):
+    """SQL-выражение суммы операции со знаком"""
+    c = table.c if table is not None else Transaction
+    return case((c.type == TransactionType.income, c.amount), else_=-c.amount)
+
+
+def _day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def new_deltas():
+    """account_id -> [приращение баланса, самая ранняя затронутая дата]"""
+    return defaultdict(lambda: [0.0, None])
+
+
+def add_delta(deltas, account_id, when, amount, sign=1):
+    """amount — сумма со знаком (доход +, расход -) операций счёта начиная с when"""
+    if account_id is None or when is None:
+        return
+    entry = deltas[account_id]
+    entry[0] += sign * (amount or 0.0)
+    if entry[1] is None or when < entry[1]:
+        entry[1] = when
+
+
+def apply_deltas(deltas, connection=None):
+    """Сдвигает кэш балансов, удаляет снимки, которые операции сделали устаревшими,
+    и ставит в очередь событие balance для открытых страниц владельца"""
+    conn = connection if connection is not None else db.session.connection()
+    accounts = Account.__table__
+    snapshots = AccountSnapshot.__table__
+    changed = [{'acc_id': acc_id, 'delta': delta} for acc_id, (delta, _) in deltas.items() if delta]
+    if changed:
+        conn.execute(
+            accounts.update().where(accounts.c.id == db.bindparam('acc_id')).values(
+                balance=accounts.c.balance + db.bindparam('delta')),
+            changed,
+        )
+        touched = conn.execute(db.select(accounts.c.id, accounts.c.user_id, accounts.c.balance).where(
+            accounts.c.id.in_([p['acc_id'] for p in changed])))
+        for acc_id, user_id, balance in touched:
+            events.emit('balance', user_id, {'account_id': acc_id, 'balance': round(balance, 2),
+                                             'delta': round(deltas[acc_id][0], 2)})
+    # даже при нулевом приращении (перенос даты) история счёта изменилась
+    stale = [{'acc_id': acc_id, 'since': when.date() if isinstance(when, datetime) else when}
+             for acc_id, (_, when) in deltas.items()]
+    if stale:
+        conn.execute(
+            snapshots.delete().where(
+                snapshots.c.account_id == db.bindparam('acc_id'),
+                snapshots.c.day >= db.bindparam('since'),
+            ),
+            stale,
+        )
+
+
+def _add(deltas, values, sign=1):
+    add_delta(deltas, values.account_id, values.date, signed_amount(values.type, values.amount), sign)
+
+
+@tracking.on_flush
+def _apply_balance_deltas(session, changes):
+    deltas = new_deltas()
+    for old, new in tracking.changed(changes, _FIELDS):
+        if old is not None:
+            _add(deltas, old, sign=-1)
+        if new is not None:
+            _add(deltas, new)
+    if deltas:
+        apply_deltas(deltas, session.connection())
+        session.info.setdefault('_balance_touched', set()).update(deltas)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_balances(session, flush_context):
+    # загруженные в сессию счета должны перечитать баланс, изменённый в SQL
+    for acc_id in session.info.pop('_balance_touched', ()):
+        acc = session.identity_map.get(db.inspect(Account).identity_key_from_primary_key((acc_id,)))
+        if acc is not None:
+            session.expire(acc, ['balance'])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session):
+    session.info.pop('_balance_touched', None)
+
+
+@event.listens_for(Account, "before_insert")
+def _default_opening_balance(mapper, connection, target):
+    # баланс, указанный при создании счёта, и есть начальный
+    if target.opening_balance is None:
+        target.opening_balance = target.balance or 0.0
+
+
+# --- Чтение ---
+
+def balance_on(account_id, day):
+    """Баланс счёта на конец дня: последний снимок не позже day + операции после него"""
+    snap = AccountSnapshot.query.filter(
+        AccountSnapshot.account_id == account_id, AccountSnapshot.day <= day
+    ).order_by(AccountSnapshot.day.desc()).first()
+    if snap is not None:
+        base, since = snap.balance, _day_start(snap.day + timedelta(days=1))
+    else:
+        base = db.session.query(Account.opening_balance).filter(Account.id == account_id).scalar()
+        if base is None:
+            return None
+        since = None
+    q = db.session.query(func.coalesce(func.sum(signed_column()), 0.0)).filter(
+        Transaction.account_id == account_id,
+        Transaction.date < _day_start(day + timedelta(days=1)),
+    )
+    if since is not None:
+        q = q.filter(Transaction.date >= since)
+    return float(base) + float(q.scalar())
+
+
+def balances_on(day, user_id=None, active_only=True):
+    """{account_id: баланс на конец дня} для счетов пользователя одним запросом:
+    для каждого счёта — последний снимок не позже day плюс операции после него"""
+    accounts = Account.__table__
+    tx = Transaction.__table__
+    snapshots = AccountSnapshot.__table__
+    latest_day = db.select(func.max(snapshots.c.day)).where(
+        snapshots.c.account_id == accounts.c.id, snapshots.c.day <= day).scalar_subquery()
+    snap = snapshots.alias('snap')
+    delta = db.select(func.coalesce(func.sum(signed_column(tx)), 0.0)).where(
+        tx.c.account_id == accounts.c.id,
+        tx.c.date < _day_start(day + timedelta(days=1)),
+        db.or_(snap.c.day == None, func.date(tx.c.date) > snap.c.day),
+    ).scalar_subquery()
+    q = db.select(accounts.c.id, func.coalesce(snap.c.balance, accounts.c.opening_balance) + delta).select_from(
+        accounts.outerjoin(snap, db.and_(snap.c.account_id == accounts.c.id, snap.c.day == latest_day)))
+    if user_id is not None:
+        q = q.where(accounts.c.user_id == user_id)
+    if active_only:
+        q = q.where(accounts.c.is_active == True)
+    return {acc_id: float(balance) for acc_id, balance in db.session.execute(q)}
+
+
+def take_snapshots(day):
+    """Снимки балансов всех счетов на конец дня одним INSERT ... SELECT; возвращает число новых строк"""
+    accounts = Account.__table__
+    tx = Transaction.__table__
+    snapshots = AccountSnapshot.__table__
+    ledger = db.select(
+        accounts.c.id,
+        db.literal(day, AccountSnapshot.day.type),
+        accounts.c.opening_balance + func.coalesce(func.sum(signed_column(tx)), 0.0),
+    ).select_from(accounts.outerjoin(tx, db.and_(
+        tx.c.account_id == accounts.c.id,
+        tx.c.date < _day_start(day + timedelta(days=1)),
+    ))).where(~db.exists().where(
+        snapshots.c.account_id == accounts.c.id, snapshots.c.day == day,
+    )).group_by(accounts.c.id, accounts.c.opening_balance)
+    res = db.session.execute(snapshots.insert().from_select(['account_id', 'day', 'balance'], ledger))
+    return res.rowcount
+
+
+def ledger_balances():
+    """[(account_id, name, кэш balance, баланс по журналу)] всех счетов — один GROUP BY"""
+    ledger = Account.opening_balance + func.coalesce(func.sum(signed_column()), 0.0)
+    q = db.session.query(Account.id, Account.name, Account.balance, ledger).outerjoin(
+        Transaction, Transaction.account_id == Account.id
+    ).group_by(Account.id, Account.name, Account.balance, Account.opening_balance).order_by(Account.id)
+    return [(acc_id, name, float(balance), float(expected)) for acc_id, name, balance, expected in q]
+
+
+def verify():
+    """Счета, у которых кэш баланса расходится с журналом"""
+    return [row for row in ledger_balances() if abs(row[2] - row[3]) > TOLERANCE]
+
+
+def rebuild():
+    """Пересчитывает кэш балансов всех счетов по журналу одним UPDATE"""
+    accounts = Account.__table__
+    tx = Transaction.__table__
+    total = db.select(func.coalesce(func.sum(signed_column(tx)), 0.0)).where(
+        tx.c.account_id == accounts.c.id).scalar_subquery()
+    db.session.execute(accounts.update().values(balance=accounts.c.opening_balance + total))
+    db.session.commit()
+
+
+@click.command("verify-balances")
+@click.option("--fix", is_flag=True, help="Пересчитать расходящиеся балансы по журналу")
+def verify_balances_command(fix):
+    """Сверяет балансы всех счетов с журналом операций"""
+    mismatched = verify()
+    for acc_id, name, balance, expected in mismatched:
+        click.echo(f"#{acc_id} {name}: {balance:.2f}, по журналу {expected:.2f}")
+    if not mismatched:
+        click.echo("Балансы сходятся")
+        return
+    if fix:
+        rebuild()
+        click.echo(f"Исправлено счетов: {len(mismatched)}")
+        return
+    raise SystemExit(1)
+
+
+def init_app(app):
+    app.cli.add_command(verify_balances_command)
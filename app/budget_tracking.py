@@ -0,0 +1,136 @@
+"""
+Потраченное по бюджетам, посчитанное в момент записи.
+
+budgets.spent — сумма расходов владельца бюджета в его категории за его период: категории
+бывают общими, поэтому операции сопоставляются с бюджетом и по пользователю. Изменения Transaction
+за flush (app/tracking.py) переводятся в приращения ``spent = spent + :delta`` для бюджетов,
+в период которых попадает операция, и тут же, в той же транзакции, создаются предупреждения
+по бюджетам, перешедшим 80%/100%.
+Страницы бюджетов и проверка предупреждений читают готовое значение без просмотра операций.
+
+Код, который пишет операции в обход ORM, должен сам вызвать apply_deltas().
+Новый бюджет получает начальное значение одним SUM в том же flush.
+Для существующей базы колонку заполняет ``python migrate_budget_spent.py``,
+полный пересчёт — ``flask --app run rebuild-budgets``.
+"""
+from collections import defaultdict
+
+import click
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from .models import db, Budget, Transaction, TransactionType
+from .notifications import budget_warnings
+from . import tracking
+
+_FIELDS = ('user_id', 'category_id', 'date', 'type', 'amount')
+
+
+def new_deltas():
+    """(user_id, category_id, дата операции) -> сумма расходов"""
+    return defaultdict(float)
+
+
+def add_delta(deltas, user_id, category_id, when, type_, amount, sign=1):
+    if category_id is None or when is None or type_ != TransactionType.expense:
+        return
+    deltas[(user_id, category_id, when)] += sign * (amount or 0.0)
+
+
+def _shift_spent(conn, deltas):
+    """UPDATE spent по приращениям; возвращает {user_id: затронутые категории}"""
+    table = Budget.__table__
+    params = [{'owner': user_id, 'cat_id': cat_id, 'when': when, 'delta': delta}
+              for (user_id, cat_id, when), delta in deltas.items() if delta]
+    if not params:
+        return {}
+    conn.execute(
+        table.update().where(
+            # IS, а не =: операции без владельца относятся к бюджетам без владельца
+            table.c.user_id.is_not_distinct_from(db.bindparam('owner')),
+            table.c.category_id == db.bindparam('cat_id'),
+            table.c.period_start <= db.bindparam('when'),
+            table.c.period_end >= db.bindparam('when'),
+        ).values(spent=table.c.spent + db.bindparam('delta')),
+        params,
+    )
+    touched = {}
+    for p in params:
+        touched.setdefault(p['owner'], set()).add(p['cat_id'])
+    return touched
+
+
+def _warn(conn, touched):
+    for user_id, categories in touched.items():
+        budget_warnings(conn, category_ids=categories, user_id=user_id)
+
+
+def apply_deltas(deltas, connection=None):
+    """Сдвигает spent у бюджетов, в период которых попадают операции, и создаёт предупреждения"""
+    conn = connection if connection is not None else db.session.connection()
+    _warn(conn, _shift_spent(conn, deltas))
+
+
+def _spent_in_period(budgets):
+    tx = Transaction.__table__
+    return db.select(func.coalesce(func.sum(tx.c.amount), 0.0)).where(
+        tx.c.user_id.is_not_distinct_from(budgets.c.user_id),
+        tx.c.category_id == budgets.c.category_id,
+        tx.c.type == TransactionType.expense,
+        tx.c.date >= budgets.c.period_start,
+        tx.c.date <= budgets.c.period_end,
+    ).scalar_subquery()
+
+
+@tracking.on_flush
+def _apply_budget_deltas(session, changes):
+    deltas = new_deltas()
+    for old, new in tracking.changed(changes, _FIELDS):
+        if old is not None:
+            add_delta(deltas, old.user_id, old.category_id, old.date, old.type, old.amount, sign=-1)
+        if new is not None:
+            add_delta(deltas, new.user_id, new.category_id, new.date, new.type, new.amount)
+    new_budgets = [obj.id for obj in session.new if isinstance(obj, Budget)]
+    if not deltas and not new_budgets:
+        return
+    conn = session.connection()
+    touched = _shift_spent(conn, deltas)
+    if new_budgets:
+        # начальное значение — после приращений: операции этого же flush уже в таблице
+        table = Budget.__table__
+        conn.execute(table.update().where(table.c.id.in_(new_budgets)).values(spent=_spent_in_period(table)))
+        budget_warnings(conn, budget_ids=new_budgets)
+    _warn(conn, touched)
+    session.info['_budget_touched'] = True
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_budgets(session, flush_context):
+    # spent у загруженных бюджетов изменён в SQL
+    if session.info.pop('_budget_touched', False):
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Budget):
+                session.expire(obj, ['spent'])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session):
+    session.info.pop('_budget_touched', None)
+
+
+def rebuild():
+    """Пересчитывает spent всех бюджетов одним UPDATE"""
+    table = Budget.__table__
+    db.session.execute(table.update().values(spent=_spent_in_period(table)))
+    db.session.commit()
+
+
+@click.command("rebuild-budgets")
+def rebuild_budgets_command():
+    """Пересчитывает потраченное по всем бюджетам"""
+    rebuild()
+    click.echo(f"Бюджетов: {Budget.query.count()}")
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_budgets_command)
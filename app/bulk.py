@@ -0,0 +1,159 @@
+"""
+Массовое изменение и удаление операций множественными UPDATE/DELETE.
+
+Выбранные id обрабатываются пачками по BATCH_SIZE (ограничение SQLite на число
+параметров). Для каждой пачки одним сгруппированным запросом считаются изменения
+балансов счетов и помесячных агрегатов, затем выполняется один UPDATE/DELETE
+``WHERE id IN (...) AND user_id = ?``. Всё идёт в одной транзакции вызывающего кода:
+приращения применяются через balances.apply_deltas(), rollups.apply_deltas()
+и budget_tracking.apply_deltas().
+"""
+from datetime import date
+
+from sqlalchemy import func
+
+from .models import db, Account, Category, PlannedExpense, Transaction, TransactionType, transaction_tags
+from . import balances, budget_tracking, cache, rollups
+
+BATCH_SIZE = 500
+
+
+class BulkError(ValueError):
+    pass
+
+
+def parse_ids(raw_ids):
+    """Список id из JSON (строки или числа) без повторов"""
+    try:
+        return sorted({int(i) for i in raw_ids or []})
+    except (TypeError, ValueError):
+        raise BulkError("Некорректный список операций")
+
+
+def _batches(ids):
+    for i in range(0, len(ids), BATCH_SIZE):
+        yield ids[i:i + BATCH_SIZE]
+
+
+def _scope(q, user_id, batch):
+    return q.filter(Transaction.id.in_(batch), Transaction.user_id == user_id)
+
+
+def _account_deltas(user_id, batch, balance_deltas, sign, exclude_account=None):
+    """Вклад операций пачки в балансы их счетов (sign=-1 — откатить).
+    Возвращает общую сумму учтённых операций (включая операции без счёта) и самую раннюю их дату"""
+    q = _scope(db.session.query(
+        Transaction.account_id, func.sum(balances.signed_column()), func.min(Transaction.date)
+    ), user_id, batch)
+    if exclude_account is not None:
+        q = q.filter(db.or_(Transaction.account_id == None, Transaction.account_id != exclude_account))
+    moved, earliest = 0.0, None
+    for account_id, total, first in q.group_by(Transaction.account_id):
+        total = float(total or 0)
+        moved += total
+        earliest = first if earliest is None else min(earliest, first)
+        balances.add_delta(balance_deltas, account_id, first, total, sign)
+    return moved, earliest
+
+
+def _rollup_deltas(user_id, batch, deltas, sign, new_category=None, exclude_category=None):
+    """Вклад операций пачки в помесячные агрегаты; new_category — перенести в эту категорию"""
+    month = func.date(Transaction.date, 'start of month')
+    q = _scope(db.session.query(
+        month, Transaction.category_id, Transaction.type, func.sum(Transaction.amount), func.count(Transaction.id)
+    ), user_id, batch)
+    if exclude_category is not None:
+        q = q.filter(db.or_(Transaction.category_id == None, Transaction.category_id != exclude_category))
+    for month_value, category_id, type_, total, count in q.group_by(month, Transaction.category_id, Transaction.type):
+        month_value = date.fromisoformat(month_value)
+        rollups.add_delta(deltas, user_id, month_value, category_id, type_, total, sign, count)
+        if new_category is not None:
+            rollups.add_delta(deltas, user_id, month_value, new_category, type_, total, -sign, count)
+
+
+def _budget_deltas(user_id, batch, deltas, sign, new_category=None, exclude_category=None):
+    """Вклад расходов пачки в потраченное по бюджетам (по категории и дате операции)"""
+    q = _scope(db.session.query(
+        Transaction.category_id, Transaction.date, func.sum(Transaction.amount)
+    ), user_id, batch).filter(Transaction.type == TransactionType.expense)
+    if exclude_category is not None:
+        q = q.filter(db.or_(Transaction.category_id == None, Transaction.category_id != exclude_category))
+    for category_id, when, total in q.group_by(Transaction.category_id, Transaction.date):
+        budget_tracking.add_delta(deltas, user_id, category_id, when, TransactionType.expense, total, sign)
+        if new_category is not None:
+            budget_tracking.add_delta(deltas, user_id, new_category, when, TransactionType.expense, total, -sign)
+
+
+def _available(model, obj_id, user_id):
+    """Категория/счёт пользователя или общая (без владельца)"""
+    return db.session.query(model.query.filter(
+        model.id == obj_id, db.or_(model.user_id == user_id, model.user_id == None)
+    ).exists()).scalar()
+
+
+def bulk_update(user_id, ids, category_id=None, account_id=None):
+    """Меняет категорию и/или счёт у операций пользователя; возвращает число изменённых строк"""
+    try:
+        category_id = int(category_id) if category_id else None
+        account_id = int(account_id) if account_id else None
+    except (TypeError, ValueError):
+        raise BulkError("Некорректная категория или счёт")
+    values = {}
+    if category_id:
+        if not _available(Category, category_id, user_id):
+            raise BulkError("Категория не найдена")
+        values['category_id'] = category_id
+    if account_id:
+        if not _available(Account, account_id, user_id):
+            raise BulkError("Счёт не найден")
+        values['account_id'] = account_id
+    if not values:
+        raise BulkError("Не выбрано поле для изменения")
+
+    balance_deltas = balances.new_deltas()
+    deltas = rollups.new_deltas()
+    budget_deltas = budget_tracking.new_deltas()
+    table = Transaction.__table__
+    updated = 0
+    for batch in _batches(ids):
+        if account_id:
+            # снимаем с прежних счетов, всё вместе (и операции без счёта) — на новый
+            moved, earliest = _account_deltas(user_id, batch, balance_deltas, -1, exclude_account=account_id)
+            balances.add_delta(balance_deltas, account_id, earliest, moved)
+        if category_id:
+            _rollup_deltas(user_id, batch, deltas, -1, new_category=category_id, exclude_category=category_id)
+            _budget_deltas(user_id, batch, budget_deltas, -1, new_category=category_id,
+                           exclude_category=category_id)
+        res = db.session.execute(
+            table.update().where(table.c.id.in_(batch), table.c.user_id == user_id).values(**values))
+        updated += res.rowcount
+    balances.apply_deltas(balance_deltas)
+    rollups.apply_deltas(deltas)
+    budget_tracking.apply_deltas(budget_deltas)
+    cache.touch([user_id])
+    return updated
+
+
+def bulk_delete(user_id, ids):
+    """Удаляет операции пользователя, откатывая их вклад в балансы и агрегаты; возвращает число строк"""
+    balance_deltas = balances.new_deltas()
+    deltas = rollups.new_deltas()
+    budget_deltas = budget_tracking.new_deltas()
+    table = Transaction.__table__
+    owned = db.select(table.c.id).where(table.c.user_id == user_id)
+    deleted = 0
+    for batch in _batches(ids):
+        _account_deltas(user_id, batch, balance_deltas, -1)
+        _rollup_deltas(user_id, batch, deltas, -1)
+        _budget_deltas(user_id, batch, budget_deltas, -1)
+        own_batch = owned.where(table.c.id.in_(batch))
+        db.session.execute(transaction_tags.delete().where(transaction_tags.c.transaction_id.in_(own_batch)))
+        db.session.execute(PlannedExpense.__table__.update().where(
+            PlannedExpense.__table__.c.transaction_id.in_(own_batch)).values(transaction_id=None))
+        res = db.session.execute(table.delete().where(table.c.id.in_(batch), table.c.user_id == user_id))
+        deleted += res.rowcount
+    balances.apply_deltas(balance_deltas)
+    rollups.apply_deltas(deltas)
+    budget_tracking.apply_deltas(budget_deltas)
+    cache.touch([user_id])
+    return deleted
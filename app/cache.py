@@ -0,0 +1,255 @@
+"""
+Кеш результатов страниц и JSON-ответов по версии данных пользователя.
+
+Ключ — (пользователь, версия данных, endpoint, аргументы, сегодняшняя дата). Версия хранится
+в data_versions (owner_id = user_id, 0 — общие данные без владельца) и увеличивается в
+after_flush для каждого владельца изменённых строк, поэтому после любой записи старые
+ответы просто перестают совпадать по ключу и вытесняются сами. Запись в обход ORM
+(INSERT ... SELECT, массовые UPDATE) отмечается через touch().
+
+Бэкенды:
+- LocalBackend — LRU в памяти процесса с ограничением по числу записей и объёму;
+- SharedBackend — общий для воркеров кеш поверх клиента с интерфейсом redis (get/set с ex=),
+  включается RESULT_CACHE_URL.
+Счётчики попаданий и промахов по endpoint — ResultCache.stats(), у ответа — заголовок X-Cache.
+
+Тот же ключ даёт strong ETag JSON-ответов (conditional): совпавший If-None-Match получает 304
+до выполнения представления, то есть без агрегирующих запросов.
+"""
+import hashlib
+import pickle
+import threading
+from collections import Counter, OrderedDict
+from datetime import date
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, g as flask_g, has_app_context, make_response, request, session as flask_session
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from .models import db, DataVersion, NotificationCounter, SchedulerWatermark
+
+# служебные таблицы: их изменения не видны на страницах
+_IGNORED = (DataVersion, NotificationCounter, SchedulerWatermark)
+
+_BUMP = text("INSERT INTO data_versions (owner_id, version) VALUES (:owner, 1) "
+             "ON CONFLICT (owner_id) DO UPDATE SET version = version + 1")
+
+
+class LocalBackend:
+    """LRU в памяти процесса: не больше max_entries записей и max_bytes байт тел ответов"""
+
+    def __init__(self, max_entries=512, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        # срок жизни не нужен: устаревшие по версии записи вытесняются LRU
+        size = len(value[1])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._data[key] = value
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted[1])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+class SharedBackend:
+    """Общий кеш воркеров: client — redis.Redis или совместимый (get(key), set(key, value, ex=ttl))"""
+
+    def __init__(self, client, prefix="budget:result:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+    def clear(self):
+        # записи прежних версий истекают по RESULT_CACHE_TTL
+        pass
+
+
+class ResultCache:
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get(self, endpoint, key):
+        value = self.backend.get(key)
+        (self.hits if value is not None else self.misses)[endpoint] += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            'endpoints': {name: {'hits': self.hits[name], 'misses': self.misses[name]}
+                          for name in sorted(set(self.hits) | set(self.misses))},
+        }
+
+
+def _owner(user_id):
+    return user_id if user_id is not None else 0
+
+
+def result_cache():
+    return current_app.extensions.get("result_cache") if has_app_context() else None
+
+
+def data_version(user_id):
+    """Версия данных пользователя вместе с общими (строки без владельца видны всем): 'N.M'"""
+    owner = _owner(user_id)
+    rows = dict(db.session.query(DataVersion.owner_id, DataVersion.version).filter(
+        DataVersion.owner_id.in_({owner, 0})))
+    return f"{rows.get(owner, 0)}.{rows.get(0, 0)}"
+
+
+def cache_key(user_id, endpoint, args):
+    """args — пары (имя, значение) аргументов маршрута и query string"""
+    query = urlencode(sorted((str(k), str(v)) for k, v in args))
+    return f"{_owner(user_id)}:{data_version(user_id)}:{endpoint}:{date.today().isoformat()}:{query}"
+
+
+def _request_key():
+    """Ключ текущего запроса (считается один раз: его используют и ETag, и кеш результатов)"""
+    key = request.environ.get('budget.result_key')
+    if key is None:
+        uid = flask_g.user.id if getattr(flask_g, 'user', None) else None
+        args = list(request.view_args.items()) + list(request.args.items(multi=True))
+        key = request.environ['budget.result_key'] = cache_key(uid, request.endpoint, args)
+    return key
+
+
+def conditional(view):
+    """ETag по версии данных и аргументам, 304 на совпавший If-None-Match без вызова представления;
+    Cache-Control: private, max-age=API_CACHE_MAX_AGE"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return view(*args, **kwargs)
+        etag = hashlib.sha256(_request_key().encode('utf-8')).hexdigest()[:32]
+        if request.if_none_match.contains(etag):
+            rv = current_app.response_class(status=304)
+        else:
+            rv = make_response(view(*args, **kwargs))
+            if rv.status_code != 200:
+                return rv
+        rv.set_etag(etag)
+        rv.cache_control.private = True
+        rv.cache_control.max_age = current_app.config.get("API_CACHE_MAX_AGE", 0)
+        return rv
+    return wrapper
+
+
+def cached(view):
+    """Кеширует успешный GET-ответ представления в ResultCache по версии данных пользователя.
+
+    Запросы с ожидающими flash-сообщениями кеш обходят, ответы, добавившие flash, не сохраняются.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = result_cache()
+        if cache is None or request.method != 'GET' or flask_session.get('_flashes'):
+            return view(*args, **kwargs)
+        key = _request_key()
+        hit = cache.get(request.endpoint, key)
+        if hit is not None:
+            mimetype, body = hit
+            rv = current_app.response_class(body, mimetype=mimetype)
+            rv.headers['X-Cache'] = 'HIT'
+            return rv
+        rv = make_response(view(*args, **kwargs))
+        if rv.status_code == 200 and not rv.direct_passthrough and not flask_session.get('_flashes'):
+            cache.set(key, (rv.mimetype, rv.get_data()))
+        rv.headers['X-Cache'] = 'MISS'
+        return rv
+    return wrapper
+
+
+def touch(user_ids, session=None):
+    """Отметить изменение данных владельцев в обход ORM (версия растёт при flush/commit)"""
+    session = session or db.session()
+    session.info.setdefault('_data_touched', set()).update(_owner(u) for u in user_ids)
+
+
+def _bump(session, owners):
+    session.connection().execute(_BUMP, [{'owner': owner} for owner in sorted(owners)])
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_flushed(session, flush_context):
+    owners = session.info.pop('_data_touched', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, _IGNORED) or not hasattr(obj, 'user_id'):
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=True):
+            continue
+        owners.add(_owner(obj.user_id))
+    if owners:
+        _bump(session, owners)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_touched(session):
+    # запись в обход ORM после последнего flush
+    owners = session.info.pop('_data_touched', None)
+    if owners:
+        _bump(session, owners)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session):
+    session.info.pop('_data_touched', None)
+
+
+def _make_backend(app):
+    url = app.config.get("RESULT_CACHE_URL")
+    if url:
+        import redis  # необязательная зависимость: нужна только для общего кеша
+        return SharedBackend(redis.Redis.from_url(url))
+    return LocalBackend(app.config.get("RESULT_CACHE_MAX_ENTRIES", 512),
+                        app.config.get("RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+def init_app(app):
+    if not app.config.get("RESULT_CACHE_ENABLED", True):
+        return
+    app.extensions["result_cache"] = ResultCache(_make_backend(app), app.config.get("RESULT_CACHE_TTL", 300))
@@ -0,0 +1,82 @@
+"""
+Подневные суммы для календаря и годовой тепловой карты.
+
+Суммы группируются в SQL (GROUP BY date(date)) по диапазону дат пользователя,
+поэтому стоимость не зависит от числа операций за месяц.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, func, literal, union_all
+
+from .models import db, PlannedExpense, Transaction, TransactionType
+
+
+def _day(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _bounds(start, end):
+    """[start, end] по датам -> полуинтервал по datetime для индекса (user_id, date)"""
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+
+def daily_totals(user_id, start, end):
+    """{дата: {'income', 'expense', 'count'}} за дни [start, end], только дни с операциями"""
+    lower, upper = _bounds(start, end)
+    day = func.date(Transaction.date)
+    income = Transaction.type == TransactionType.income
+    q = db.session.query(
+        day,
+        func.sum(case((income, Transaction.amount), else_=0)),
+        func.sum(case((income, 0), else_=Transaction.amount)),
+        func.count(Transaction.id),
+    ).filter(Transaction.date >= lower, Transaction.date < upper)
+    if user_id is not None:
+        q = q.filter(Transaction.user_id == user_id)
+    return {
+        _day(d): {'income': float(inc or 0), 'expense': float(exp or 0), 'count': count}
+        for d, inc, exp, count in q.group_by(day)
+    }
+
+
+def year_heatmap(user_id, year):
+    """Чистый итог по каждому дню года одним запросом.
+
+    Невыполненные запланированные расходы входят в итог со знаком минус,
+    а такие дни помечаются как прогнозные (projected).
+    """
+    start, end = date(year, 1, 1), date(year, 12, 31)
+    lower, upper = _bounds(start, end)
+    t = Transaction.__table__
+    p = PlannedExpense.__table__
+
+    actual = db.select(
+        func.date(t.c.date).label('day'),
+        case((t.c.type == TransactionType.income, t.c.amount), else_=-t.c.amount).label('net'),
+        literal(0.0).label('planned'),
+    ).where(t.c.date >= lower, t.c.date < upper)
+    planned = db.select(
+        func.date(p.c.planned_date).label('day'),
+        (-p.c.amount).label('net'),
+        p.c.amount.label('planned'),
+    ).where(p.c.planned_date >= lower, p.c.planned_date < upper, p.c.is_completed == False)
+    if user_id is not None:
+        actual = actual.where(t.c.user_id == user_id)
+        planned = planned.where(p.c.user_id == user_id)
+
+    rows = union_all(actual, planned).subquery()
+    q = db.select(rows.c.day, func.sum(rows.c.net), func.sum(rows.c.planned)).group_by(rows.c.day)
+    by_day = {_day(d): (float(net or 0), float(pl or 0)) for d, net, pl in db.session.execute(q)}
+
+    days = []
+    current = start
+    while current <= end:
+        net, planned_amount = by_day.get(current, (0.0, 0.0))
+        days.append({
+            'date': current.isoformat(),
+            'net': round(net, 2),
+            'planned': round(planned_amount, 2),
+            'projected': planned_amount > 0,
+        })
+        current += timedelta(days=1)
+    return days
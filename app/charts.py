@@ -0,0 +1,160 @@
+"""
+Кеш PNG-графиков отчёта с адресацией по содержимому.
+
+Имя файла — sha256 от (пользователь, вид графика, агрегированные данные, стиль),
+поэтому график перерисовывается, только если изменились данные или оформление,
+а разные пользователи не перезаписывают файлы друг друга. Файл по ключу никогда
+не меняется, так что отдаётся с долгим Cache-Control. Старые и лишние файлы
+удаляются по возрасту (с последнего использования) и общему размеру каталога.
+Рисует пул процессов app/renderer.py; страница отчёта опрашивает статус графика.
+
+Рядом с PNG лежит описание задания ``<key>.json`` (вид графика и данные).
+Реестр заданий пула живёт в одном процессе, поэтому статус выводится из файлов:
+есть PNG — готово; есть только описание — задание ставится заново (повторная
+постановка идемпотентна), и так ответит любой воркер, а не только поставивший задание.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+from flask import current_app
+
+from .renderer import ChartRenderer, MISSING, PENDING, READY
+from .utils import render_category_bar, render_report_pie
+
+# Увеличить при изменении функций отрисовки — старые файлы перестанут совпадать по ключу
+STYLE_VERSION = 2
+STYLES = {
+    'pie': {'version': STYLE_VERSION, 'autopct': '%1.1f%%', 'startangle': 90},
+    'bar': {'version': STYLE_VERSION, 'figsize': [8, 4], 'xlabel': 'Category', 'ylabel': 'Amount'},
+}
+
+# Вид графика -> функция отрисовки; описание задания ссылается только на вид
+RENDERERS = {
+    'pie': render_report_pie,
+    'bar': render_category_bar,
+}
+
+KEY_RE = re.compile(r'^[0-9a-f]{64}$')
+# Cache-Control для отдачи файла: содержимое по ключу неизменно
+MAX_AGE_HEADER = 365 * 24 * 3600
+
+
+def cache_folder():
+    return current_app.config.get('CHART_CACHE_FOLDER') or \
+        os.path.join(current_app.config['REPORTS_FOLDER'], 'charts')
+
+
+def chart_key(user_id, kind, data, style=None):
+    payload = json.dumps([user_id, kind, data, style or STYLES.get(kind)],
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def chart_path(key):
+    return os.path.join(cache_folder(), f"{key}.png")
+
+
+def job_path(key):
+    return os.path.join(cache_folder(), f"{key}.json")
+
+
+def _write_job(key, kind, data):
+    """Описание задания для повторной постановки любым воркером; уже записанное только отмечается.
+    Хранится только вид графика — функцию отрисовки выбирает RENDERERS"""
+    path = job_path(key)
+    if os.path.exists(path):
+        os.utime(path)
+        return
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'kind': kind, 'data': data}, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_job(key):
+    """(render, data) из описания задания или None (нет файла, он испорчен или вид неизвестен)"""
+    try:
+        with open(job_path(key), encoding='utf-8') as f:
+            job = json.load(f)
+        return RENDERERS[job['kind']], job['data']
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return None
+
+
+def renderer():
+    return current_app.extensions['chart_renderer']
+
+
+def request_chart(user_id, kind, data):
+    """Ключ графика. Если файла ещё нет, ставит отрисовку (RENDERERS[kind]) в пул app/renderer.py"""
+    key = chart_key(user_id, kind, data)
+    path = chart_path(key)
+    os.makedirs(cache_folder(), exist_ok=True)
+    _write_job(key, kind, data)
+    if os.path.exists(path):
+        # отметка использования — по ней считается возраст при вытеснении
+        os.utime(path)
+        return key
+    evict()
+    renderer().submit(key, RENDERERS[kind], data, path)
+    return key
+
+
+def chart_status(key):
+    """Статус по файлам: задание, которого нет в этом процессе, ставится заново по описанию"""
+    path = chart_path(key)
+    status = renderer().status(key, path)
+    if status != MISSING:
+        return status
+    job = _read_job(key)
+    if job is None:
+        return MISSING
+    render, data = job
+    renderer().submit(key, render, data, path)
+    return READY if os.path.exists(path) else PENDING
+
+
+def wait_chart(key, timeout=None):
+    chart_status(key)
+    return renderer().wait(key, chart_path(key), timeout)
+
+
+def evict(max_bytes=None, max_age=None, now=None):
+    """Удаляет файлы старше max_age секунд, затем самые давние, пока каталог больше max_bytes"""
+    max_bytes = max_bytes if max_bytes is not None else current_app.config.get('CHART_CACHE_MAX_BYTES', 50 * 1024 * 1024)
+    max_age = max_age if max_age is not None else current_app.config.get('CHART_CACHE_MAX_AGE', 30 * 24 * 3600)
+    now = now or time.time()
+    folder = cache_folder()
+    if not os.path.isdir(folder):
+        return 0
+    files = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.name.endswith(('.png', '.json')):
+            st = entry.stat()
+            files.append((st.st_mtime, st.st_size, entry.path))
+    files.sort()
+    # незавершённые .tmp не трогаем — их переименует процесс отрисовки
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def init_app(app):
+    app.extensions['chart_renderer'] = ChartRenderer(
+        max_workers=app.config.get('CHART_RENDER_WORKERS', 2),
+        timeout=app.config.get('CHART_RENDER_TIMEOUT', 30),
+        max_pending=app.config.get('CHART_RENDER_MAX_PENDING', 16),
+    )
@@ -0,0 +1,142 @@
+"""
+Данные главной страницы.
+
+Все суммы (за всё время, текущий и прошлый месяц, средние по категориям) считаются
+одним сгруппированным запросом по помесячным агрегатам с условной агрегацией,
+бюджеты с потраченным (budgets.spent, см. app/budget_tracking.py) — вторым. Остальное — короткие списки (счета, цели,
+последние операции) без запросов на каждый элемент.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import case, func
+from sqlalchemy.orm import contains_eager, joinedload
+
+from .models import (db, Account, Budget, Category, Goal, MonthlyRollup, Notification,
+                     Transaction, TransactionType)
+
+
+@dataclass
+class BudgetUsage:
+    budget: Budget
+    spent: float
+    remaining: float
+    percent: float
+
+
+@dataclass
+class GoalProgress:
+    goal: Goal
+    progress: float
+    remaining: float
+    percent: float
+
+
+@dataclass
+class DashboardStats:
+    total_income: float = 0.0
+    total_expense: float = 0.0
+    month_income: float = 0.0
+    month_expense: float = 0.0
+    last_month_income: float = 0.0
+    last_month_expense: float = 0.0
+    # название категории -> {'avg': средний расход, 'count': число операций}
+    avg_expenses_by_category: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    accounts: List[Account] = field(default_factory=list)
+    total_accounts_balance: float = 0.0
+    recent_transactions: List[Transaction] = field(default_factory=list)
+    top_expenses: List[Transaction] = field(default_factory=list)
+    goals: List[GoalProgress] = field(default_factory=list)
+    budgets: List[BudgetUsage] = field(default_factory=list)
+    unread_notifications: List[Notification] = field(default_factory=list)
+
+
+def _percent(value, total):
+    return min(100.0, (value / total * 100.0) if total > 0 else 0.0)
+
+
+def _sum_if(condition, column):
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def _load_totals(stats, user_id, today):
+    """Суммы по типам за всё время / этот / прошлый месяц и средние по категориям — один запрос"""
+    r = MonthlyRollup
+    this_month = date(today.year, today.month, 1)
+    last_month = this_month - relativedelta(months=1)
+    income = r.type == TransactionType.income
+    expense = r.type == TransactionType.expense
+    q = db.session.query(
+        Category.name,
+        _sum_if(income, r.total),
+        _sum_if(expense, r.total),
+        _sum_if(income & (r.month == this_month), r.total),
+        _sum_if(expense & (r.month == this_month), r.total),
+        _sum_if(income & (r.month == last_month), r.total),
+        _sum_if(expense & (r.month == last_month), r.total),
+        _sum_if(expense, r.count),
+    ).outerjoin(Category, Category.id == r.category_id)
+    if user_id is not None:
+        q = q.filter(r.user_id == user_id)
+    q = q.group_by(r.category_id, Category.name)
+
+    for name, inc, exp, m_inc, m_exp, lm_inc, lm_exp, exp_count in q:
+        stats.total_income += float(inc)
+        stats.total_expense += float(exp)
+        stats.month_income += float(m_inc)
+        stats.month_expense += float(m_exp)
+        stats.last_month_income += float(lm_inc)
+        stats.last_month_expense += float(lm_exp)
+        if name is not None and exp_count:
+            stats.avg_expenses_by_category[name] = {
+                'avg': float(exp) / exp_count,
+                'count': int(exp_count),
+            }
+
+
+def budget_usage(budget):
+    spent = budget.spent or 0.0
+    return BudgetUsage(budget, spent, max(0, budget.amount - spent), _percent(spent, budget.amount))
+
+
+def _load_budgets(stats, user_id, now):
+    """Действующие бюджеты с категорией — один запрос без просмотра операций"""
+    q = Budget.query.join(Budget.category).options(contains_eager(Budget.category)).filter(
+        Budget.is_active == True,
+        Budget.period_start <= now,
+        Budget.period_end >= now,
+    )
+    if user_id is not None:
+        q = q.filter(Budget.user_id == user_id)
+    stats.budgets = [budget_usage(b) for b in q.order_by(Budget.id)]
+
+
+def load_dashboard(user_id, today=None):
+    """Все данные главной страницы для пользователя (None — без фильтра по пользователю)"""
+    today = today or date.today()
+    stats = DashboardStats()
+    _load_totals(stats, user_id, today)
+    _load_budgets(stats, user_id, datetime.now())
+
+    def scoped(query, model):
+        return query.filter(model.user_id == user_id) if user_id is not None else query
+
+    stats.accounts = scoped(Account.query.filter_by(is_active=True), Account).all()
+    stats.total_accounts_balance = sum(acc.balance for acc in stats.accounts)
+
+    transactions = scoped(Transaction.query.options(joinedload(Transaction.category)), Transaction)
+    stats.recent_transactions = transactions.order_by(Transaction.date.desc()).limit(5).all()
+    stats.top_expenses = transactions.filter(
+        Transaction.type == TransactionType.expense
+    ).order_by(Transaction.amount.desc()).limit(5).all()
+
+    stats.unread_notifications = scoped(Notification.query.filter_by(is_read=False), Notification).order_by(
+        Notification.created_at.desc()).limit(5).all()
+
+    for g in scoped(Goal.query.filter_by(active=True), Goal):
+        progress = g.current_amount
+        stats.goals.append(GoalProgress(g, progress, max(0, g.target_amount - progress),
+                                        _percent(progress, g.target_amount)))
+    return stats
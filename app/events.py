@@ -0,0 +1,184 @@
+"""
+Живые события для открытых страниц: Server-Sent Events через /api/stream.
+
+EventHub — pub/sub внутри процесса: у каждого подключения своя ограниченная очередь
+(STREAM_QUEUE_SIZE). Медленный клиент, переполнивший очередь, отключается и при
+переподключении добирает пропущенное по Last-Event-ID из кольцевого буфера пользователя
+(STREAM_REPLAY последних событий). Если нужных событий в буфере уже нет (или процесс
+перезапускался — id содержит метку запуска), клиенту приходит событие reset.
+
+События копятся в session.info и публикуются только после commit:
+- notification — новое уведомление (budget — вдобавок, если это предупреждение по бюджету);
+- balance — изменился баланс счёта (app/balances.py).
+Хаб живёт в одном процессе: события из отдельного воркера планировщика сюда не попадают.
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import db, Notification
+
+OVERFLOW = object()
+
+
+class Subscription:
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.backlog = []
+        self.reset = False
+
+    def get(self, timeout):
+        """Следующее событие; None — за timeout ничего не пришло"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    def __init__(self, queue_size=100, replay=200):
+        self.queue_size = queue_size
+        self.replay = replay
+        # метка запуска: id из другого процесса/до перезапуска не сравниваются с текущими
+        self.boot = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._subscribers = defaultdict(set)
+        self._history = defaultdict(lambda: deque(maxlen=self.replay))
+        self._evicted = {}  # user_id -> id последнего вытесненного из буфера события
+        self._lock = threading.Lock()
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def _parse_id(self, last_event_id):
+        boot, _, seq = (last_event_id or '').partition('-')
+        if boot != self.boot or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Новое подключение; пропущенные после last_event_id события — в backlog"""
+        sub = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(sub)
+            if last_event_id:
+                seq = self._parse_id(last_event_id)
+                if seq is None or self._evicted.get(user_id, 0) > seq:
+                    sub.reset = True
+                else:
+                    sub.backlog = [ev for ev in self._history.get(user_id, ()) if ev[0] > seq]
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.user_id]
+
+    def publish(self, user_id, event_type, data):
+        with self._lock:
+            self._seq += 1
+            ev = (self._seq, event_type, data)
+            history = self._history[user_id]
+            if len(history) == history.maxlen:
+                self._evicted[user_id] = history[0][0]
+            history.append(ev)
+            subs = list(self._subscribers.get(user_id, ()))
+        for sub in subs:
+            try:
+                sub.queue.put_nowait(ev)
+            except queue.Full:
+                # клиент не успевает читать — отключаем, остальное он доберёт по Last-Event-ID
+                self.unsubscribe(sub)
+                try:
+                    sub.queue.get_nowait()
+                    sub.queue.put_nowait(OVERFLOW)
+                except (queue.Empty, queue.Full):
+                    pass
+        return ev[0]
+
+    def event_id(self, seq):
+        return f"{self.boot}-{seq}"
+
+
+def format_event(hub, ev):
+    seq, event_type, data = ev
+    return f"id: {hub.event_id(seq)}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream(hub, sub, heartbeat=15, max_age=None, clock=time.monotonic):
+    """Генератор текста SSE для одного подключения"""
+    started = clock()
+    try:
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        if sub.reset:
+            yield "event: reset\ndata: {}\n\n"
+        for ev in sub.backlog:
+            yield format_event(hub, ev)
+        while max_age is None or clock() - started < max_age:
+            ev = sub.get(heartbeat)
+            if ev is OVERFLOW:
+                return
+            if ev is None:
+                yield ": heartbeat\n\n"
+                continue
+            yield format_event(hub, ev)
+    finally:
+        hub.unsubscribe(sub)
+
+
+def hub():
+    return current_app.extensions.get("event_hub") if has_app_context() else None
+
+
+def emit(event_type, user_id, data, session=None):
+    """Запланировать событие на момент commit текущей транзакции"""
+    session = session or db.session()
+    session.info.setdefault('_pending_events', []).append((user_id, event_type, data))
+
+
+def emit_notification(user_id, notification_id, type_, title, message, related_id, session=None):
+    data = {'id': notification_id, 'type': type_, 'title': title, 'message': message}
+    emit('notification', user_id, data, session)
+    if type_ == 'budget_warning':
+        emit('budget', user_id, {'budget_id': related_id, 'title': title, 'message': message}, session)
+
+
+@event.listens_for(Session, "after_flush")
+def _notifications_created(session, flush_context):
+    # уведомления, созданные через ORM; INSERT ... SELECT публикует app/notifications.py
+    for obj in session.new:
+        if isinstance(obj, Notification):
+            emit_notification(obj.user_id, obj.id, obj.type, obj.title, obj.message, obj.related_id, session)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    pending = session.info.pop('_pending_events', None)
+    h = hub()
+    if not pending or h is None:
+        return
+    for user_id, event_type, data in pending:
+        h.publish(user_id, event_type, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop('_pending_events', None)
+
+
+def init_app(app):
+    app.extensions["event_hub"] = EventHub(
+        queue_size=app.config.get("STREAM_QUEUE_SIZE", 100),
+        replay=app.config.get("STREAM_REPLAY", 200),
+    )
@@ -0,0 +1,175 @@
+"""
+Потоковый импорт операций из CSV.
+
+Файл читается кусками по IMPORT_CHUNK_SIZE строк (pandas chunksize), поэтому память
+не растёт с размером выгрузки. Категории сопоставляются по словарю имя -> id,
+который загружается один раз; недостающие категории создаются пачкой.
+Каждый кусок вставляется одним executemany и фиксируется своей транзакцией:
+ошибка в куске откатывает только его, остальные куски импортируются.
+Операции пишутся в обход ORM, поэтому агрегаты и потраченное по бюджетам обновляются
+через rollups.apply_deltas и budget_tracking.apply_deltas (поисковый индекс поддерживают триггеры).
+"""
+import click
+import pandas as pd
+from flask import current_app
+
+from .models import db, User, Category, Transaction, TransactionType
+from . import budget_tracking, cache, rollups
+
+REQUIRED_COLUMNS = {'date', 'amount', 'type'}
+
+
+class ImportFormatError(ValueError):
+    """Файл не похож на выгрузку операций (нет обязательных столбцов)"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0        # строки с нераспознанной датой или суммой
+        self.chunks = 0
+        self.failed = []        # [(номер куска, первая строка, последняя строка, ошибка)]
+
+    @property
+    def failed_rows(self):
+        return sum(last - first + 1 for _, first, last, _ in self.failed)
+
+
+class CategoryCache:
+    """Имя категории -> id для одного пользователя (user_id=None — общие категории);
+    создаёт недостающие"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        q = db.session.query(Category.name, Category.id).filter(
+            Category.user_id.is_(None) if user_id is None else Category.user_id == user_id
+        ).order_by(Category.id)
+        self.ids = {}
+        for name, cat_id in q:
+            self.ids.setdefault(name, cat_id)
+        self._pending = []
+
+    def resolve(self, names):
+        """id для каждого имени (None для пустых), недостающие категории вставляются одним запросом"""
+        missing = sorted({n for n in names if n and n not in self.ids})
+        if missing:
+            table = Category.__table__
+            db.session.execute(table.insert(), [{'name': n, 'user_id': self.user_id} for n in missing])
+            q = db.select(table.c.name, table.c.id).where(
+                table.c.name.in_(missing),
+                table.c.user_id.is_(None) if self.user_id is None else table.c.user_id == self.user_id,
+            )
+            for name, cat_id in db.session.execute(q):
+                self.ids.setdefault(name, cat_id)
+            self._pending.extend(missing)
+        return [self.ids.get(n) if n else None for n in names]
+
+    def commit(self):
+        self._pending = []
+
+    def rollback(self):
+        # категории, созданные в откаченном куске, в базе не остались
+        for name in self._pending:
+            self.ids.pop(name, None)
+        self._pending = []
+
+
+def _normalize(chunk):
+    """Приводит кусок к типам; возвращает (годные строки, число отброшенных)"""
+    chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+    missing = REQUIRED_COLUMNS - set(chunk.columns)
+    if missing:
+        raise ImportFormatError(f"CSV должен содержать столбцы: {REQUIRED_COLUMNS}")
+    chunk['date'] = pd.to_datetime(chunk['date'], errors='coerce')
+    chunk['amount'] = pd.to_numeric(chunk['amount'], errors='coerce')
+    valid = chunk['date'].notna() & chunk['amount'].notna()
+    return chunk[valid], int((~valid).sum())
+
+
+def _text_column(chunk, name):
+    if name not in chunk.columns:
+        return [None] * len(chunk)
+    return [str(v).strip() if pd.notna(v) else None for v in chunk[name]]
+
+
+def _insert_chunk(chunk, user_id, categories):
+    category_ids = categories.resolve(_text_column(chunk, 'category'))
+    notes = _text_column(chunk, 'note')
+    types = [TransactionType.income if str(v).lower().startswith('i') else TransactionType.expense
+             for v in chunk['type']]
+    rows = []
+    deltas = rollups.new_deltas()
+    budget_deltas = budget_tracking.new_deltas()
+    for when, amount, type_, category_id, note in zip(
+            chunk['date'], chunk['amount'], types, category_ids, notes):
+        when = when.to_pydatetime()
+        amount = float(amount)
+        rows.append({'date': when, 'amount': amount, 'type': type_, 'category_id': category_id,
+                     'note': note, 'user_id': user_id})
+        rollups.add_delta(deltas, user_id, when, category_id, type_, amount)
+        budget_tracking.add_delta(budget_deltas, user_id, category_id, when, type_, amount)
+    if rows:
+        db.session.execute(Transaction.__table__.insert(), rows)
+        rollups.apply_deltas(deltas)
+        budget_tracking.apply_deltas(budget_deltas)
+        cache.touch([user_id])
+    return len(rows)
+
+
+def import_transactions(file_stream, user_id=None, chunk_size=5000, progress=None):
+    """Импортирует CSV кусками. progress(result) вызывается после каждого куска"""
+    result = ImportResult()
+    categories = CategoryCache(user_id)
+    reader = pd.read_csv(file_stream, chunksize=chunk_size, dtype={'category': str, 'note': str})
+    first_row = 1
+    with reader:
+        for chunk in reader:
+            result.chunks += 1
+            last_row = first_row + len(chunk) - 1
+            try:
+                chunk, skipped = _normalize(chunk)
+                imported = _insert_chunk(chunk, user_id, categories)
+                db.session.commit()
+            except ImportFormatError:
+                # заголовок общий для всех кусков — дальше читать бессмысленно
+                db.session.rollback()
+                raise
+            except Exception as e:
+                db.session.rollback()
+                categories.rollback()
+                result.failed.append((result.chunks, first_row, last_row, str(e)))
+            else:
+                categories.commit()
+                result.imported += imported
+                result.skipped += skipped
+            first_row = last_row + 1
+            if progress is not None:
+                progress(result)
+    return result
+
+
+@click.command("import-csv")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--user", "username", default=None, help="Имя пользователя, которому принадлежат операции")
+@click.option("--chunk-size", type=int, default=None, help="Строк в одном куске")
+def import_csv_command(path, username, chunk_size):
+    """Импортирует операции из CSV (для больших выгрузок банка)"""
+    user_id = None
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f"Пользователь {username} не найден")
+        user_id = user.id
+    chunk_size = chunk_size or current_app.config.get("IMPORT_CHUNK_SIZE", 5000)
+
+    def report(result):
+        click.echo(f"кусок {result.chunks}: импортировано {result.imported}, ошибок в кусках {len(result.failed)}")
+
+    result = import_transactions(path, user_id, chunk_size, progress=report)
+    for chunk_no, first, last, error in result.failed:
+        click.echo(f"кусок {chunk_no} (строки {first}-{last}) не импортирован: {error}", err=True)
+    click.echo(f"Готово: {result.imported} операций, пропущено строк {result.skipped}")
+
+
+def init_app(app):
+    app.cli.add_command(import_csv_command)
@@ -33,7 +33,9 @@ class Account(db.Model):
     __tablename__ = "accounts"
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
+    # кэш: opening_balance + сумма операций по счёту (поддерживается app/balances.py)
     balance = db.Column(db.Float, default=0.0, nullable=False)
+    opening_balance = db.Column(db.Float, default=0.0, nullable=False)  # начальный баланс
     currency = db.Column(db.String(3), default="RUB", nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
@@ -50,12 +52,24 @@ class Transaction(db.Model):
     amount = db.Column(db.Float, nullable=False)
     type = db.Column(db.Enum(TransactionType), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=True)
-    category = db.relationship("Category", backref=db.backref("transactions", lazy=True))
+    # связи операции не подгружаются неявно: запрос, которому они нужны, указывает
+    # joinedload/selectinload; обращение к незагруженной связи — ошибка, а не запрос на каждую строку
+    category = db.relationship("Category", lazy='raise_on_sql', backref=db.backref("transactions", lazy=True))
     account_id = db.Column(db.Integer, db.ForeignKey("accounts.id"), nullable=True)
-    account = db.relationship("Account", backref=db.backref("transactions", lazy=True))
+    account = db.relationship("Account", lazy='raise_on_sql', backref=db.backref("transactions", lazy=True))
     note = db.Column(db.String(256))
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    tags = db.relationship('Tag', secondary=transaction_tags, lazy='subquery', backref=db.backref('transactions', lazy=True))
+    tags = db.relationship('Tag', secondary=transaction_tags, lazy='raise_on_sql',
+                           backref=db.backref('transactions', lazy=True))
+    __table_args__ = (
+        # список операций и выборки за период: (user_id, date range)
+        db.Index('ix_transactions_user_date', 'user_id', 'date'),
+        # суммы доходов/расходов за период: (user_id, type, date range)
+        db.Index('ix_transactions_user_type_date', 'user_id', 'type', 'date'),
+        # траты по бюджету/цели: (category_id, type, date range)
+        db.Index('ix_transactions_category_type_date', 'category_id', 'type', 'date'),
+        db.Index('ix_transactions_account', 'account_id'),
+    )
 
     def __repr__(self):
         return f"<Transaction {self.amount} {self.type} {self.date}>"
@@ -78,9 +92,14 @@ class Budget(db.Model):
     amount = db.Column(db.Float, nullable=False)
     period_start = db.Column(db.DateTime, nullable=False)
     period_end = db.Column(db.DateTime, nullable=False)
+    # расходы категории за период, поддерживается при записи операций (app/budget_tracking.py)
+    spent = db.Column(db.Float, default=0.0, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    __table_args__ = (
+        db.Index('ix_budgets_user_active_period', 'user_id', 'is_active', 'period_start', 'period_end'),
+    )
 
     def __repr__(self):
         return f"<Budget {self.category.name} {self.amount}>"
@@ -101,6 +120,9 @@ class Recurring(db.Model):
     next_date = db.Column(db.DateTime, nullable=False)
     active = db.Column(db.Boolean, default=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    __table_args__ = (
+        db.Index('ix_recurrings_active_next_date', 'active', 'next_date'),
+    )
 
     def __repr__(self):
         return f"<Recurring {self.amount} {self.type} every {self.frequency}>"
@@ -237,10 +259,101 @@ class Notification(db.Model):
     related_id = db.Column(db.Integer, nullable=True)  # ID связанного объекта (бюджет, долг, цель)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    __table_args__ = (
+        db.Index('ix_notifications_user_read', 'user_id', 'is_read'),
+        # лента /notifications: keyset по id в пределах пользователя
+        db.Index('ix_notifications_user_id', 'user_id', 'id'),
+        # не больше одного непрочитанного уведомления на (пользователь, тип, объект)
+        db.Index('uq_notifications_unread', 'user_id', 'type', 'related_id', unique=True,
+                 sqlite_where=db.text('is_read = 0')),
+    )
 
     def __repr__(self):
         return f"<Notification {self.title}>"
 
+class MonthlyRollup(db.Model):
+    """Помесячные суммы операций по (пользователь, месяц, категория, тип).
+    Поддерживается инкрементально (app/rollups.py): одна строка на группу, приращения
+    применяются через INSERT ... ON CONFLICT DO UPDATE"""
+    __tablename__ = "monthly_rollups"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    month = db.Column(db.Date, nullable=False)  # первое число месяца
+    category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=True)
+    type = db.Column(db.Enum(TransactionType), nullable=False)
+    total = db.Column(db.Float, default=0.0, nullable=False)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    __table_args__ = (
+        db.Index('ix_monthly_rollups_user_month', 'user_id', 'month', 'type', 'category_id'),
+        # NULL в уникальном индексе SQLite не совпадает с NULL — группы без пользователя
+        # или категории сравниваются через coalesce
+        db.Index('uq_monthly_rollups_group', db.func.coalesce(user_id, db.literal_column('0')), 'month',
+                 db.func.coalesce(category_id, db.literal_column('0')), 'type', unique=True),
+    )
+
+    def __repr__(self):
+        return f"<MonthlyRollup {self.user_id} {self.month} {self.type} {self.total}>"
+
+class NotificationArchive(db.Model):
+    """Прочитанные уведомления старше NOTIFICATION_RETENTION_DAYS (переносит app/retention.py)"""
+    __tablename__ = "notifications_archive"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # id из notifications
+    type = db.Column(db.String(32), nullable=False)
+    title = db.Column(db.String(128), nullable=False)
+    message = db.Column(db.String(512), nullable=False)
+    related_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<NotificationArchive {self.title}>"
+
+class DataVersion(db.Model):
+    """Счётчик записей в данные владельца (owner_id = user_id, 0 — общие данные без владельца).
+    Увеличивается при каждом flush с его строками и входит в ключ кеша результатов (app/cache.py)"""
+    __tablename__ = "data_versions"
+    owner_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<DataVersion {self.owner_id} {self.version}>"
+
+class NotificationCounter(db.Model):
+    """Число непрочитанных уведомлений владельца (owner_id = user_id, 0 — без владельца).
+    Поддерживается триггерами на notifications (app/unread.py)"""
+    __tablename__ = "notification_counters"
+    owner_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    unread = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<NotificationCounter {self.owner_id} {self.unread}>"
+
+class AccountSnapshot(db.Model):
+    """Баланс счёта на конец дня (app/balances.py); устаревшие снимки удаляются при записи операций задним числом"""
+    __tablename__ = "account_snapshots"
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey("accounts.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    balance = db.Column(db.Float, nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'day', name='uq_account_snapshots_account_day'),
+    )
+
+    def __repr__(self):
+        return f"<AccountSnapshot {self.account_id} {self.day} {self.balance}>"
+
+class SchedulerWatermark(db.Model):
+    """Отметка планировщика: до какого дня для пользователя сгенерированы повторяющиеся операции"""
+    __tablename__ = "scheduler_watermarks"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
+    generated_until = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SchedulerWatermark user={self.user_id} until={self.generated_until}>"
+
 
 class User(db.Model):
     __tablename__ = 'users'
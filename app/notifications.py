@@ -1,116 +1,126 @@
 """
 Утилиты для создания уведомлений
+
+Уведомления создаются пачкой: для каждого вида один INSERT ... SELECT по всем
+подходящим объектам, кроме тех, по которым у владельца уже есть непрочитанное
+уведомление того же типа. Дубликаты дополнительно исключает уникальный частичный
+индекс uq_notifications_unread (user_id, type, related_id) WHERE is_read = 0 —
+при гонке двух проходов лишняя строка отбрасывается через INSERT OR IGNORE.
 """
-from .models import db, Notification, Budget, Debt, Goal, Transaction, TransactionType
+from .models import db, Budget, Category, Notification, Debt, Goal
+from . import cache, events, unread
 from datetime import datetime, date, timedelta
+from sqlalchemy import case, func
+
+WARN_PERCENT = 80
+
+_COLUMNS = ['type', 'title', 'message', 'related_id', 'user_id', 'is_read', 'created_at']
+
+
+def _insert_unread(conn, type_, related_id, owner_id, title, message, *where):
+    """INSERT ... SELECT уведомлений типа type_ по строкам-кандидатам без непрочитанного дубликата.
+    Созданные строки (RETURNING) сбрасывают кеш счётчика владельцев и уходят в поток событий"""
+    n = Notification.__table__
+    select = db.select(
+        db.literal(type_), title, message, related_id, owner_id,
+        db.literal(False, db.Boolean), db.literal(datetime.utcnow(), db.DateTime),
+    ).where(*where).where(~db.exists().where(
+        n.c.type == type_,
+        n.c.related_id == related_id,
+        n.c.user_id.is_not_distinct_from(owner_id),
+        n.c.is_read == False,
+    ))
+    created = conn.execute(n.insert().prefix_with('OR IGNORE').from_select(_COLUMNS, select).returning(
+        n.c.id, n.c.user_id, n.c.title, n.c.message, n.c.related_id)).all()
+    for notification_id, user_id, row_title, row_message, row_related in created:
+        unread.invalidate(user_id)
+        events.emit_notification(user_id, notification_id, type_, row_title, row_message, row_related)
+    cache.touch({row[1] for row in created})
+    return len(created)
+
 
-def check_budget_warnings():
-    """Проверяет бюджеты и создаёт уведомления при приближении к лимиту"""
-    today = datetime.now()
-    budgets = Budget.query.filter(
-        Budget.is_active == True,
-        Budget.period_start <= today,
-        Budget.period_end >= today
-    ).all()
-    
-    for budget in budgets:
-        spent = db.session.query(Transaction).filter(
-            Transaction.category_id == budget.category_id,
-            Transaction.type == TransactionType.expense,
-            Transaction.date >= budget.period_start,
-            Transaction.date <= budget.period_end
-        ).with_entities(db.func.sum(Transaction.amount)).scalar() or 0.0
-        
-        percent = (spent / budget.amount * 100.0) if budget.amount > 0 else 0.0
-        
-        # Проверяем, есть ли уже уведомление для этого бюджета
-        existing = Notification.query.filter_by(
-            type='budget_warning',
-            related_id=budget.id,
-            is_read=False
-        ).first()
-        
-        if percent >= 100 and not existing:
-            notif = Notification(
-                type='budget_warning',
-                title=f'Бюджет превышен: {budget.category.name}',
-                message=f'Вы потратили {spent:.2f} из {budget.amount:.2f} ({percent:.0f}%)',
-                related_id=budget.id
-            )
-            # attach to budget owner if set
-            notif.user_id = budget.user_id
-            db.session.add(notif)
-        elif percent >= 80 and percent < 100 and not existing:
-            notif = Notification(
-                type='budget_warning',
-                title=f'Приближение к лимиту: {budget.category.name}',
-                message=f'Вы потратили {spent:.2f} из {budget.amount:.2f} ({percent:.0f}%)',
-                related_id=budget.id
-            )
-            notif.user_id = budget.user_id
-            db.session.add(notif)
+def budget_warnings(connection=None, category_ids=None, budget_ids=None, user_id=None, now=None):
+    """Предупреждения по действующим бюджетам, потратившим WARN_PERCENT% и больше (по budgets.spent).
+    Возвращает число созданных уведомлений"""
+    conn = connection if connection is not None else db.session.connection()
+    now = now or datetime.now()
+    b = Budget.__table__
+    c = Category.__table__
+    where = [
+        b.c.category_id == c.c.id,
+        b.c.is_active == True,
+        b.c.period_start <= now,
+        b.c.period_end >= now,
+        b.c.amount > 0,
+        b.c.spent * 100 >= b.c.amount * WARN_PERCENT,
+    ]
+    if category_ids is not None:
+        where.append(b.c.category_id.in_(category_ids))
+    if budget_ids is not None:
+        where.append(b.c.id.in_(budget_ids))
+    if user_id is not None:
+        where.append(b.c.user_id == user_id)
+    title = case(
+        (b.c.spent >= b.c.amount, db.literal('Бюджет превышен: ') + c.c.name),
+        else_=db.literal('Приближение к лимиту: ') + c.c.name,
+    )
+    message = func.printf('Вы потратили %.2f из %.2f (%.0f%%)', b.c.spent, b.c.amount,
+                          b.c.spent * 100.0 / b.c.amount)
+    return _insert_unread(conn, 'budget_warning', b.c.id, b.c.user_id, title, message, *where)
 
-def check_debt_due():
-    """Проверяет долги и создаёт уведомления о просроченных"""
+
+def check_budget_warnings(user_id=None):
+    """Предупреждения по бюджетам, период которых начался уже с превышением.
+    Обычно они создаются при записи операций (app/budget_tracking.py); здесь читается
+    готовое budgets.spent — один запрос без просмотра операций"""
+    return budget_warnings(user_id=user_id)
+
+
+def check_debt_due(user_id=None):
+    """Создаёт уведомления о просроченных долгах одним INSERT ... SELECT"""
     today = date.today()
-    debts = Debt.query.filter_by(is_owed_to_me=False).all()
-    
-    for debt in debts:
-        if debt.due_date and debt.due_date.date() < today and debt.paid_amount < debt.amount:
-            # Проверяем, есть ли уже уведомление
-            existing = Notification.query.filter_by(
-                type='debt_due',
-                related_id=debt.id,
-                is_read=False
-            ).first()
-            
-            if not existing:
-                days_overdue = (today - debt.due_date.date()).days
-                notif = Notification(
-                    type='debt_due',
-                    title=f'Просроченный долг: {debt.name}',
-                    message=f'Долг просрочен на {days_overdue} дней. Осталось выплатить: {debt.amount - debt.paid_amount:.2f}',
-                    related_id=debt.id
-                )
-                notif.user_id = debt.user_id
-                db.session.add(notif)
+    d = Debt.__table__
+    where = [
+        d.c.is_owed_to_me == False,
+        d.c.due_date != None,
+        d.c.due_date < datetime.combine(today, datetime.min.time()),
+        d.c.paid_amount < d.c.amount,
+    ]
+    if user_id is not None:
+        where.append(d.c.user_id == user_id)
+    days_overdue = db.cast(func.julianday(today.isoformat()) - func.julianday(func.date(d.c.due_date)), db.Integer)
+    message = func.printf('Долг просрочен на %d дней. Осталось выплатить: %.2f',
+                          days_overdue, d.c.amount - d.c.paid_amount)
+    return _insert_unread(db.session.connection(), 'debt_due', d.c.id, d.c.user_id,
+                          db.literal('Просроченный долг: ') + d.c.name, message, *where)
 
-def check_goal_reminders():
-    """Проверяет цели и создаёт напоминания"""
+
+def check_goal_reminders(user_id=None):
+    """Напоминания о целях, до срока которых осталось не больше 7 дней, одним INSERT ... SELECT"""
     today = date.today()
-    goals = Goal.query.filter_by(active=True).all()
-    
-    for goal in goals:
-        if goal.target_date:
-            days_remaining = (goal.target_date.date() - today).days
-            
-            # Напоминание за 7 дней до цели
-            if 0 < days_remaining <= 7:
-                existing = Notification.query.filter_by(
-                    type='goal_reminder',
-                    related_id=goal.id,
-                    is_read=False
-                ).first()
-                
-                if not existing:
-                    remaining = goal.target_amount - goal.current_amount
-                    notif = Notification(
-                        type='goal_reminder',
-                        title=f'Напоминание о цели: {goal.name}',
-                        message=f'До цели осталось {days_remaining} дней. Нужно накопить ещё {remaining:.2f}',
-                        related_id=goal.id
-                    )
-                    notif.user_id = goal.user_id
-                    db.session.add(notif)
+    g = Goal.__table__
+    where = [
+        g.c.active == True,
+        # 0 < (target_date.date() - today).days <= 7
+        g.c.target_date >= datetime.combine(today + timedelta(days=1), datetime.min.time()),
+        g.c.target_date < datetime.combine(today + timedelta(days=8), datetime.min.time()),
+    ]
+    if user_id is not None:
+        where.append(g.c.user_id == user_id)
+    days_remaining = db.cast(func.julianday(func.date(g.c.target_date)) - func.julianday(today.isoformat()), db.Integer)
+    message = func.printf('До цели осталось %d дней. Нужно накопить ещё %.2f',
+                          days_remaining, g.c.target_amount - g.c.current_amount)
+    return _insert_unread(db.session.connection(), 'goal_reminder', g.c.id, g.c.user_id,
+                          db.literal('Напоминание о цели: ') + g.c.name, message, *where)
+
 
-def generate_all_notifications():
-    """Генерирует все уведомления"""
+def generate_all_notifications(user_id=None):
+    """Генерирует все уведомления (для всех пользователей или только для user_id) — три запроса"""
     try:
-        check_budget_warnings()
-        check_debt_due()
-        check_goal_reminders()
+        check_budget_warnings(user_id)
+        check_debt_due(user_id)
+        check_goal_reminders(user_id)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         print(f"Error generating notifications: {e}")
-
@@ -0,0 +1,54 @@
+"""
+Keyset-пагинация списка операций по (date, id) и непрозрачные курсоры.
+
+Курсор — подписанный токен с позицией последней показанной операции и всеми
+фильтрами поиска, поэтому следующая страница запрашивается одним параметром
+и стоит одинаково на любой глубине (без OFFSET).
+"""
+from datetime import datetime
+
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+
+from .models import db, Transaction
+
+# Параметры SearchForm + быстрый фильтр, которые переносятся в курсор
+FILTER_KEYS = ('query', 'category', 'type', 'account', 'date_from', 'date_to',
+               'amount_from', 'amount_to', 'quick_filter')
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='transactions-cursor')
+
+
+def filters_from_args(args):
+    """Непустые параметры фильтрации из request.args"""
+    return {key: args.get(key) for key in FILTER_KEYS if args.get(key)}
+
+
+def encode_cursor(filters, last):
+    return _serializer().dumps({'f': filters, 'd': last.date.isoformat(), 'i': last.id})
+
+
+def decode_cursor(token):
+    """Возвращает (filters, (date, id)); ValueError, если курсор испорчен"""
+    try:
+        data = _serializer().loads(token)
+        return data['f'], (datetime.fromisoformat(data['d']), int(data['i']))
+    except (BadSignature, KeyError, TypeError, ValueError):
+        raise ValueError("Некорректный курсор")
+
+
+def keyset_page(query, after=None, limit=50):
+    """Страница операций после позиции after=(date, id), от новых к старым.
+
+    Возвращает (rows, has_more); лишняя (limit + 1)-я строка только показывает, есть ли продолжение.
+    """
+    if after is not None:
+        after_date, after_id = after
+        query = query.filter(db.or_(
+            Transaction.date < after_date,
+            db.and_(Transaction.date == after_date, Transaction.id < after_id)
+        ))
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
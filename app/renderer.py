@@ -0,0 +1,134 @@
+"""
+Отрисовка графиков вне потока запроса — в ограниченном пуле процессов.
+
+matplotlib занимает процессор и держит GIL, поэтому графики рисуются в отдельных
+процессах (ProcessPoolExecutor, CHART_RENDER_WORKERS штук); запрос только ставит
+задание и сразу отвечает. Одинаковые задания (один ключ кеша) не дублируются.
+Каждое задание ограничено CHART_RENDER_TIMEOUT секундами: в процессе-исполнителе
+срабатывает SIGALRM, задание завершается ошибкой, а процесс остаётся в пуле.
+Очередь тоже ограничена (CHART_RENDER_MAX_PENDING) — лишние задания не принимаются.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+READY = 'ready'
+PENDING = 'pending'
+FAILED = 'failed'
+MISSING = 'missing'
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+def _alarm(signum, frame):
+    raise RenderTimeout("Превышено время отрисовки графика")
+
+
+def _run_job(render, data, path, timeout):
+    """Выполняется в процессе пула: рисует во временный файл и атомарно переименовывает"""
+    use_alarm = timeout and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _alarm)
+        signal.alarm(max(1, int(timeout)))
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        render(data, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+class ChartRenderer:
+    """Пул процессов для отрисовки + реестр заданий по ключу графика"""
+
+    def __init__(self, max_workers=2, timeout=30, max_pending=16):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: fork многопоточного веб-процесса небезопасен
+            self._executor = ProcessPoolExecutor(self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _pending_count(self):
+        return sum(1 for f in self._jobs.values() if not f.done())
+
+    def _finished(self, key, future):
+        # успешные задания больше не нужны — готовность видна по файлу
+        if not future.cancelled() and future.exception() is None:
+            self._forget(key, future)
+
+    def submit(self, key, render, data, path):
+        """Ставит задание, если его ещё нет; False — очередь переполнена"""
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None and not future.done():
+                return True
+            if self._pending_count() >= self.max_pending:
+                return False
+            try:
+                future = self._pool().submit(_run_job, render, data, path, self.timeout)
+            except BrokenProcessPool:
+                # процесс пула упал — пересоздаём пул
+                self._executor = None
+                future = self._pool().submit(_run_job, render, data, path, self.timeout)
+            self._jobs[key] = future
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return True
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._jobs.get(key) is future:
+                del self._jobs[key]
+
+    def status(self, key, path):
+        """Ошибка задания сообщается один раз: затем оно удаляется из реестра
+        (следующий запрос графика поставит его заново)"""
+        if os.path.exists(path):
+            return READY
+        future = self._jobs.get(key)
+        if future is None:
+            return MISSING
+        if not future.done():
+            return PENDING
+        if future.cancelled() or future.exception() is not None:
+            self._forget(key, future)
+            return FAILED
+        return READY
+
+    def wait(self, key, path, timeout=None):
+        """Ждёт задание не дольше timeout (по умолчанию — тайм-аут задания) и возвращает статус"""
+        future = self._jobs.get(key)
+        if future is not None:
+            try:
+                future.result(timeout=timeout if timeout is not None else self.timeout)
+            except FutureTimeout:
+                return PENDING
+            except Exception:
+                self._forget(key, future)
+                return FAILED
+        return self.status(key, path)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._jobs.clear()
+        # вне блокировки: колбэки завершённых заданий сами берут self._lock
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,102 @@
+"""
+Данные месячного отчёта.
+
+Суммы по типам и категориям за выбранный и прошлый месяц считаются одним сгруппированным
+запросом по помесячным агрегатам (условная агрегация по месяцу и типу), прогресс целей —
+вторым запросом: цели, соединённые с агрегатами доходов по Goal.category_id. Число
+запросов и их стоимость не зависят от числа операций в месяце. Результат — списки и числа,
+готовые для шаблона, графиков и JSON.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Tuple
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func
+
+from .dashboard import GoalProgress, _percent, _sum_if
+from .models import db, Category, Goal, MonthlyRollup, TransactionType
+from .rollups import month_start
+
+UNCATEGORIZED = "Без категории"
+
+
+@dataclass
+class MonthlyReport:
+    start: datetime
+    end: datetime
+    income: float = 0.0
+    expense: float = 0.0
+    prev_income: float = 0.0
+    prev_expense: float = 0.0
+    # [(название категории, сумма доходов и расходов за месяц)] по убыванию суммы
+    categories: List[Tuple[str, float]] = field(default_factory=list)
+    goals: List[GoalProgress] = field(default_factory=list)
+
+    @property
+    def pie_data(self):
+        return [[TransactionType.income.value, round(self.income, 2)],
+                [TransactionType.expense.value, round(self.expense, 2)]]
+
+    @property
+    def bar_data(self):
+        return [[name, round(amount, 2)] for name, amount in self.categories]
+
+
+def _load_totals(report, user_id):
+    """Суммы по типам за оба месяца и по категориям за выбранный — один запрос"""
+    r = MonthlyRollup
+    this_month = month_start(report.start)
+    last_month = this_month - relativedelta(months=1)
+    income = r.type == TransactionType.income
+    expense = r.type == TransactionType.expense
+    current = r.month == this_month
+    previous = r.month == last_month
+    q = db.session.query(
+        Category.name,
+        _sum_if(current & income, r.total),
+        _sum_if(current & expense, r.total),
+        _sum_if(previous & income, r.total),
+        _sum_if(previous & expense, r.total),
+        _sum_if(current, r.count),
+    ).outerjoin(Category, Category.id == r.category_id).filter(r.month.in_([this_month, last_month]))
+    if user_id is not None:
+        q = q.filter(r.user_id == user_id)
+    q = q.group_by(r.category_id, Category.name)
+
+    by_name = {}
+    for name, inc, exp, prev_inc, prev_exp, count in q:
+        report.income += float(inc)
+        report.expense += float(exp)
+        report.prev_income += float(prev_inc)
+        report.prev_expense += float(prev_exp)
+        if count:
+            # одноимённые категории (общая и пользовательская) показываются одной строкой
+            name = name or UNCATEGORIZED
+            by_name[name] = by_name.get(name, 0.0) + float(inc) + float(exp)
+    report.categories = sorted(by_name.items(), key=lambda item: item[1], reverse=True)
+
+
+def _load_goals(report, user_id):
+    """Цели с суммой доходов по их категории до конца месяца — один запрос"""
+    r = MonthlyRollup
+    joined = (r.category_id == Goal.category_id) & (r.type == TransactionType.income) \
+        & (r.month < month_start(report.end))
+    q = db.session.query(Goal, func.coalesce(func.sum(r.total), 0))
+    if user_id is not None:
+        joined = joined & (r.user_id == user_id)
+        q = q.filter(Goal.user_id == user_id)
+    q = q.outerjoin(r, joined).group_by(Goal.id).order_by(Goal.id.desc())
+    for goal, progress in q:
+        progress = float(progress)
+        report.goals.append(GoalProgress(goal, progress, max(0, goal.target_amount - progress),
+                                         _percent(progress, goal.target_amount)))
+
+
+def load_report(user_id, year, month):
+    """Отчёт за месяц (None вместо user_id — без фильтра по пользователю)"""
+    start = datetime(year, month, 1)
+    report = MonthlyReport(start=start, end=start + relativedelta(months=1))
+    _load_totals(report, user_id)
+    _load_goals(report, user_id)
+    return report
@@ -0,0 +1,93 @@
+"""
+Хранение уведомлений и обслуживание базы.
+
+Прочитанные уведомления старше NOTIFICATION_RETENTION_DAYS переносятся в notifications_archive
+пачками по NOTIFICATION_ARCHIVE_BATCH строк: каждая пачка — INSERT ... SELECT и DELETE в одной
+короткой транзакции, так что запись не блокирует базу надолго. После переноса — ANALYZE и,
+если свободных страниц набралось больше доли VACUUM_FREE_RATIO, VACUUM.
+Планировщик выполняет проход раз в сутки (run_daily), вручную — `flask --app run archive-notifications`.
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+
+from .models import db, Notification, NotificationArchive
+
+log = logging.getLogger(__name__)
+
+_COLUMNS = ('id', 'type', 'title', 'message', 'related_id', 'created_at', 'user_id')
+
+
+def archive_notifications(days=None, batch_size=None, now=None):
+    """Переносит старые прочитанные уведомления в архив, возвращает число перенесённых"""
+    days = days if days is not None else current_app.config.get("NOTIFICATION_RETENTION_DAYS", 90)
+    batch_size = batch_size or current_app.config.get("NOTIFICATION_ARCHIVE_BATCH", 500)
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    n = Notification.__table__
+    archive = NotificationArchive.__table__
+    moved, last_id = 0, 0
+    while True:
+        conn = db.session.connection()
+        # keyset по id: каждая пачка продолжает просмотр с места, где остановилась предыдущая
+        ids = conn.execute(db.select(n.c.id).where(
+            n.c.is_read == True, n.c.created_at < cutoff, n.c.id > last_id
+        ).order_by(n.c.id).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        conn.execute(archive.insert().from_select(
+            list(_COLUMNS) + ['archived_at'],
+            db.select(*[n.c[name] for name in _COLUMNS], db.literal(now)).where(n.c.id.in_(ids)),
+        ))
+        conn.execute(n.delete().where(n.c.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+        last_id = ids[-1]
+    return moved
+
+
+def maintain(free_ratio=None):
+    """ANALYZE и VACUUM при заметной доле свободных страниц; True — если база сжималась"""
+    free_ratio = free_ratio if free_ratio is not None else current_app.config.get("VACUUM_FREE_RATIO", 0.2)
+    # VACUUM не выполняется внутри транзакции
+    db.session.commit()
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        vacuumed = False
+        if db.engine.dialect.name == "sqlite":
+            pages = conn.exec_driver_sql("PRAGMA page_count").scalar() or 0
+            free = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+            if pages and free / pages >= free_ratio:
+                conn.exec_driver_sql("VACUUM")
+                vacuumed = True
+        conn.exec_driver_sql("ANALYZE")
+    return vacuumed
+
+
+def run_daily(today=None):
+    """Архивация и обслуживание не чаще раза в сутки (отметка в памяти процесса)"""
+    today = today or date.today()
+    if current_app.extensions.get("retention_last_run") == today:
+        return 0
+    moved = archive_notifications()
+    vacuumed = maintain()
+    current_app.extensions["retention_last_run"] = today
+    if moved or vacuumed:
+        log.info("retention: archived %s notifications, vacuum=%s", moved, vacuumed)
+    return moved
+
+
+@click.command("archive-notifications")
+@click.option("--days", type=int, default=None, help="Архивировать прочитанные уведомления старше N дней")
+@click.option("--vacuum/--no-vacuum", default=True, help="Выполнить ANALYZE/VACUUM после переноса")
+def archive_command(days, vacuum):
+    """Переносит старые прочитанные уведомления в архив"""
+    moved = archive_notifications(days=days)
+    click.echo(f"Перенесено в архив: {moved}")
+    if vacuum and maintain():
+        click.echo("База сжата (VACUUM)")
+
+
+def init_app(app):
+    app.cli.add_command(archive_command)
@@ -0,0 +1,165 @@
+"""
+Помесячные агрегаты операций: (пользователь, месяц, категория, тип) -> сумма и количество.
+
+Таблица monthly_rollups обновляется в той же транзакции, что и сами операции:
+изменения Transaction за flush (app/tracking.py) переводятся в приращения агрегатов. Код, который пишет операции в обход ORM
+(bulk insert / UPDATE ... WHERE), должен сам вызвать apply_deltas().
+Полный пересчёт — ``flask --app run rebuild-rollups``; для существующей базы таблицу
+заполняет и снабжает уникальным индексом ``python migrate_indexes.py``.
+"""
+from collections import defaultdict
+from datetime import date
+
+import click
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import db, Category, MonthlyRollup, Transaction, TransactionType
+from . import tracking
+
+_FIELDS = ('user_id', 'date', 'category_id', 'type', 'amount')
+
+
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def new_deltas():
+    """(user_id, month, category_id, type) -> [сумма, количество]"""
+    return defaultdict(lambda: [0.0, 0])
+
+
+def add_delta(deltas, user_id, when, category_id, type_, amount, sign=1, count=1):
+    """amount — сумма count операций одного месяца/категории/типа"""
+    if when is None or type_ is None:
+        return
+    entry = deltas[(user_id, month_start(when), category_id, type_)]
+    entry[0] += sign * (amount or 0.0)
+    entry[1] += sign * count
+
+
+def _upsert():
+    """INSERT строки группы, а если она уже есть (uq_monthly_rollups_group) — прибавление к ней"""
+    table = MonthlyRollup.__table__
+    zero = db.literal_column('0')
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[func.coalesce(table.c.user_id, zero), table.c.month,
+                        func.coalesce(table.c.category_id, zero), table.c.type],
+        set_={'total': table.c.total + stmt.excluded.total, 'count': table.c.count + stmt.excluded.count},
+    )
+
+
+def apply_deltas(deltas, connection=None):
+    """Применяет приращения к monthly_rollups одним INSERT ... ON CONFLICT DO UPDATE:
+    параллельные записи в одну группу не создают дубликатов строк"""
+    conn = connection if connection is not None else db.session.connection()
+    table = MonthlyRollup.__table__
+    rows = [
+        {'user_id': user_id, 'month': month, 'category_id': category_id, 'type': type_,
+         'total': d_total, 'count': d_count}
+        for (user_id, month, category_id, type_), (d_total, d_count) in deltas.items()
+        if d_total or d_count
+    ]
+    if not rows:
+        return
+    conn.execute(_upsert(), rows)
+    if any(row['count'] < 0 for row in rows):
+        conn.execute(table.delete().where(table.c.count <= 0))
+
+
+def _add(deltas, values, sign=1):
+    add_delta(deltas, values.user_id, values.date, values.category_id, values.type, values.amount, sign)
+
+
+@tracking.on_flush
+def _apply_rollup_deltas(session, changes):
+    deltas = new_deltas()
+    for old, new in tracking.changed(changes, _FIELDS):
+        if old is not None:
+            _add(deltas, old, sign=-1)
+        if new is not None:
+            _add(deltas, new)
+    if deltas:
+        apply_deltas(deltas, session.connection())
+
+
+def rebuild():
+    """Пересчитывает таблицу агрегатов целиком по transactions"""
+    table = MonthlyRollup.__table__
+    tx = Transaction.__table__
+    month_expr = func.date(tx.c.date, 'start of month')
+    select = db.select(
+        tx.c.user_id, month_expr, tx.c.category_id, tx.c.type,
+        func.sum(tx.c.amount), func.count(tx.c.id),
+    ).group_by(tx.c.user_id, month_expr, tx.c.category_id, tx.c.type)
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['user_id', 'month', 'category_id', 'type', 'total', 'count'], select
+    ))
+    db.session.commit()
+    return MonthlyRollup.query.count()
+
+
+def ensure_built():
+    """Заполняет агрегаты для базы, где операции есть, а таблица агрегатов ещё пустая
+    (вызывается из migrate_indexes.py, не при старте приложения)"""
+    has_rollups = db.session.query(MonthlyRollup.query.exists()).scalar()
+    if not has_rollups and db.session.query(Transaction.query.exists()).scalar():
+        rebuild()
+
+
+# --- Чтение ---
+
+def _scope(q, user_id, start=None, end=None):
+    if user_id is not None:
+        q = q.filter(MonthlyRollup.user_id == user_id)
+    if start is not None:
+        q = q.filter(MonthlyRollup.month >= month_start(start))
+    if end is not None:
+        # end — исключающая граница, первое число месяца
+        q = q.filter(MonthlyRollup.month < month_start(end))
+    return q
+
+
+def totals_by_type(user_id, start=None, end=None):
+    """{TransactionType: сумма} за месяцы [start, end); без границ — за всё время"""
+    q = db.session.query(MonthlyRollup.type, func.sum(MonthlyRollup.total))
+    q = _scope(q, user_id, start, end).group_by(MonthlyRollup.type)
+    result = {TransactionType.income: 0.0, TransactionType.expense: 0.0}
+    for type_, total in q:
+        result[type_] = float(total or 0.0)
+    return result
+
+
+def totals_by_category(user_id, start=None, end=None, type_=TransactionType.expense):
+    """Суммы по категориям (по убыванию): [(category_id, name, color, icon, total, count)].
+    type_=None — все типы вместе"""
+    total = func.sum(MonthlyRollup.total)
+    q = db.session.query(
+        MonthlyRollup.category_id, Category.name, Category.color, Category.icon,
+        total, func.sum(MonthlyRollup.count),
+    ).outerjoin(Category, Category.id == MonthlyRollup.category_id)
+    q = _scope(q, user_id, start, end)
+    if type_ is not None:
+        q = q.filter(MonthlyRollup.type == type_)
+    q = q.group_by(MonthlyRollup.category_id, Category.name, Category.color, Category.icon)
+    return [tuple(row) for row in q.order_by(total.desc())]
+
+
+def monthly_totals(user_id, start=None, end=None):
+    """{(первое число месяца, TransactionType): сумма}"""
+    q = db.session.query(MonthlyRollup.month, MonthlyRollup.type, func.sum(MonthlyRollup.total))
+    q = _scope(q, user_id, start, end).group_by(MonthlyRollup.month, MonthlyRollup.type)
+    return {(month, type_): float(total or 0.0) for month, type_, total in q}
+
+
+@click.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Пересчитывает помесячные агрегаты операций"""
+    rows = rebuild()
+    click.echo(f"Агрегатов: {rows}")
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_rollups_command)
@@ -0,0 +1,152 @@
+"""
+Строки списков только для чтения.
+
+Страницы-списки (операции, повторяющиеся операции, запланированные расходы, шаблоны, долги)
+выбирают лишь показываемые колонки — с уже присоединёнными названием и цветом категории и
+названием счёта — в неизменяемые dataclass со __slots__. Объекты не попадают в identity map
+сессии и не отслеживаются, поэтому строка в разы легче ORM-сущности и создаётся быстрее.
+Для изменения записи по-прежнему загружается модель.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import aliased
+
+from .models import (db, Account, Category, Debt, DebtType, Frequency, PlannedExpense, Recurring,
+                     Transaction, TransactionTemplate, TransactionType)
+
+
+@dataclass(frozen=True, slots=True)
+class TransactionRow:
+    id: int
+    date: datetime
+    amount: float
+    type: TransactionType
+    note: Optional[str]
+    category_name: Optional[str]
+    category_color: Optional[str]
+    account_name: Optional[str]
+    account_currency: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class RecurringRow:
+    id: int
+    start_date: datetime
+    next_date: datetime
+    amount: float
+    type: TransactionType
+    frequency: Frequency
+    active: bool
+    category_name: Optional[str]
+    category_color: Optional[str]
+    account_name: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class PlannedExpenseRow:
+    id: int
+    name: str
+    amount: float
+    planned_date: datetime
+    category_name: Optional[str]
+    category_color: Optional[str]
+    account_name: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class TemplateRow:
+    id: int
+    name: str
+    amount: float
+    type: TransactionType
+    note: Optional[str]
+    use_count: int
+    category_name: Optional[str]
+    category_color: Optional[str]
+    account_name: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class DebtRow:
+    id: int
+    name: str
+    debt_type: DebtType
+    amount: float
+    paid_amount: float
+    current_balance: Optional[float]
+    credit_limit: Optional[float]
+    is_owed_to_me: bool
+    interest_rate: Optional[float]
+    payment_date: Optional[datetime]
+    payment_amount: Optional[float]
+    min_payment: Optional[float]
+    due_date: Optional[datetime]
+
+    # те же расчёты, что у модели: свойства читают только колонки
+    remaining_amount = property(Debt.remaining_amount.fget)
+    available_credit = property(Debt.available_credit.fget)
+    utilization_rate = property(Debt.utilization_rate.fget)
+
+
+def _with_names(q, model, columns):
+    """Запрос по model -> запрос кортежей columns + категория (название, цвет) + счёт"""
+    cat = aliased(Category)
+    acc = aliased(Account)
+    return q.outerjoin(cat, cat.id == model.category_id).outerjoin(acc, acc.id == model.account_id).with_entities(
+        *columns, cat.name, cat.color, acc.name,
+        *([acc.currency] if model is Transaction else []),
+    )
+
+
+def as_rows(row_type, result):
+    return [row_type(*values) for values in result]
+
+
+def transaction_rows(q):
+    """Отфильтрованный запрос операций -> запрос значений TransactionRow (сортировку задаёт вызывающий)"""
+    t = Transaction
+    return _with_names(q, t, (t.id, t.date, t.amount, t.type, t.note))
+
+
+def recurring_rows(user_id=None):
+    r = Recurring
+    q = r.query if user_id is None else r.query.filter(r.user_id == user_id)
+    q = _with_names(q, r, (r.id, r.start_date, r.next_date, r.amount, r.type, r.frequency, r.active))
+    return as_rows(RecurringRow, q.order_by(r.id.desc()))
+
+
+def planned_expense_rows(completed, user_id=None, limit=None):
+    """Незавершённые — по дате, завершённые — от последних"""
+    p = PlannedExpense
+    q = p.query.filter(p.is_completed == completed)
+    if user_id is not None:
+        q = q.filter(p.user_id == user_id)
+    q = _with_names(q, p, (p.id, p.name, p.amount, p.planned_date))
+    q = q.order_by(p.planned_date.desc() if completed else p.planned_date)
+    if limit:
+        q = q.limit(limit)
+    return as_rows(PlannedExpenseRow, q)
+
+
+def template_rows(user_id=None):
+    """Общие шаблоны и шаблоны пользователя, самые используемые — первыми"""
+    tt = TransactionTemplate
+    q = tt.query
+    if user_id is not None:
+        q = q.filter(db.or_(tt.user_id == None, tt.user_id == user_id))
+    q = _with_names(q, tt, (tt.id, tt.name, tt.amount, tt.type, tt.note, tt.use_count))
+    return as_rows(TemplateRow, q.order_by(tt.use_count.desc(), tt.name))
+
+
+def debt_rows(user_id=None):
+    d = Debt
+    q = d.query.filter(d.is_active == True)
+    if user_id is not None:
+        q = q.filter(d.user_id == user_id)
+    q = q.with_entities(
+        d.id, d.name, d.debt_type, d.amount, d.paid_amount, d.current_balance, d.credit_limit,
+        d.is_owed_to_me, d.interest_rate, d.payment_date, d.payment_amount, d.min_payment, d.due_date,
+    ).order_by(d.id.desc())
+    return as_rows(DebtRow, q)
@@ -0,0 +1,198 @@
+"""
+Фоновый планировщик: генерация повторяющихся операций и уведомлений по таймеру,
+а не в каждом запросе.
+
+Два режима работы:
+- поток внутри веб-процесса (SCHEDULER_ENABLED=1, по умолчанию);
+- отдельный воркер: ``flask --app run scheduler`` (в веб-процессах тогда SCHEDULER_ENABLED=0).
+
+Для каждого пользователя хранится отметка SchedulerWatermark.generated_until —
+день, до которого операции уже сгенерированы. После простоя первый проход
+догоняет все пропущенные дни (generate_recurring_occurrences идёт от next_date).
+Окно генерации забирается условным UPDATE отметки в той же транзакции, что и сами
+операции: потоки разных воркеров и запросы (ensure_user_current) не сгенерируют его дважды.
+"""
+import logging
+import threading
+from datetime import datetime, date, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import db, User, SchedulerWatermark
+from .utils import generate_recurring_occurrences
+from .notifications import generate_all_notifications
+from . import balances, retention
+
+log = logging.getLogger(__name__)
+
+def _fresh_users():
+    """user_id -> день, за который пользователь уже догнан (кеш процесса, чтобы запросы не ходили в БД)"""
+    return current_app.extensions.setdefault("scheduler_fresh_users", {})
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+# отметка нового пользователя — раньше любого окна генерации
+_NEVER = datetime(1970, 1, 1)
+
+
+def _claim(user_id, up_to):
+    """Сдвигает отметку до up_to, если она отстала; True — окно досталось этой транзакции.
+
+    UPDATE ... WHERE generated_until < :up_to держит блокировку записи до commit, поэтому
+    второй процесс дождётся её и увидит уже сдвинутую отметку (rowcount 0).
+    """
+    table = SchedulerWatermark.__table__
+    now = datetime.utcnow()
+    db.session.execute(insert(table).values(user_id=user_id, generated_until=_NEVER, updated_at=now)
+                       .on_conflict_do_nothing(index_elements=['user_id']))
+    res = db.session.execute(table.update().where(
+        table.c.user_id == user_id, table.c.generated_until < up_to,
+    ).values(generated_until=up_to, updated_at=now))
+    return res.rowcount == 1
+
+
+def run_for_user(user_id, up_to=None):
+    """Догоняет одного пользователя: повторяющиеся операции + уведомления, сдвигает отметку"""
+    up_to = up_to or _day_start(date.today())
+    created = 0
+    # отметка и операции фиксируются одним commit
+    if _claim(user_id, up_to):
+        created = generate_recurring_occurrences(up_to=up_to, user_id=user_id)
+    generate_all_notifications(user_id=user_id)
+    db.session.commit()
+    _fresh_users()[user_id] = up_to.date()
+    return created
+
+
+def ensure_user_current(user_id):
+    """Дешёвая проверка для запроса: генерирует данные пользователя, только если его отметка отстала.
+
+    Нужна на случай, когда планировщик ещё не прошёл после полуночи или запущен отдельным воркером.
+    После первой проверки за день обращений к БД нет.
+    """
+    today = date.today()
+    if _fresh_users().get(user_id) == today:
+        return 0
+    wm = SchedulerWatermark.query.filter_by(user_id=user_id).first()
+    if wm and wm.generated_until.date() >= today:
+        _fresh_users()[user_id] = today
+        return 0
+    return run_for_user(user_id)
+
+
+def run_due_jobs(now: datetime = None):
+    """Один проход планировщика.
+
+    Повторяющиеся операции генерируются только для пользователей с отставшей отметкой
+    (включая пропущенные за время простоя дни), уведомления пересчитываются на каждом проходе.
+    Снимки балансов за вчерашний день пишутся один раз (счета, у которых снимок уже есть, пропускаются).
+    Раз в сутки старые прочитанные уведомления уходят в архив, после чего база обслуживается (ANALYZE/VACUUM).
+    """
+    now = now or datetime.now()
+    up_to = _day_start(now.date())
+    stale = db.session.query(User.id, SchedulerWatermark.generated_until).outerjoin(
+        SchedulerWatermark, SchedulerWatermark.user_id == User.id
+    ).filter(db.or_(
+        SchedulerWatermark.id == None,
+        SchedulerWatermark.generated_until < up_to
+    )).all()
+
+    created = 0
+    for user_id, generated_until in stale:
+        _fresh_users()[user_id] = up_to.date()
+        if not _claim(user_id, up_to):
+            # окно уже забрал другой воркер или запрос
+            continue
+        if generated_until is not None and (up_to - generated_until).days > 1:
+            log.info("scheduler: catching up user %s from %s", user_id, generated_until.date())
+        created += generate_recurring_occurrences(up_to=up_to, user_id=user_id)
+        db.session.commit()
+    balances.take_snapshots(now.date() - timedelta(days=1))
+    db.session.commit()
+
+    generate_all_notifications()
+    retention.run_daily(now.date())
+    return created
+
+
+class Scheduler:
+    """Поток, выполняющий run_due_jobs раз в interval секунд"""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._start_lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="budget-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def tick(self):
+        with self.app.app_context():
+            try:
+                return run_due_jobs()
+            except Exception:
+                db.session.rollback()
+                log.exception("scheduler: run failed")
+                return 0
+            finally:
+                db.session.remove()
+
+    def _loop(self):
+        # Первый проход сразу — догоняем пропущенное за время простоя
+        while not self._stop.is_set():
+            self.tick()
+            self._stop.wait(self.interval)
+
+
+@click.command("scheduler")
+@click.option("--once", is_flag=True, help="Выполнить один проход и выйти")
+@click.option("--interval", type=int, default=None, help="Интервал между проходами, сек")
+def scheduler_command(once, interval):
+    """Запускает планировщик отдельным воркером"""
+    app = current_app._get_current_object()
+    worker = Scheduler(app, interval or app.config.get("SCHEDULER_INTERVAL", 300))
+    if once:
+        created = worker.tick()
+        click.echo(f"Создано операций: {created}")
+        return
+    click.echo(f"Планировщик запущен, интервал {worker.interval} с")
+    try:
+        worker._loop()
+    except KeyboardInterrupt:
+        pass
+
+
+def init_app(app):
+    """Регистрирует CLI-команду и (если включено) запускает поток при первом запросе"""
+    app.cli.add_command(scheduler_command)
+    if not app.config.get("SCHEDULER_ENABLED", True) or app.testing:
+        return
+    scheduler = Scheduler(app, app.config.get("SCHEDULER_INTERVAL", 300))
+    app.extensions["scheduler"] = scheduler
+
+    # Поток стартует лениво, чтобы CLI-команды (миграции, воркер) его не поднимали
+    @app.before_request
+    def _start_scheduler():
+        if not scheduler.running:
+            scheduler.start()
@@ -0,0 +1,127 @@
+"""
+Полнотекстовый поиск по операциям: SQLite FTS5 по примечанию и названию категории.
+
+Виртуальная таблица transactions_fts (rowid = transactions.id) поддерживается
+триггерами на transactions и categories, поэтому в индекс попадают и операции,
+вставленные в обход ORM. Токенизатор unicode61 приводит регистр в том числе для
+кириллицы; «ё» заменяется на «е» и при индексации, и в запросе.
+Если FTS5 недоступен (другая СУБД / сборка SQLite), поиск остаётся на LIKE.
+"""
+import re
+
+import click
+from flask import current_app
+from sqlalchemy import column, table, text
+
+from .models import db, Transaction
+
+FTS_TABLE = "transactions_fts"
+fts = table(FTS_TABLE, column("rowid"))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _yo(expr):
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        note, category, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, note, category) VALUES (
+            new.id, {_yo('new.note')},
+            (SELECT {_yo('name')} FROM categories WHERE id = new.category_id));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_au AFTER UPDATE OF note, category_id ON transactions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, note, category) VALUES (
+            new.id, {_yo('new.note')},
+            (SELECT {_yo('name')} FROM categories WHERE id = new.category_id));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS categories_fts_au AFTER UPDATE OF name ON categories BEGIN
+        UPDATE {FTS_TABLE} SET category = {_yo('new.name')}
+        WHERE rowid IN (SELECT id FROM transactions WHERE category_id = new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS categories_fts_ad AFTER DELETE ON categories BEGIN
+        UPDATE {FTS_TABLE} SET category = NULL
+        WHERE rowid IN (SELECT id FROM transactions WHERE category_id = old.id);
+    END""",
+]
+
+_FILL = f"""INSERT INTO {FTS_TABLE}(rowid, note, category)
+    SELECT t.id, {_yo('t.note')}, {_yo('c.name')}
+    FROM transactions t LEFT JOIN categories c ON c.id = t.category_id"""
+
+
+def match_expression(query):
+    """Строка поиска -> выражение MATCH: все слова, каждое как префикс. None, если слов нет"""
+    words = _WORD_RE.findall((query or "").replace("ё", "е").replace("Ё", "Е"))
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def _match(expr):
+    return text(f"{FTS_TABLE} MATCH :fts_q").bindparams(fts_q=expr)
+
+
+def is_enabled(app=None):
+    return (app or current_app).extensions.get("fts_enabled", False)
+
+
+def filter_query(qs, query):
+    """Оставляет в запросе операции, найденные по индексу"""
+    expr = match_expression(query)
+    if expr is None:
+        return qs.filter(db.false())
+    matched = db.select(fts.c.rowid).where(_match(expr))
+    return qs.filter(Transaction.id.in_(matched.scalar_subquery()))
+
+
+def ranked(qs, query, limit=20):
+    """Операции по релевантности (bm25; совпадение в примечании весит больше, чем в категории)"""
+    expr = match_expression(query)
+    if expr is None:
+        return []
+    return qs.join(fts, fts.c.rowid == Transaction.id).filter(_match(expr)).order_by(
+        text(f"bm25({FTS_TABLE}, 1.0, 0.5)"), Transaction.date.desc()
+    ).limit(limit).all()
+
+
+def rebuild():
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+        conn.exec_driver_sql(_FILL)
+
+
+@click.command("rebuild-search")
+def rebuild_search_command():
+    """Переиндексирует операции для полнотекстового поиска"""
+    rebuild()
+    click.echo("Поисковый индекс перестроен")
+
+
+def init_app(app):
+    """Создаёт FTS-таблицу и триггеры (один раз для существующей базы — с наполнением)"""
+    app.extensions["fts_enabled"] = False
+    if db.engine.dialect.name != "sqlite":
+        return
+    app.cli.add_command(rebuild_search_command)
+    try:
+        with db.engine.begin() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)
+            ).first() is not None
+            for ddl in _DDL:
+                conn.exec_driver_sql(ddl)
+            if not exists:
+                conn.exec_driver_sql(_FILL)
+    except Exception as e:  # сборка SQLite без FTS5
+        app.logger.warning("Full-text search disabled: %s", e)
+        return
+    app.extensions["fts_enabled"] = True
@@ -0,0 +1,126 @@
+"""
+Ряды доходов/расходов за произвольный период с шагом день/неделя/месяц/квартал/год.
+
+Суммы считаются одним GROUP BY по началу интервала (выражение SQLite над датой),
+пустые интервалы дозаполняются нулями в NumPy. Если период состоит из целых месяцев
+и нет фильтров по счёту и тегу, интервалы от месяца и крупнее берутся из
+помесячных агрегатов (monthly_rollups).
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import case, func
+
+from .models import db, MonthlyRollup, Transaction, TransactionType, transaction_tags
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+MAX_BUCKETS = 5000
+
+
+def _bucket_expr(column, granularity):
+    """Начало интервала в виде 'YYYY-MM-DD' (неделя начинается с понедельника)"""
+    if granularity == 'day':
+        return func.date(column)
+    if granularity == 'week':
+        return func.date(column, 'weekday 0', '-6 days')
+    if granularity == 'month':
+        return func.date(column, 'start of month')
+    if granularity == 'quarter':
+        month = db.cast(func.strftime('%m', column), db.Integer)
+        return func.printf('%s-%02d-01', func.strftime('%Y', column), (month - 1) // 3 * 3 + 1)
+    return func.date(column, 'start of year')
+
+
+def bucket_starts(start, end, granularity):
+    """Начала всех интервалов, пересекающих [start, end], как datetime64[D]"""
+    start, end = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    if granularity == 'day':
+        return np.arange(start, end + 1, dtype='datetime64[D]')
+    if granularity == 'week':
+        # 1970-01-01 — четверг: сдвигаем к понедельнику своей недели
+        first = start - (start.astype('int64') + 3) % 7
+        return np.arange(first, end + 1, 7, dtype='datetime64[D]')
+    if granularity in ('month', 'quarter'):
+        first = start.astype('datetime64[M]')
+        if granularity == 'quarter':
+            first = first - first.astype('int64') % 3
+        step = 3 if granularity == 'quarter' else 1
+        return np.arange(first, end.astype('datetime64[M]') + 1, step).astype('datetime64[D]')
+    return np.arange(start.astype('datetime64[Y]'), end.astype('datetime64[Y]') + 1).astype('datetime64[D]')
+
+
+def _query_transactions(user_id, start, end, granularity, category_id, account_id, tag_id):
+    bucket = _bucket_expr(Transaction.date, granularity)
+    income = Transaction.type == TransactionType.income
+    q = db.session.query(
+        bucket,
+        func.sum(case((income, Transaction.amount), else_=0)),
+        func.sum(case((income, 0), else_=Transaction.amount)),
+    ).filter(
+        Transaction.date >= datetime.combine(start, datetime.min.time()),
+        Transaction.date < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+    )
+    if user_id is not None:
+        q = q.filter(Transaction.user_id == user_id)
+    if category_id:
+        q = q.filter(Transaction.category_id == category_id)
+    if account_id:
+        q = q.filter(Transaction.account_id == account_id)
+    if tag_id:
+        q = q.filter(db.exists().where(
+            transaction_tags.c.transaction_id == Transaction.id,
+            transaction_tags.c.tag_id == tag_id,
+        ))
+    return q.group_by(bucket).all()
+
+
+def _query_rollups(user_id, start, end, granularity, category_id):
+    bucket = _bucket_expr(MonthlyRollup.month, granularity)
+    income = MonthlyRollup.type == TransactionType.income
+    q = db.session.query(
+        bucket,
+        func.sum(case((income, MonthlyRollup.total), else_=0)),
+        func.sum(case((income, 0), else_=MonthlyRollup.total)),
+    ).filter(
+        MonthlyRollup.month >= date(start.year, start.month, 1),
+        MonthlyRollup.month <= end,
+    )
+    if user_id is not None:
+        q = q.filter(MonthlyRollup.user_id == user_id)
+    if category_id:
+        q = q.filter(MonthlyRollup.category_id == category_id)
+    return q.group_by(bucket).all()
+
+
+def build_series(user_id, start, end, granularity='month', category_id=None, account_id=None, tag_id=None):
+    """{'buckets': [...], 'income': [...], 'expense': [...], 'net': [...]} за [start, end]"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity: одно из {', '.join(GRANULARITIES)}")
+    if start > end:
+        raise ValueError("Начало периода позже конца")
+    buckets = bucket_starts(start, end, granularity)
+    if len(buckets) > MAX_BUCKETS:
+        raise ValueError("Слишком много интервалов — выберите шаг крупнее")
+
+    whole_months = start.day == 1 and (end + timedelta(days=1)).day == 1
+    if granularity in ('month', 'quarter', 'year') and whole_months and not account_id and not tag_id:
+        rows = _query_rollups(user_id, start, end, granularity, category_id)
+    else:
+        rows = _query_transactions(user_id, start, end, granularity, category_id, account_id, tag_id)
+
+    income = np.zeros(len(buckets))
+    expense = np.zeros(len(buckets))
+    if rows:
+        keys = np.array([key for key, _, _ in rows], dtype='datetime64[D]')
+        idx = np.searchsorted(buckets, keys)
+        np.add.at(income, idx, np.array([inc or 0.0 for _, inc, _ in rows], dtype=float))
+        np.add.at(expense, idx, np.array([exp or 0.0 for _, _, exp in rows], dtype=float))
+    return {
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'buckets': [str(b) for b in buckets],
+        'income': np.round(income, 2).tolist(),
+        'expense': np.round(expense, 2).tolist(),
+        'net': np.round(income - expense, 2).tolist(),
+    }
@@ -0,0 +1,84 @@
+"""
+Изменения операций за один flush — общий источник для производных данных.
+
+Перед flush запоминаются прежние значения полей FIELDS у изменённых и удалённых
+Transaction; после flush каждый подписчик (on_flush) получает список Change(old, new):
+old=None — операция вставлена, new=None — удалена. Подписчики вызываются в порядке
+регистрации, в том же flush, и пишут свои таблицы через session.connection(),
+поэтому производные данные (агрегаты, балансы, бюджеты) меняются в той же транзакции.
+Код, который пишет операции в обход ORM, сюда не попадает и вызывает apply_deltas() модулей сам.
+"""
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import db, Transaction
+
+FIELDS = ('user_id', 'account_id', 'category_id', 'date', 'type', 'amount')
+
+Values = namedtuple('Values', FIELDS)
+Change = namedtuple('Change', 'old new')
+
+_handlers = []
+
+
+def on_flush(handler):
+    """Регистрирует handler(session, changes); вызывается после каждого flush, в том числе без изменений операций"""
+    _handlers.append(handler)
+    return handler
+
+
+def changed(changes, fields):
+    """Изменения, которые затрагивают fields: вставки, удаления и правки хотя бы одного из полей"""
+    for change in changes:
+        if change.old is None or change.new is None or any(
+                getattr(change.old, f) != getattr(change.new, f) for f in fields):
+            yield change
+
+
+def _snapshot(obj):
+    """Значения полей до изменения (история атрибутов либо текущее значение)"""
+    state = db.inspect(obj)
+    values = []
+    for attr in FIELDS:
+        hist = state.attrs[attr].history
+        values.append(hist.deleted[0] if hist.deleted else getattr(obj, attr))
+    return Values(*values)
+
+
+def _current(obj):
+    return Values(*(getattr(obj, attr) for attr in FIELDS))
+
+
+@event.listens_for(Session, "before_flush")
+def _remember_old_values(session, flush_context, instances):
+    old = session.info.setdefault('_tx_old', {})
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Transaction) and obj not in old:
+            old[obj] = _snapshot(obj)
+
+
+@event.listens_for(Session, "after_flush")
+def _dispatch(session, flush_context):
+    old = session.info.pop('_tx_old', {})
+    changes = [Change(None, _current(obj)) for obj in session.new if isinstance(obj, Transaction)]
+    for obj, values in old.items():
+        if obj in session.deleted:
+            changes.append(Change(values, None))
+            continue
+        new_values = _current(obj)
+        if new_values != values:
+            changes.append(Change(values, new_values))
+    for handler in _handlers:
+        handler(session, changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_old_values(session):
+    session.info.pop('_tx_old', None)
+
+
+# Старое значение поля нужно знать, даже если объект был expired к моменту присваивания
+for _attr in FIELDS:
+    event.listen(getattr(Transaction, _attr), "set", lambda *args: None, active_history=True)
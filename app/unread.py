@@ -0,0 +1,163 @@
+"""
+Счётчик непрочитанных уведомлений для шапки страниц.
+
+notification_counters хранит число непрочитанных по владельцу (owner_id = user_id,
+0 — уведомления без владельца) и поддерживается триггерами на notifications, поэтому
+учитываются и вставки INSERT ... SELECT, и массовые UPDATE. Поверх таблицы — кеш процесса
+(UnreadCache): context processor берёт число из словаря, не обращаясь к БД.
+Запись через сессию сбрасывает затронутые записи кеша после commit (изменения ORM-объектов
+Notification отслеживаются автоматически, массовые — через invalidate()); изменения из
+других процессов видны не позже чем через UNREAD_CACHE_TTL секунд.
+Для существующей базы счётчики пересчитывает ``python migrate_indexes.py``
+или ``flask --app run rebuild-unread``.
+"""
+import threading
+import time
+
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import db, Notification, NotificationCounter
+
+ALL = object()
+
+_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS notifications_unread_ai AFTER INSERT ON notifications
+    WHEN new.is_read = 0 BEGIN
+        INSERT INTO notification_counters(owner_id, unread) SELECT coalesce(new.user_id, 0), 0
+        WHERE NOT EXISTS (SELECT 1 FROM notification_counters WHERE owner_id = coalesce(new.user_id, 0));
+        UPDATE notification_counters SET unread = unread + 1 WHERE owner_id = coalesce(new.user_id, 0);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS notifications_unread_au AFTER UPDATE OF is_read, user_id ON notifications
+    BEGIN
+        UPDATE notification_counters SET unread = unread - 1
+        WHERE old.is_read = 0 AND owner_id = coalesce(old.user_id, 0);
+        INSERT INTO notification_counters(owner_id, unread) SELECT coalesce(new.user_id, 0), 0
+        WHERE new.is_read = 0
+          AND NOT EXISTS (SELECT 1 FROM notification_counters WHERE owner_id = coalesce(new.user_id, 0));
+        UPDATE notification_counters SET unread = unread + 1
+        WHERE new.is_read = 0 AND owner_id = coalesce(new.user_id, 0);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS notifications_unread_ad AFTER DELETE ON notifications
+    WHEN old.is_read = 0 BEGIN
+        UPDATE notification_counters SET unread = unread - 1 WHERE owner_id = coalesce(old.user_id, 0);
+    END""",
+]
+
+_FILL = """INSERT INTO notification_counters(owner_id, unread)
+    SELECT coalesce(user_id, 0), count(*) FROM notifications WHERE is_read = 0
+    GROUP BY coalesce(user_id, 0)"""
+
+
+class UnreadCache:
+    """owner_id -> (число непрочитанных, момент устаревания)"""
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._data = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, owner_id, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(owner_id)
+            generation = self._generation
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        value = load(owner_id)
+        with self._lock:
+            # значение, прочитанное до сброса, в кеш не кладём
+            if generation == self._generation:
+                self._data[owner_id] = (value, now + self.ttl)
+        return value
+
+    def invalidate(self, owner_id=ALL):
+        with self._lock:
+            self._generation += 1
+            if owner_id is ALL:
+                self._data.clear()
+            else:
+                self._data.pop(owner_id, None)
+
+
+def _owner(user_id):
+    return user_id if user_id is not None else 0
+
+
+def _cache():
+    return current_app.extensions.get("unread_cache") if has_app_context() else None
+
+
+def _load(owner_id):
+    if not current_app.extensions.get("unread_counters"):
+        # без триггеров (не SQLite) счётчик не ведётся — считаем напрямую
+        q = Notification.query.filter_by(is_read=False)
+        q = q.filter(Notification.user_id == owner_id) if owner_id else q.filter(Notification.user_id == None)
+        return q.count()
+    return db.session.query(NotificationCounter.unread).filter_by(owner_id=owner_id).scalar() or 0
+
+
+def count(user_id):
+    """Число непрочитанных уведомлений пользователя (None — уведомления без владельца)"""
+    return _cache().get(_owner(user_id), _load)
+
+
+def invalidate(user_id=ALL, session=None):
+    """Сбросить кеш после commit текущей транзакции (для записи в обход ORM-объектов)"""
+    session = session or db.session()
+    touched = session.info.setdefault('_unread_touched', set())
+    touched.add(user_id if user_id is ALL else _owner(user_id))
+
+
+@event.listens_for(Session, "after_flush")
+def _remember_touched(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Notification):
+            invalidate(obj.user_id, session)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cache(session):
+    touched = session.info.pop('_unread_touched', None)
+    cache = _cache()
+    if not touched or cache is None:
+        return
+    if ALL in touched:
+        cache.invalidate()
+        return
+    for owner_id in touched:
+        cache.invalidate(owner_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session):
+    session.info.pop('_unread_touched', None)
+
+
+def rebuild(conn):
+    conn.exec_driver_sql("DELETE FROM notification_counters")
+    conn.exec_driver_sql(_FILL)
+
+
+@click.command("rebuild-unread")
+def rebuild_unread_command():
+    """Пересчитывает счётчики непрочитанных уведомлений"""
+    with db.engine.begin() as conn:
+        rebuild(conn)
+    click.echo("Счётчики непрочитанных пересчитаны")
+
+
+def init_app(app):
+    """Создаёт триггеры счётчика и кеш; начальный пересчёт — в миграции, не при старте"""
+    app.extensions["unread_cache"] = UnreadCache(app.config.get("UNREAD_CACHE_TTL", 30))
+    app.extensions["unread_counters"] = False
+    if db.engine.dialect.name != "sqlite":
+        return
+    app.cli.add_command(rebuild_unread_command)
+    with db.engine.begin() as conn:
+        for ddl in _DDL:
+            conn.exec_driver_sql(ddl)
+    app.extensions["unread_counters"] = True
@@ -1,78 +1,51 @@
 import os
 from flask import current_app
-import pandas as pd
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
 from .models import Recurring, Transaction, TransactionType
 from . import db
 
-def save_report_pie(df, filename="income_vs_expense.png"):
-    # Проверяем, что данные не пустые
-    if df.empty or df['amount'].isna().all() or df['amount'].sum() == 0:
-        # Создаём пустой график с сообщением
-        fig, ax = plt.subplots()
-        ax.text(0.5, 0.5, 'Нет данных для отображения', 
-                horizontalalignment='center', verticalalignment='center',
-                transform=ax.transAxes, fontsize=14)
-        ax.axis('off')
-        path = os.path.join(current_app.config['REPORTS_FOLDER'], filename)
-        fig.savefig(path, bbox_inches='tight')
-        plt.close(fig)
-        return path
-    
-    # Удаляем NaN значения
-    df = df.dropna(subset=['amount'])
-    df = df[df['amount'] > 0]  # Убираем нулевые значения
-    
-    if df.empty:
-        # Создаём пустой график с сообщением
-        fig, ax = plt.subplots()
-        ax.text(0.5, 0.5, 'Нет данных для отображения', 
-                horizontalalignment='center', verticalalignment='center',
-                transform=ax.transAxes, fontsize=14)
-        ax.axis('off')
-        path = os.path.join(current_app.config['REPORTS_FOLDER'], filename)
-        fig.savefig(path, bbox_inches='tight')
-        plt.close(fig)
-        return path
-    
-    labels = df['type']
-    sizes = df['amount']
-    fig, ax = plt.subplots()
-    ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-    ax.axis('equal')
-    path = os.path.join(current_app.config['REPORTS_FOLDER'], filename)
-    fig.savefig(path, bbox_inches='tight')
-    plt.close(fig)
+def _no_data(ax):
+    ax.text(0.5, 0.5, 'Нет данных для отображения',
+            horizontalalignment='center', verticalalignment='center',
+            transform=ax.transAxes, fontsize=14)
+    ax.axis('off')
+
+# Функции отрисовки работают через объектный API Figure (без глобального состояния pyplot)
+# и принимают простые списки — их выполняет пул процессов app/renderer.py
+
+def render_report_pie(data, path):
+    """Круговая диаграмма доходов/расходов; data — [[тип, сумма], ...]"""
+    rows = [(label, amount) for label, amount in data if amount and amount > 0]
+    fig = Figure()
+    ax = fig.subplots()
+    if not rows:
+        _no_data(ax)
+    else:
+        ax.pie([amount for _, amount in rows], labels=[label for label, _ in rows],
+               autopct='%1.1f%%', startangle=90)
+        ax.axis('equal')
+    fig.savefig(path, format='png', bbox_inches='tight')
     return path
 
-def save_category_bar(df, filename="by_category.png"):
-    fig, ax = plt.subplots(figsize=(8,4))
-    if not df.empty:
-        df.plot(kind='bar', legend=False, ax=ax)
+def render_category_bar(data, path):
+    """Столбцы по категориям; data — [[категория, сумма], ...]"""
+    fig = Figure(figsize=(8,4))
+    ax = fig.subplots()
+    if data:
+        positions = range(len(data))
+        ax.bar(positions, [amount for _, amount in data])
+        ax.set_xticks(positions, [name for name, _ in data], rotation=90)
     ax.set_ylabel('Amount')
     ax.set_xlabel('Category')
     fig.tight_layout()
-    path = os.path.join(current_app.config['REPORTS_FOLDER'], filename)
-    fig.savefig(path, bbox_inches='tight')
-    plt.close(fig)
+    fig.savefig(path, format='png', bbox_inches='tight')
     return path
 
-def parse_csv_to_transactions(file_stream):
-    df = pd.read_csv(file_stream)
-    df.columns = [c.strip().lower() for c in df.columns]
-    expected = {'date','amount','type'}
-    if not expected.issubset(set(df.columns)):
-        raise ValueError(f"CSV должен содержать столбцы: {expected}")
-    df['date'] = pd.to_datetime(df['date'])
-    df['amount'] = df['amount'].astype(float)
-    df['type'] = df['type'].str.lower()
-    return df
-
 def _advance_date(d: datetime, frequency: str):
     if frequency == "daily":
         return d + timedelta(days=1)
@@ -82,11 +55,17 @@ def _advance_date(d: datetime, frequency: str):
         return d + relativedelta(months=1)
     return d + relativedelta(months=1)
 
-def generate_recurring_occurrences(up_to: datetime = None):
+def generate_recurring_occurrences(up_to: datetime = None, user_id: int = None):
     if up_to is None:
         up_to = datetime.combine(date.today(), datetime.min.time())
 
-    recurrings = Recurring.query.filter_by(active=True).all()
+    qs = Recurring.query.filter(
+        Recurring.active == True,
+        db.or_(Recurring.next_date == None, Recurring.next_date <= up_to)
+    )
+    if user_id is not None:
+        qs = qs.filter(Recurring.user_id == user_id)
+    recurrings = qs.all()
     created = 0
     for r in recurrings:
         current = r.next_date or r.start_date
@@ -104,12 +83,7 @@ def generate_recurring_occurrences(up_to: datetime = None):
             # preserve owner from recurring rule if present
             if getattr(r, 'user_id', None):
                 t.user_id = r.user_id
-            # Обновляем баланс счёта если есть
-            if r.account:
-                if r.type == TransactionType.income:
-                    r.account.balance += r.amount
-                else:
-                    r.account.balance -= r.amount
+            # баланс счёта обновится при flush (app/balances.py)
             db.session.add(t)
             created += 1
             current = _advance_date(current, r.frequency.value if hasattr(r.frequency, 'value') else r.frequency)
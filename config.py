@@ -11,4 +11,42 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     REPORTS_FOLDER = os.path.join(basedir, "app", "static", "reports")
     DEFAULT_CURRENCY = "RUB"
+    TRANSACTIONS_PAGE_SIZE = 50
+    # Кеш PNG-графиков отчёта (app/charts.py): вытеснение по размеру каталога и возрасту
+    CHART_CACHE_FOLDER = os.path.join(REPORTS_FOLDER, "charts")
+    CHART_CACHE_MAX_BYTES = int(os.environ.get("CHART_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+    CHART_CACHE_MAX_AGE = int(os.environ.get("CHART_CACHE_MAX_AGE", 30 * 24 * 3600))
+    # Пул процессов отрисовки (app/renderer.py)
+    CHART_RENDER_WORKERS = int(os.environ.get("CHART_RENDER_WORKERS", 2))
+    CHART_RENDER_TIMEOUT = int(os.environ.get("CHART_RENDER_TIMEOUT", 30))
+    CHART_RENDER_MAX_PENDING = int(os.environ.get("CHART_RENDER_MAX_PENDING", 16))
+    # Импорт CSV читается и записывается кусками по столько строк
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 5000))
     PERMANENT_SESSION_LIFETIME = timedelta(days=30)
+    # Фоновый планировщик повторяющихся операций и уведомлений (0 — если запущен отдельный воркер `flask scheduler`)
+    SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "1") == "1"
+    SCHEDULER_INTERVAL = int(os.environ.get("SCHEDULER_INTERVAL", 300))
+    # Кеш счётчика непрочитанных уведомлений: сколько секунд доверять значению из памяти процесса
+    UNREAD_CACHE_TTL = int(os.environ.get("UNREAD_CACHE_TTL", 30))
+    NOTIFICATIONS_PAGE_SIZE = 30
+    # Кеш результатов страниц и графиков (app/cache.py): LRU процесса по числу записей и объёму;
+    # RESULT_CACHE_URL (redis://...) — общий кеш для нескольких воркеров, TTL — срок записи в нём
+    RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "1") == "1"
+    RESULT_CACHE_URL = os.environ.get("RESULT_CACHE_URL")
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 512))
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 300))
+    # max-age для JSON API с ETag: 0 — браузер всегда переспрашивает (If-None-Match -> 304),
+    # больше — экономит и запросы, но данные после записи в другой вкладке обновятся не сразу
+    API_CACHE_MAX_AGE = int(os.environ.get("API_CACHE_MAX_AGE", 0))
+    # Хранение уведомлений (app/retention.py): прочитанные старше N дней уходят в архив
+    # пачками по NOTIFICATION_ARCHIVE_BATCH строк; VACUUM — когда свободных страниц больше доли VACUUM_FREE_RATIO
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get("NOTIFICATION_RETENTION_DAYS", 90))
+    NOTIFICATION_ARCHIVE_BATCH = int(os.environ.get("NOTIFICATION_ARCHIVE_BATCH", 500))
+    VACUUM_FREE_RATIO = float(os.environ.get("VACUUM_FREE_RATIO", 0.2))
+    # Поток событий /api/stream: пульс (сек), очередь одного подключения, буфер повтора
+    # для Last-Event-ID на пользователя и время жизни подключения (сек, потом браузер переподключится)
+    STREAM_HEARTBEAT = int(os.environ.get("STREAM_HEARTBEAT", 15))
+    STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 100))
+    STREAM_REPLAY = int(os.environ.get("STREAM_REPLAY", 200))
+    STREAM_MAX_AGE = int(os.environ.get("STREAM_MAX_AGE", 300))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Миграция балансов счетов на журнал операций
+Добавляет accounts.opening_balance (баланс без учёта операций) и таблицу
+дневных снимков account_snapshots
+"""
+
+import sys
+import codecs
+import sqlite3
+from pathlib import Path
+
+# Исправление кодировки для Windows
+if sys.platform == 'win32':
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
+    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+
+def migrate():
+    db_path = Path("personal_budget.db")
+    
+    if not db_path.exists():
+        print("База данных не найдена. Создайте её через приложение.")
+        return
+    
+    conn = sqlite3.connect(str(db_path))
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("PRAGMA table_info(accounts)")
+        columns = [row[1] for row in cursor.fetchall()]
+        
+        if 'opening_balance' not in columns:
+            cursor.execute("ALTER TABLE accounts ADD COLUMN opening_balance REAL NOT NULL DEFAULT 0.0")
+            # Текущий баланс уже включает все операции — начальный получаем вычитанием
+            cursor.execute("""
+                UPDATE accounts SET opening_balance = balance - COALESCE((
+                    SELECT SUM(CASE WHEN type = 'income' THEN amount ELSE -amount END)
+                    FROM transactions WHERE transactions.account_id = accounts.id
+                ), 0)
+            """)
+            print("✓ Добавлена колонка: opening_balance")
+        else:
+            print("- Колонка opening_balance уже существует")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS account_snapshots (
+                id INTEGER NOT NULL PRIMARY KEY,
+                account_id INTEGER NOT NULL REFERENCES accounts (id),
+                day DATE NOT NULL,
+                balance FLOAT NOT NULL,
+                CONSTRAINT uq_account_snapshots_account_day UNIQUE (account_id, day)
+            )
+        """)
+        print("✓ Таблица account_snapshots готова")
+        
+        conn.commit()
+        print("\n✓ Миграция завершена успешно!")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n✗ Ошибка при миграции: {e}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    print("Запуск миграции балансов счетов...")
+    migrate()
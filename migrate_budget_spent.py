@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Миграция бюджетов на накопитель потраченного
+Добавляет budgets.spent и заполняет его суммой расходов владельца бюджета
+в категории за период
+"""
+
+import sys
+import codecs
+import sqlite3
+from pathlib import Path
+
+# Исправление кодировки для Windows
+if sys.platform == 'win32':
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
+    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+
+def migrate():
+    db_path = Path("personal_budget.db")
+    
+    if not db_path.exists():
+        print("База данных не найдена. Создайте её через приложение.")
+        return
+    
+    conn = sqlite3.connect(str(db_path))
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("PRAGMA table_info(budgets)")
+        columns = [row[1] for row in cursor.fetchall()]
+        
+        if 'spent' not in columns:
+            cursor.execute("ALTER TABLE budgets ADD COLUMN spent REAL NOT NULL DEFAULT 0.0")
+            print("✓ Добавлена колонка: spent")
+        else:
+            print("- Колонка spent уже существует")
+        
+        cursor.execute("""
+            UPDATE budgets SET spent = COALESCE((
+                SELECT SUM(amount) FROM transactions
+                WHERE transactions.user_id IS budgets.user_id
+                  AND transactions.category_id = budgets.category_id
+                  AND transactions.type = 'expense'
+                  AND transactions.date >= budgets.period_start
+                  AND transactions.date <= budgets.period_end
+            ), 0)
+        """)
+        print(f"✓ Пересчитано бюджетов: {cursor.rowcount}")
+        
+        conn.commit()
+        print("\n✓ Миграция завершена успешно!")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n✗ Ошибка при миграции: {e}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    print("Запуск миграции бюджетов...")
+    migrate()
@@ -0,0 +1,66 @@
+"""
+Миграция индексов
+Создаёт объявленные в моделях индексы (горячие запросы по transactions,
+notifications, budgets, recurrings) в существующей базе SQLite
+и заполняет помесячные агрегаты операций (monthly_rollups) и счётчики
+непрочитанных уведомлений (notification_counters)
+"""
+# -*- coding: utf-8 -*-
+import sys
+from app import create_app, db, rollups, unread
+from app.models import *
+
+# Fix encoding for Windows console
+if sys.platform == 'win32':
+    import codecs
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
+    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+
+def migrate_indexes():
+    app = create_app()
+    with app.app_context():
+        print("Creating indexes...")
+        # Новые таблицы (если их ещё нет) создаются вместе со своими индексами
+        db.create_all()
+
+        rollup_indexes = {row[0] for row in db.session.execute(db.text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'monthly_rollups'"
+        ))}
+        if 'uq_monthly_rollups_group' not in rollup_indexes:
+            # пересчёт с нуля: в таблице не останется дубликатов групп для уникального индекса
+            print(f"+ Rebuilt monthly rollups: {rollups.rebuild()}")
+        else:
+            rollups.ensure_built()
+
+        with db.engine.begin() as conn:
+            existing = {row[0] for row in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )}
+            if 'uq_notifications_unread' not in existing:
+                # уникальный индекс не создастся, пока есть дубликаты непрочитанных уведомлений
+                removed = conn.exec_driver_sql(
+                    "DELETE FROM notifications WHERE is_read = 0 AND id NOT IN ("
+                    " SELECT MIN(id) FROM notifications WHERE is_read = 0"
+                    " GROUP BY user_id, type, related_id)"
+                ).rowcount
+                if removed:
+                    print(f"- Removed duplicate unread notifications: {removed}")
+
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    if index.name in existing:
+                        continue
+                    index.create(conn)
+                    print(f"+ Created index: {index.name} on {table.name}")
+
+            # Счётчики непрочитанных — по уведомлениям, оставшимся после удаления дубликатов
+            unread.rebuild(conn)
+            print("+ Rebuilt unread notification counters")
+
+            # Обновляем статистику планировщика запросов
+            conn.exec_driver_sql("ANALYZE")
+
+        print("\nIndex migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_indexes()
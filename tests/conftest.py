@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session, raiseload
+from app import create_app, db
+from app.models import User
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'test'
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    WTF_CSRF_ENABLED = False
+    SCHEDULER_ENABLED = False
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(TestConfig)
+    app.config['CHART_CACHE_FOLDER'] = str(tmp_path / 'charts')
+    with app.app_context():
+        db.create_all()
+        yield app
+        app.extensions['chart_renderer'].shutdown()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    u = User(username='bob', email='bob@example.com')
+    u.set_password('password123')
+    db.session.add(u)
+    db.session.commit()
+    return u
+
+
+@pytest.fixture
+def auth_client(client, user):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    return client
+
+
+@pytest.fixture
+def strict_loading(app):
+    """Любая неявная подгрузка связи во время теста — ошибка.
+
+    Ко всем ORM-запросам добавляется raiseload('*'): связи, не перечисленные в
+    joinedload/selectinload/contains_eager запроса и ещё не загруженные, выбрасывают
+    InvalidRequestError вместо отдельного SELECT на каждую строку.
+    """
+    def add_raiseload(state):
+        if state.is_select and not state.is_relationship_load and not state.is_column_load:
+            state.statement = state.statement.options(raiseload('*', sql_only=True))
+
+    event.listen(Session, 'do_orm_execute', add_raiseload)
+    yield
+    event.remove(Session, 'do_orm_execute', add_raiseload)
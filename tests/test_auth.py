@@ -1,8 +1,9 @@
 import pytest
 from app import create_app, db
 from app.models import User, Account, Transaction
+from config import Config
 
-class TestConfig:
+class TestConfig(Config):
     TESTING = True
     SECRET_KEY = 'test'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
@@ -10,11 +11,14 @@ class TestConfig:
     WTF_CSRF_ENABLED = False
 
 @pytest.fixture
-def app():
+def app(tmp_path):
     app = create_app(TestConfig)
+    # PNG графиков — во временный каталог, а не в app/static
+    app.config['CHART_CACHE_FOLDER'] = str(tmp_path / 'charts')
     with app.app_context():
         db.create_all()
         yield app
+        app.extensions['chart_renderer'].shutdown()
         db.drop_all()
 
 @pytest.fixture
@@ -29,7 +33,7 @@ def test_register_login_and_create_transaction(client, app):
         'password': 'password123',
         'password_confirm': 'password123'
     }, follow_redirects=True)
-    assert b'Регистрация прошла успешно' in rv.data
+    assert 'Регистрация прошла успешно' in rv.get_data(as_text=True)
 
     with app.app_context():
         u = User.query.filter_by(username='alice').first()
@@ -40,7 +44,7 @@ def test_register_login_and_create_transaction(client, app):
         'username': 'alice',
         'password': 'password123'
     }, follow_redirects=True)
-    assert b'Вы вошли в систему' in rv.data
+    assert 'Вы вошли в систему' in rv.get_data(as_text=True)
 
     # Create account
     rv = client.post('/accounts/add', data={
@@ -49,7 +53,7 @@ def test_register_login_and_create_transaction(client, app):
         'currency': 'RUB',
         'notes': ''
     }, follow_redirects=True)
-    assert b'Счёт создан' in rv.data
+    assert 'Счёт создан' in rv.get_data(as_text=True)
 
     # Create transaction
     # find account id
@@ -66,7 +70,7 @@ def test_register_login_and_create_transaction(client, app):
         'account': str(acc_id),
         'note': 'groceries'
     }, follow_redirects=True)
-    assert b'Операция сохранена' in rv.data
+    assert 'Операция сохранена' in rv.get_data(as_text=True)
 
     with app.app_context():
         u = User.query.filter_by(username='alice').first()
@@ -0,0 +1,80 @@
+from datetime import date, datetime
+
+from app import db, balances
+from app.balance_history import MAX_POINTS, account_history, net_worth_history
+from app.models import Account, Debt, Transaction, TransactionType
+
+
+def _tx(user, acc, day, amount, type_=TransactionType.expense):
+    return Transaction(date=datetime.combine(day, datetime.min.time()), amount=amount, type=type_,
+                       account=acc, user_id=user.id)
+
+
+def _setup(user):
+    acc = Account(name='Карта', balance=1000, user_id=user.id)
+    db.session.add(acc)
+    db.session.add_all([
+        _tx(user, acc, date(2024, 12, 30), 100),
+        _tx(user, acc, date(2025, 1, 3), 50, TransactionType.income),
+        _tx(user, acc, date(2025, 1, 3), 20),
+        _tx(user, acc, date(2025, 1, 6), 200),
+    ])
+    db.session.commit()
+    return acc
+
+
+def test_account_history_daily_running_balance(app, user):
+    acc = _setup(user)
+    data = account_history(acc.id, date(2025, 1, 1), date(2025, 1, 7))
+    assert data['dates'][0] == '2025-01-01'
+    assert data['balance'] == [900, 900, 930, 930, 930, 730, 730]
+
+    # снимок до начала периода даёт ту же начальную точку
+    balances.take_snapshots(date(2024, 12, 31))
+    assert account_history(acc.id, date(2025, 1, 1), date(2025, 1, 7))['balance'][0] == 900
+
+
+def test_account_history_weekly_end_min_max(app, user):
+    acc = _setup(user)
+    data = account_history(acc.id, date(2025, 1, 1), date(2025, 1, 12), step='week')
+    # неделя 30.12–05.01 обрезана началом периода, следующая — 06.01–12.01
+    assert data['dates'] == ['2025-01-05', '2025-01-12']
+    assert data['balance'] == [930, 730]
+    assert data['min'] == [900, 730]
+    assert data['max'] == [930, 730]
+
+
+def test_long_range_is_downsampled(app, user):
+    acc = _setup(user)
+    data = account_history(acc.id, date(2015, 1, 1), date(2025, 12, 31))
+    assert len(data['balance']) <= MAX_POINTS
+    assert data['dates'][-1] == '2025-12-31'
+    assert data['balance'][-1] == 730
+    assert min(data['min']) == 730
+
+
+def test_net_worth_includes_active_debts(app, user):
+    acc = _setup(user)
+    other = Account(name='Закрыт', balance=5000, user_id=user.id, is_active=False)
+    db.session.add(other)
+    db.session.add_all([
+        Debt(name='Кредит', amount=300, paid_amount=100, user_id=user.id,
+             created_at=datetime(2025, 1, 4)),
+        Debt(name='Мне должны', amount=40, is_owed_to_me=True, user_id=user.id,
+             created_at=datetime(2020, 1, 1)),
+        Debt(name='Закрыт', amount=999, is_active=False, user_id=user.id),
+    ])
+    db.session.commit()
+    data = net_worth_history(user.id, date(2025, 1, 1), date(2025, 1, 7))
+    assert data['balance'] == [940, 940, 970, 770, 770, 570, 570]
+
+
+def test_history_endpoints(auth_client, user):
+    acc = _setup(user)
+    rv = auth_client.get(f'/api/accounts/{acc.id}/history?from=2025-01-01&to=2025-01-31&step=month')
+    assert rv.status_code == 200
+    assert rv.get_json()['balance'] == [730]
+    rv = auth_client.get('/api/net-worth/history?from=2025-01-01&to=2025-01-07')
+    assert rv.get_json()['balance'][-1] == 730
+    assert auth_client.get(f'/api/accounts/{acc.id}/history?step=hour').status_code == 400
+    assert auth_client.get('/api/accounts/999/history').status_code == 404
@@ -0,0 +1,119 @@
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+from app import db, balances
+from app.models import Account, AccountSnapshot, Transaction, TransactionType
+
+
+def _tx(user, acc, day, amount, type_=TransactionType.expense):
+    return Transaction(date=datetime.combine(day, datetime.min.time()), amount=amount, type=type_,
+                       account=acc, user_id=user.id)
+
+
+def test_balance_follows_ledger_on_insert_edit_delete(app, user):
+    card = Account(name='Карта', balance=1000, user_id=user.id)
+    cash = Account(name='Наличные', balance=50, user_id=user.id)
+    db.session.add_all([card, cash])
+    db.session.commit()
+    assert card.opening_balance == 1000
+
+    income = _tx(user, card, date(2025, 3, 1), 200, TransactionType.income)
+    expense = _tx(user, card, date(2025, 3, 2), 30)
+    db.session.add_all([income, expense])
+    db.session.flush()
+    # баланс загруженного счёта перечитывается после flush, без commit
+    assert card.balance == 1170
+    db.session.commit()
+
+    expense.amount = 80
+    expense.account = cash
+    db.session.commit()
+    assert card.balance == 1200
+    assert cash.balance == -30
+
+    db.session.delete(income)
+    db.session.commit()
+    assert card.balance == 1000
+    assert not balances.verify()
+
+
+def test_balance_update_is_computed_in_sql(app, user):
+    acc = Account(name='Карта', balance=100, user_id=user.id)
+    db.session.add(acc)
+    db.session.commit()
+    acc_id = acc.id
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        db.session.add(_tx(user, acc, date(2025, 1, 1), 10))
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    # приращение, а не запись прочитанного в Python значения
+    assert any('SET balance=(accounts.balance + ?)' in s for s in statements)
+    assert db.session.get(Account, acc_id).balance == 90
+
+
+def test_balance_on_uses_snapshot_plus_delta(app, user):
+    acc = Account(name='Карта', balance=500, user_id=user.id)
+    db.session.add(acc)
+    db.session.add_all([
+        _tx(user, acc, date(2025, 1, 10), 100),
+        _tx(user, acc, date(2025, 1, 20), 40, TransactionType.income),
+        _tx(user, acc, date(2025, 2, 5), 15),
+    ])
+    db.session.commit()
+
+    assert balances.take_snapshots(date(2025, 1, 31)) == 1
+    assert balances.take_snapshots(date(2025, 1, 31)) == 0
+    assert AccountSnapshot.query.one().balance == 440
+    assert balances.balance_on(acc.id, date(2025, 1, 5)) == 500
+    assert balances.balance_on(acc.id, date(2025, 2, 10)) == 425
+    assert balances.balances_on(date(2025, 2, 10), user.id) == {acc.id: 425}
+
+    # операция задним числом делает снимок устаревшим
+    db.session.add(_tx(user, acc, date(2025, 1, 15), 5))
+    db.session.commit()
+    assert AccountSnapshot.query.count() == 0
+    assert balances.balance_on(acc.id, date(2025, 2, 10)) == 420
+    assert balances.balances_on(date(2025, 2, 10), user.id) == {acc.id: 420}
+
+
+def test_verify_balances_command(app, user):
+    acc = Account(name='Карта', balance=100, user_id=user.id)
+    db.session.add(acc)
+    db.session.add(_tx(user, acc, date(2025, 1, 1), 25))
+    db.session.commit()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['verify-balances'])
+    assert result.exit_code == 0
+    assert 'сходятся' in result.output
+
+    db.session.execute(Account.__table__.update().values(balance=1))
+    db.session.commit()
+    result = runner.invoke(args=['verify-balances'])
+    assert result.exit_code == 1
+    assert 'по журналу 75.00' in result.output
+
+    result = runner.invoke(args=['verify-balances', '--fix'])
+    assert result.exit_code == 0
+    db.session.expire_all()
+    assert db.session.get(Account, acc.id).balance == 75
+
+
+def test_transfer_moves_balances(auth_client, user):
+    a1 = Account(name='Карта', balance=100, user_id=user.id)
+    a2 = Account(name='Наличные', balance=0, user_id=user.id)
+    db.session.add_all([a1, a2])
+    db.session.commit()
+    rv = auth_client.post('/transfer', data={
+        'from_account': a1.id, 'to_account': a2.id, 'amount': '40', 'date': '2025-03-01',
+    })
+    assert rv.status_code == 302
+    db.session.expire_all()
+    assert db.session.get(Account, a1.id).balance == 60
+    assert db.session.get(Account, a2.id).balance == 40
+    assert not balances.verify()
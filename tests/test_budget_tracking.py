@@ -0,0 +1,195 @@
+import io
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import db, budget_tracking, bulk, cache
+from app.importer import import_transactions
+from app.models import Budget, Category, Notification, Transaction, TransactionType, User
+
+
+def _expense(user, cat, amount, when):
+    return Transaction(date=when, amount=amount, type=TransactionType.expense,
+                       category_id=cat.id if cat else None, user_id=user.id)
+
+
+def _current_budget(user, cat, amount=100):
+    now = datetime.now()
+    start = datetime(now.year, now.month, 1)
+    return Budget(category_id=cat.id, amount=amount, user_id=user.id,
+                  period_start=start, period_end=datetime(now.year + 1, 1, 1))
+
+
+def _spent_matches_rebuild():
+    current = sorted((b.id, round(b.spent, 2)) for b in Budget.query)
+    budget_tracking.rebuild()
+    db.session.expire_all()
+    return current == sorted((b.id, round(b.spent, 2)) for b in Budget.query)
+
+
+def test_spent_follows_transaction_writes(app, user):
+    food = Category(name='Еда', user_id=user.id)
+    fun = Category(name='Кино', user_id=user.id)
+    db.session.add_all([food, fun])
+    db.session.flush()
+    now = datetime.now()
+    day = datetime(now.year, now.month, 1, 12)
+    db.session.add(_expense(user, food, 10, day))
+    db.session.commit()
+
+    budget = _current_budget(user, food, amount=1000)
+    db.session.add(budget)
+    db.session.commit()
+    assert budget.spent == 10
+
+    t = _expense(user, food, 25, day)
+    db.session.add_all([
+        t,
+        _expense(user, fun, 7, day),
+        _expense(user, food, 99, datetime(2000, 1, 1)),
+        Transaction(date=day, amount=500, type=TransactionType.income, category_id=food.id, user_id=user.id),
+    ])
+    db.session.commit()
+    assert budget.spent == 35
+
+    t.amount = 40
+    db.session.commit()
+    assert budget.spent == 50
+    t.category_id = fun.id
+    db.session.commit()
+    assert budget.spent == 10
+    db.session.delete(t)
+    db.session.commit()
+    assert budget.spent == 10
+    assert _spent_matches_rebuild()
+
+
+def test_warning_fires_once_from_write_path(app, user):
+    food = Category(name='Еда', user_id=user.id)
+    db.session.add(food)
+    db.session.flush()
+    budget = _current_budget(user, food)
+    db.session.add(budget)
+    db.session.commit()
+    day = budget.period_start
+
+    db.session.add(_expense(user, food, 50, day))
+    db.session.commit()
+    assert Notification.query.count() == 0
+
+    db.session.add(_expense(user, food, 35, day))
+    db.session.commit()
+    notif = Notification.query.one()
+    assert notif.related_id == budget.id and notif.user_id == user.id
+    assert notif.title == 'Приближение к лимиту: Еда'
+
+    # непрочитанное предупреждение не дублируется
+    db.session.add(_expense(user, food, 30, day))
+    db.session.commit()
+    assert Notification.query.count() == 1
+
+    notif.is_read = True
+    db.session.commit()
+    db.session.add(_expense(user, food, 1, day))
+    db.session.commit()
+    latest = Notification.query.filter_by(is_read=False).one()
+    assert latest.title == 'Бюджет превышен: Еда'
+    assert 'Вы потратили 116.00 из 100.00' in latest.message
+
+
+def test_bulk_and_import_keep_spent_in_sync(app, user):
+    food = Category(name='Еда', user_id=user.id)
+    fun = Category(name='Кино', user_id=user.id)
+    db.session.add_all([food, fun])
+    db.session.flush()
+    budget_food = _current_budget(user, food, amount=10000)
+    budget_fun = _current_budget(user, fun, amount=10000)
+    db.session.add_all([budget_food, budget_fun])
+    db.session.commit()
+    day = budget_food.period_start
+
+    csv = "date,amount,type,category,note\n" + "".join(
+        f"{day.date().isoformat()},{i},expense,Еда,x\n" for i in range(1, 11))
+    import_transactions(io.BytesIO(csv.encode('utf-8')), user_id=user.id, chunk_size=4)
+    db.session.expire_all()
+    assert budget_food.spent == 55
+
+    ids = [t.id for t in Transaction.query.order_by(Transaction.id)]
+    db.session.add(_expense(user, None, 5, day))
+    db.session.commit()
+    ids.append(Transaction.query.filter_by(category_id=None).one().id)
+    bulk.bulk_update(user.id, ids[:3] + ids[-1:], category_id=fun.id)
+    db.session.commit()
+    db.session.expire_all()
+    assert budget_food.spent == 49
+    assert budget_fun.spent == 11
+
+    bulk.bulk_delete(user.id, ids[:5])
+    db.session.commit()
+    db.session.expire_all()
+    assert budget_food.spent == 40
+    assert budget_fun.spent == 5
+    assert _spent_matches_rebuild()
+
+
+def test_budgets_page_does_not_scan_transactions(auth_client, user):
+    food = Category(name='Еда', user_id=user.id)
+    db.session.add(food)
+    db.session.flush()
+    for amount in (100, 200, 300):
+        db.session.add(_current_budget(user, food, amount=amount))
+    db.session.add(_expense(user, food, 90, datetime.now()))
+    db.session.commit()
+    auth_client.get('/budgets')
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        rv = auth_client.get('/budgets')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert rv.status_code == 200
+    assert '90.00' in rv.get_data(as_text=True)
+    assert not [s for s in statements if 'FROM transactions' in s]
+
+
+def test_shared_category_keeps_spent_per_user(app, user):
+    other = User(username='alice', password_hash='x')
+    shared = Category(name='Погашение долга')
+    db.session.add_all([other, shared])
+    db.session.flush()
+    mine = _current_budget(user, shared, amount=100)
+    theirs = _current_budget(other, shared, amount=100)
+    db.session.add_all([mine, theirs])
+    db.session.commit()
+    day = mine.period_start
+    version = cache.data_version(other.id)
+
+    # запись через ORM и массовые операции одного пользователя не трогают чужой бюджет
+    t = _expense(user, shared, 90, day)
+    db.session.add(t)
+    db.session.commit()
+    csv = f"date,amount,type,category,note\n{day.date().isoformat()},5,expense,Прочее,x\n"
+    import_transactions(io.BytesIO(csv.encode('utf-8')), user_id=user.id)
+    imported = Transaction.query.filter_by(amount=5).one()
+    bulk.bulk_update(user.id, [imported.id], category_id=shared.id)
+    t.amount = 95
+    db.session.commit()
+    db.session.expire_all()
+    assert (mine.spent, theirs.spent) == (100, 0)
+
+    bulk.bulk_delete(user.id, [t.id])
+    db.session.commit()
+    db.session.expire_all()
+    assert (mine.spent, theirs.spent) == (5, 0)
+
+    # предупреждение получил только владелец потратившего бюджета, версия данных alice не менялась
+    assert {n.user_id for n in Notification.query.filter_by(type='budget_warning')} == {user.id}
+    assert cache.data_version(other.id) == version
+
+    db.session.add(_expense(other, shared, 30, day))
+    db.session.commit()
+    db.session.expire_all()
+    assert (mine.spent, theirs.spent) == (5, 30)
+    assert _spent_matches_rebuild()
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload
+
+from app import db, balances, bulk, rollups
+from app.models import Account, Category, MonthlyRollup, PlannedExpense, Tag, Transaction, TransactionType, User
+
+
+def _setup(user):
+    a1 = Account(name='Карта', balance=1000, user_id=user.id)
+    a2 = Account(name='Наличные', balance=100, user_id=user.id)
+    food = Category(name='Еда', user_id=user.id)
+    fun = Category(name='Кино', user_id=user.id)
+    db.session.add_all([a1, a2, food, fun])
+    db.session.flush()
+    rows = [
+        Transaction(date=datetime(2025, 1, 5), amount=10, type=TransactionType.expense,
+                    account_id=a1.id, category_id=food.id, user_id=user.id),
+        Transaction(date=datetime(2025, 1, 6), amount=50, type=TransactionType.income,
+                    account_id=a1.id, category_id=food.id, user_id=user.id),
+        Transaction(date=datetime(2025, 2, 1), amount=7, type=TransactionType.expense,
+                    category_id=fun.id, user_id=user.id),
+        Transaction(date=datetime(2025, 2, 2), amount=3, type=TransactionType.expense,
+                    account_id=a2.id, user_id=user.id),
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return a1, a2, food, fun, [t.id for t in rows]
+
+
+def _rollups_match_rebuild():
+    def snapshot():
+        return sorted((str(r.user_id), str(r.month), str(r.category_id), r.type.value, round(r.total, 2), r.count)
+                      for r in MonthlyRollup.query)
+    current = snapshot()
+    rollups.rebuild()
+    rebuilt = snapshot()
+    return current == rebuilt
+
+
+def test_bulk_edit_moves_balances_and_rollups(app, user):
+    a1, a2, food, fun, ids = _setup(user)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        updated = bulk.bulk_update(user.id, ids, category_id=str(fun.id), account_id=a2.id)
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert updated == 4
+    # без поштучной загрузки операций: проверки, 2 группировки, UPDATE, балансы, агрегаты
+    assert not [s for s in statements if s.startswith('SELECT transactions.id AS transactions_id')]
+    # a1 возвращается к начальному балансу; a2 получает +40 от a1 и -7 от операции без счёта
+    assert db.session.get(Account, a1.id).balance == 1000
+    assert db.session.get(Account, a2.id).balance == 130
+    assert not balances.verify()
+    assert {t.category_id for t in Transaction.query} == {fun.id}
+    assert _rollups_match_rebuild()
+
+
+def test_bulk_delete_rolls_back_balances_and_ignores_foreign_rows(app, user):
+    a1, a2, food, fun, ids = _setup(user)
+    other = User(username='alice')
+    other.set_password('x')
+    db.session.add(other)
+    db.session.flush()
+    foreign = Transaction(date=datetime(2025, 1, 1), amount=1, type=TransactionType.expense, user_id=other.id)
+    db.session.add(foreign)
+    tag = Tag(name='t', user_id=user.id)
+    first = db.session.get(Transaction, ids[0], options=[selectinload(Transaction.tags)])
+    first.tags.append(tag)
+    db.session.add(PlannedExpense(name='p', amount=10, planned_date=datetime(2025, 1, 5),
+                                  transaction_id=ids[0], is_completed=True, user_id=user.id))
+    db.session.commit()
+
+    deleted = bulk.bulk_delete(user.id, ids + [foreign.id])
+    db.session.commit()
+
+    assert deleted == 4
+    assert Transaction.query.count() == 1
+    assert db.session.get(Account, a1.id).balance == 1000
+    assert db.session.get(Account, a2.id).balance == 100
+    assert not balances.verify()
+    assert PlannedExpense.query.one().transaction_id is None
+    assert not db.session.execute(db.text('SELECT * FROM transaction_tags')).all()
+    assert _rollups_match_rebuild()
+
+
+def test_bulk_endpoints_handle_thousands_of_ids(auth_client, user, monkeypatch):
+    monkeypatch.setattr(bulk, 'BATCH_SIZE', 100)
+    acc = Account(name='Карта', balance=0, user_id=user.id)
+    db.session.add(acc)
+    db.session.flush()
+    db.session.execute(Transaction.__table__.insert(), [
+        {'date': datetime(2025, 3, 1), 'amount': 1.0, 'type': TransactionType.expense,
+         'account_id': acc.id, 'user_id': user.id} for _ in range(2500)])
+    db.session.commit()
+    ids = [str(i) for (i,) in db.session.query(Transaction.id)]
+
+    rv = auth_client.post('/api/transactions/bulk-delete', json={'transaction_ids': ids})
+    assert rv.get_json() == {'success': True, 'deleted': 2500}
+    assert db.session.get(Account, acc.id).balance == 2500
+    rv = auth_client.post('/api/transactions/bulk-edit', json={'transaction_ids': ['x']})
+    assert rv.get_json()['success'] is False
@@ -0,0 +1,163 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import db, bulk, cache
+from app.models import Account, Category, Goal, Transaction, TransactionType, User
+
+
+class FakeRedis:
+    """Общее хранилище «воркеров»: get/set(ex=) как у redis.Redis"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+
+
+def _expense(user, amount):
+    db.session.add(Transaction(date=datetime.now(), amount=amount, type=TransactionType.expense,
+                               user_id=user.id))
+
+
+def test_local_backend_is_bounded_lru():
+    backend = cache.LocalBackend(max_entries=2, max_bytes=10)
+    backend.set('a', ('text/html', b'aaa'))
+    backend.set('b', ('text/html', b'bbb'))
+    backend.get('a')
+    backend.set('c', ('text/html', b'ccc'))
+    assert (backend.get('a'), backend.get('b')) == (('text/html', b'aaa'), None)
+    backend.set('d', ('text/html', b'dddddddd'))
+    assert len(backend) == 1 and backend.get('d')
+    backend.set('huge', ('text/html', b'x' * 11))
+    assert backend.get('huge') is None
+
+
+def test_data_version_follows_owner_writes(app, user):
+    other = User(username='alice', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+    mine, theirs = cache.data_version(user.id), cache.data_version(other.id)
+
+    _expense(user, 10)
+    db.session.commit()
+    assert cache.data_version(user.id) != mine
+    assert cache.data_version(other.id) == theirs
+
+    mine = cache.data_version(user.id)
+    _expense(user, 20)
+    db.session.flush()
+    db.session.rollback()
+    assert cache.data_version(user.id) == mine
+
+    # общие строки (без владельца) меняют версию всех пользователей
+    db.session.add(Category(name='Общая'))
+    db.session.commit()
+    assert cache.data_version(other.id) != theirs
+
+    # запись в обход ORM
+    mine = cache.data_version(user.id)
+    ids = [t.id for t in Transaction.query]
+    bulk.bulk_delete(user.id, ids)
+    db.session.commit()
+    assert cache.data_version(user.id) != mine
+
+
+def test_repeated_dashboard_is_served_from_cache(app, auth_client, user):
+    db.session.add(Account(name='Карта', balance=100, user_id=user.id))
+    db.session.commit()
+    assert auth_client.get('/').headers['X-Cache'] == 'MISS'
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        rv = auth_client.get('/')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert rv.headers['X-Cache'] == 'HIT'
+    # только версия данных (и пользователь сессии, если его нет в identity map)
+    assert [s for s in statements if 'FROM data_versions' not in s and 'FROM users' not in s] == []
+    assert len(statements) <= 2
+
+    _expense(user, 42)
+    db.session.commit()
+    rv = auth_client.get('/')
+    assert rv.headers['X-Cache'] == 'MISS'
+    assert '42.00' in rv.get_data(as_text=True)
+    stats = app.extensions['result_cache'].stats()
+    assert stats['endpoints']['index'] == {'hits': 1, 'misses': 2}
+
+
+def test_cache_is_per_user_and_args(app, client, user):
+    other = User(username='alice')
+    other.set_password('password123')
+    db.session.add(other)
+    db.session.commit()
+    for u in (user, other):
+        with client.session_transaction() as sess:
+            sess['user_id'] = u.id
+        assert client.get('/api/chart/trends').headers['X-Cache'] == 'MISS'
+    assert client.get('/api/chart/income-expense?month=1&year=2024').headers['X-Cache'] == 'MISS'
+    assert client.get('/api/chart/income-expense?year=2024&month=1').headers['X-Cache'] == 'HIT'
+    assert client.get('/api/chart/income-expense?month=2&year=2024').headers['X-Cache'] == 'MISS'
+
+
+def test_shared_backend_is_seen_by_other_workers(app, auth_client, user):
+    redis = FakeRedis()
+    app.extensions['result_cache'] = cache.ResultCache(cache.SharedBackend(redis), ttl=60)
+    first = auth_client.get('/budgets')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert list(redis.ttls.values()) == [60]
+
+    # другой воркер со своим ResultCache поверх того же хранилища
+    app.extensions['result_cache'] = cache.ResultCache(cache.SharedBackend(redis), ttl=60)
+    second = auth_client.get('/budgets')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_data() == first.get_data()
+
+
+def test_pending_flash_bypasses_cache(app, auth_client, user):
+    auth_client.get('/goals')
+    with auth_client.session_transaction() as sess:
+        sess['_flashes'] = [('success', 'Цель добавлена')]
+    rv = auth_client.get('/goals')
+    assert 'X-Cache' not in rv.headers
+    assert 'Цель добавлена' in rv.get_data(as_text=True)
+    assert auth_client.get('/goals').headers['X-Cache'] == 'HIT'
+
+
+def test_goals_are_scoped_to_the_user(app, auth_client, user):
+    other = User(username='alice', password_hash='x')
+    db.session.add(other)
+    db.session.flush()
+    shared = Category(name='Копилка', color='#00ff00')
+    db.session.add(shared)
+    db.session.flush()
+    db.session.add_all([
+        Goal(name='Отпуск', target_amount=1000, category_id=shared.id, user_id=user.id),
+        Goal(name='Чужая цель', target_amount=1000, user_id=other.id),
+        Transaction(date=datetime.now(), amount=300, type=TransactionType.income, category_id=shared.id,
+                    user_id=other.id),
+    ])
+    db.session.commit()
+    body = auth_client.get('/goals').get_data(as_text=True)
+    assert 'Отпуск' in body and 'Чужая цель' not in body
+    # доход другого пользователя в общей категории не двигает прогресс цели
+    assert 'width: 0.0%' in body and 'width: 30.0%' not in body
+
+
+def test_anonymous_index_is_neither_aggregated_nor_cached(app, client, user):
+    db.session.add(Account(name='Карта', balance=12345, user_id=user.id))
+    db.session.commit()
+    for _ in range(2):
+        rv = client.get('/')
+        assert rv.status_code == 200 and 'X-Cache' not in rv.headers
+        assert '12345' not in rv.get_data(as_text=True)
+    assert 'index' not in app.extensions['result_cache'].stats()['endpoints']
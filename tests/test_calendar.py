@@ -0,0 +1,56 @@
+from datetime import date, datetime
+
+from app import db
+from app.calendar_data import daily_totals
+from app.models import PlannedExpense, Transaction, TransactionType, User
+
+
+def _tx(user_id, when, amount, type_=TransactionType.expense):
+    db.session.add(Transaction(date=when, amount=amount, type=type_, user_id=user_id))
+
+
+def test_daily_totals_grouped_and_user_scoped(app, user):
+    other = User(username='alice')
+    other.set_password('x')
+    db.session.add(other)
+    db.session.flush()
+    _tx(user.id, datetime(2025, 3, 1, 9), 10)
+    _tx(user.id, datetime(2025, 3, 1, 23, 59), 5)
+    _tx(user.id, datetime(2025, 3, 1, 12), 100, TransactionType.income)
+    _tx(user.id, datetime(2025, 3, 31, 23), 7)
+    _tx(user.id, datetime(2025, 4, 1), 1000)
+    _tx(other.id, datetime(2025, 3, 1), 999)
+    db.session.commit()
+
+    totals = daily_totals(user.id, date(2025, 3, 1), date(2025, 3, 31))
+    assert totals == {
+        date(2025, 3, 1): {'income': 100.0, 'expense': 15.0, 'count': 3},
+        date(2025, 3, 31): {'income': 0.0, 'expense': 7.0, 'count': 1},
+    }
+
+
+def test_calendar_page_shows_only_own_days(auth_client, user):
+    _tx(user.id, datetime(2025, 3, 2), 42)
+    _tx(None, datetime(2025, 3, 3), 777)
+    db.session.commit()
+    html = auth_client.get('/calendar?year=2025&month=3').get_data(as_text=True)
+    assert 'Расходы: 42.00' in html
+    assert 'Расходы: 777.00' not in html
+
+
+def test_heatmap_covers_year_and_projects_planned(auth_client, user):
+    _tx(user.id, datetime(2025, 1, 1, 10), 30)
+    _tx(user.id, datetime(2025, 1, 1, 11), 100, TransactionType.income)
+    db.session.add(PlannedExpense(name='Отпуск', amount=50, planned_date=datetime(2025, 6, 1), user_id=user.id))
+    db.session.add(PlannedExpense(name='Сделано', amount=70, planned_date=datetime(2025, 6, 2),
+                                  is_completed=True, user_id=user.id))
+    db.session.commit()
+
+    data = auth_client.get('/api/calendar/heatmap?year=2025').get_json()
+    days = {d['date']: d for d in data['days']}
+    assert len(data['days']) == 365
+    assert days['2025-01-01'] == {'date': '2025-01-01', 'net': 70.0, 'planned': 0.0, 'projected': False}
+    assert days['2025-06-01']['net'] == -50.0 and days['2025-06-01']['projected']
+    assert not days['2025-06-02']['projected']
+    assert len(auth_client.get('/api/calendar/heatmap?year=2024').get_json()['days']) == 366
+    assert auth_client.get('/api/calendar/heatmap?year=abc').status_code == 400
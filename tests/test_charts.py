@@ -0,0 +1,111 @@
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from app import db, charts
+from app.models import Transaction, TransactionType
+from app.renderer import ChartRenderer, READY, FAILED, MISSING
+
+
+def _slow_render(data, path):
+    time.sleep(data)
+
+
+def test_same_data_renders_once_and_users_do_not_collide(app):
+    data = [['income', 10.0], ['expense', 5.0]]
+    k1 = charts.request_chart(1, 'pie', data)
+    assert charts.wait_chart(k1) == READY
+    inode = os.stat(charts.chart_path(k1)).st_ino
+
+    assert charts.request_chart(1, 'pie', data) == k1
+    assert charts.request_chart(2, 'pie', data) != k1
+    assert charts.request_chart(1, 'pie', [['income', 11.0]]) != k1
+    # файл не перерисовывался (перерисовка заменила бы его новым через os.replace)
+    assert os.stat(charts.chart_path(k1)).st_ino == inode
+    with open(charts.chart_path(k1), 'rb') as f:
+        assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+
+def test_job_timeout_marks_chart_failed(tmp_path):
+    renderer = ChartRenderer(max_workers=1, timeout=1)
+    try:
+        path = str(tmp_path / 'slow.png')
+        assert renderer.submit('slow', _slow_render, 5, path)
+        started = time.time()
+        assert renderer.wait('slow', path, timeout=10) == FAILED
+        assert time.time() - started < 5
+        assert not os.listdir(tmp_path)
+        # ошибка сообщена — задание больше не держится в реестре
+        assert renderer.status('slow', path) == MISSING and not renderer._jobs
+    finally:
+        renderer.shutdown()
+
+
+def test_evict_by_age_then_size(app):
+    folder = charts.cache_folder()
+    os.makedirs(folder)
+    now = time.time()
+    names = [f"{i:064x}.png" for i in range(4)]
+    for i, name in enumerate(names):
+        path = os.path.join(folder, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 300)
+        os.utime(path, (now - 1000 + i, now - 1000 + i))
+    os.utime(os.path.join(folder, names[0]), (now - 10 ** 6, now - 10 ** 6))
+
+    assert charts.evict(max_bytes=10 ** 6, max_age=10 ** 5, now=now) == 1
+    # осталось 3 файла по 300 байт; лимит 650 — уходит самый давний
+    assert charts.evict(max_bytes=650, max_age=10 ** 5, now=now) == 1
+    assert sorted(os.listdir(folder)) == names[2:]
+
+
+def test_report_page_polls_and_serves_png_with_long_cache_headers(auth_client, user):
+    db.session.add(Transaction(date=datetime.now(), amount=50, type=TransactionType.expense, user_id=user.id))
+    db.session.commit()
+    html = auth_client.get('/report').get_data(as_text=True)
+    keys = sorted(set(re.findall(r'data-chart-key="([0-9a-f]{64})"', html)))
+    assert len(keys) == 2
+
+    # картинка ждёт окончания отрисовки
+    rv = auth_client.get(f"/charts/{keys[0]}.png")
+    assert rv.status_code == 200
+    assert rv.mimetype == 'image/png'
+    assert rv.cache_control.max_age == charts.MAX_AGE_HEADER
+    assert rv.cache_control.private and rv.cache_control.immutable
+    assert auth_client.get(f"/charts/{keys[0]}/status").get_json()['status'] == READY
+
+    charts.wait_chart(keys[1])
+    auth_client.get('/report')
+    assert sorted(os.listdir(charts.cache_folder())) == sorted(f"{k}.{ext}" for k in keys for ext in ('json', 'png'))
+    assert auth_client.get('/charts/not-a-key.png').status_code == 404
+
+
+def test_any_worker_answers_status_from_files(app, auth_client, user):
+    data = [['income', 10.0], ['expense', 5.0]]
+    key = charts.request_chart(user.id, 'pie', data)
+    assert charts.wait_chart(key) == READY
+
+    # другой воркер: свой пул без реестра заданий, а PNG вытеснен из кеша
+    app.extensions['chart_renderer'].shutdown()
+    app.extensions['chart_renderer'] = ChartRenderer(max_workers=1)
+    os.remove(charts.chart_path(key))
+    assert auth_client.get(f"/charts/{key}/status").get_json()['status'] in ('pending', READY)
+    rv = auth_client.get(f"/charts/{key}.png")
+    assert rv.status_code == 200 and rv.mimetype == 'image/png'
+
+    assert charts.chart_status('0' * 64) == MISSING
+
+
+def test_job_file_names_only_a_known_kind(app):
+    key = charts.request_chart(1, 'pie', [['income', 1.0]])
+    with open(charts.job_path(key), encoding='utf-8') as f:
+        assert json.load(f) == {'kind': 'pie', 'data': [['income', 1.0]]}
+    charts.wait_chart(key)
+
+    # подложенное описание с произвольной функцией не исполняется
+    forged = 'f' * 64
+    with open(charts.job_path(forged), 'w', encoding='utf-8') as f:
+        json.dump({'render': 'os:system', 'kind': 'os:system', 'data': 'touch pwned'}, f)
+    assert charts.chart_status(forged) == MISSING
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+
+from app import db
+from app.dashboard import load_dashboard
+from app.models import Budget, Category, Transaction, TransactionType, User
+
+
+def _seed(user, budgets):
+    now = datetime.now()
+    for i in range(budgets):
+        cat = Category(name=f'cat{i}', user_id=user.id)
+        db.session.add(cat)
+        db.session.flush()
+        db.session.add(Budget(category_id=cat.id, amount=100, user_id=user.id,
+                              period_start=now - timedelta(days=1), period_end=now + timedelta(days=1)))
+        db.session.add(Transaction(date=now, amount=10 * (i + 1), type=TransactionType.expense,
+                                   category_id=cat.id, user_id=user.id))
+    db.session.add(Transaction(date=now, amount=500, type=TransactionType.income, user_id=user.id))
+    db.session.commit()
+
+
+def _count_queries(client):
+    # тесты делят сессию с запросами — очищаем, чтобы объекты не брались из identity map
+    db.session.expunge_all()
+    # считаем сборку страницы, а не попадание в кеш результатов
+    current_app.extensions['result_cache'].clear()
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        assert client.get('/').status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return len(statements)
+
+
+def test_index_query_count_does_not_grow_with_data(auth_client, user):
+    _seed(user, 1)
+    # первый запрос за день догоняет повторяющиеся операции — его не считаем
+    auth_client.get('/')
+    few = _count_queries(auth_client)
+    _seed(db.session.get(User, user.id), 6)
+    many = _count_queries(auth_client)
+    assert few == many
+    # пользователь, счётчик уведомлений в шаблоне + данные страницы
+    assert many <= 12
+
+
+def test_dashboard_figures_are_user_scoped(app, user):
+    _seed(user, 2)
+    other = User(username='alice')
+    other.set_password('x')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add(Transaction(date=datetime.now(), amount=9999, type=TransactionType.expense, user_id=other.id))
+    db.session.commit()
+
+    stats = load_dashboard(user.id)
+    assert stats.total_income == 500 and stats.month_income == 500
+    assert stats.total_expense == 30 and stats.month_expense == 30
+    assert stats.last_month_expense == 0
+    assert stats.avg_expenses_by_category == {'cat0': {'avg': 10.0, 'count': 1}, 'cat1': {'avg': 20.0, 'count': 1}}
+    assert [t.amount for t in stats.top_expenses] == [20, 10]
+    assert [(b.budget.category.name, b.spent, b.percent) for b in stats.budgets] == [('cat0', 10, 10.0), ('cat1', 20, 20.0)]
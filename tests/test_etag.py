@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Transaction, TransactionType
+
+
+def _get_counting(client, url, **headers):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        rv = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return rv, statements
+
+
+def test_chart_api_answers_304_without_aggregates(auth_client, user):
+    url = '/api/chart/income-expense?month=3&year=2024'
+    first = auth_client.get(url)
+    etag = first.headers['ETag']
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, max-age=0'
+
+    rv, statements = _get_counting(auth_client, url, **{'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.headers['ETag'] == etag and rv.get_data() == b''
+    assert not [s for s in statements if 'monthly_rollups' in s]
+
+    # другие аргументы — другой ETag
+    other = auth_client.get('/api/chart/income-expense?month=4&year=2024', headers={'If-None-Match': etag})
+    assert other.status_code == 200 and other.headers['ETag'] != etag
+
+
+def test_write_changes_etag(auth_client, user):
+    etag = auth_client.get('/api/chart/trends').headers['ETag']
+    db.session.add(Transaction(date=datetime.now(), amount=10, type=TransactionType.expense, user_id=user.id))
+    db.session.commit()
+    rv = auth_client.get('/api/chart/trends', headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+    assert rv.get_json()[-1]['expense'] == 10
+
+
+def test_errors_are_not_tagged(auth_client, user):
+    rv = auth_client.get('/api/calendar/heatmap?year=abc')
+    assert rv.status_code == 400
+    assert 'ETag' not in rv.headers
+    assert 'ETag' in auth_client.get('/api/calendar/heatmap?year=2024').headers
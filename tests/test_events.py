@@ -0,0 +1,130 @@
+from datetime import datetime
+
+from app import db, events
+from app.models import Account, Budget, Category, Debt, Transaction, TransactionType
+from app.notifications import generate_all_notifications
+
+
+def _drain(sub):
+    out = []
+    while True:
+        ev = sub.get(0)
+        if ev is None:
+            return out
+        out.append(ev)
+
+
+def test_hub_delivers_per_user_and_replays_after_reconnect():
+    hub = events.EventHub(queue_size=10, replay=3)
+    mine = hub.subscribe(1)
+    other = hub.subscribe(2)
+    first = hub.publish(1, 'balance', {'n': 1})
+    hub.publish(2, 'balance', {'n': 2})
+    assert [ev[2] for ev in _drain(mine)] == [{'n': 1}]
+    assert [ev[2] for ev in _drain(other)] == [{'n': 2}]
+
+    hub.unsubscribe(mine)
+    hub.publish(1, 'balance', {'n': 3})
+    hub.publish(1, 'notification', {'n': 4})
+    again = hub.subscribe(1, hub.event_id(first))
+    assert not again.reset
+    assert [ev[2] for ev in again.backlog] == [{'n': 3}, {'n': 4}]
+
+    # буфер ушёл дальше last_event_id или id от другого запуска — только reset
+    for n in range(5, 8):
+        hub.publish(1, 'balance', {'n': n})
+    assert hub.subscribe(1, hub.event_id(first)).reset
+    assert hub.subscribe(1, 'deadbeef-1').reset
+    assert not hub.subscribe(2, hub.event_id(first)).reset
+
+
+def test_slow_client_is_disconnected():
+    hub = events.EventHub(queue_size=2, replay=10)
+    sub = hub.subscribe(1)
+    for n in range(3):
+        hub.publish(1, 'balance', {'n': n})
+    assert not hub.has_subscribers()
+    chunks = list(events.stream(hub, sub, heartbeat=0.01))
+    assert chunks[-1].startswith('id: ')
+    assert len(chunks) == 2
+
+
+def test_stream_sends_heartbeats_and_backlog():
+    hub = events.EventHub()
+    hub.publish(1, 'balance', {'n': 1})
+    sub = hub.subscribe(1, f'{hub.boot}-0')
+    ticks = iter(range(100))
+    chunks = list(events.stream(hub, sub, heartbeat=0, max_age=3, clock=lambda: next(ticks)))
+    assert chunks[0] == 'retry: 0\n\n'
+    assert chunks[1] == f'id: {hub.boot}-1\nevent: balance\ndata: {{"n": 1}}\n\n'
+    assert chunks[2:] == [': heartbeat\n\n'] * 2
+    assert not hub.has_subscribers()
+
+
+def test_events_are_published_after_commit(app, user):
+    hub = events.hub()
+    sub = hub.subscribe(user.id)
+    acc = Account(name='Карта', balance=100, user_id=user.id)
+    db.session.add(acc)
+    db.session.commit()
+    db.session.add(Transaction(date=datetime.now(), amount=30, type=TransactionType.expense,
+                               account_id=acc.id, user_id=user.id))
+    db.session.flush()
+    assert _drain(sub) == []
+    db.session.rollback()
+    db.session.commit()
+    assert _drain(sub) == []
+
+    db.session.add(Transaction(date=datetime.now(), amount=30, type=TransactionType.expense,
+                               account_id=acc.id, user_id=user.id))
+    db.session.commit()
+    [(_, kind, data)] = _drain(sub)
+    assert kind == 'balance'
+    assert data == {'account_id': acc.id, 'balance': 70, 'delta': -30}
+
+
+def test_notifications_and_budget_thresholds_are_pushed(app, user):
+    hub = events.hub()
+    sub = hub.subscribe(user.id)
+    food = Category(name='Еда', user_id=user.id)
+    db.session.add(food)
+    db.session.flush()
+    now = datetime.now()
+    budget = Budget(category_id=food.id, amount=100, user_id=user.id,
+                    period_start=datetime(now.year, now.month, 1), period_end=datetime(now.year + 1, 1, 1))
+    db.session.add_all([budget, Debt(name='Займ', amount=10, due_date=datetime(2000, 1, 1), user_id=user.id)])
+    db.session.commit()
+
+    generate_all_notifications()
+    [(_, kind, data)] = _drain(sub)
+    assert (kind, data['type'], data['title']) == ('notification', 'debt_due', 'Просроченный долг: Займ')
+
+    db.session.add(Transaction(date=budget.period_start, amount=90, type=TransactionType.expense,
+                               category_id=food.id, user_id=user.id))
+    db.session.commit()
+    kinds = {kind: data for _, kind, data in _drain(sub)}
+    assert kinds['notification']['type'] == 'budget_warning'
+    assert kinds['budget'] == {'budget_id': budget.id, 'title': 'Приближение к лимиту: Еда',
+                               'message': kinds['notification']['message']}
+
+
+def test_stream_endpoint(app, auth_client, user):
+    app.config['STREAM_MAX_AGE'] = 0
+    hub = events.hub()
+    hub.publish(user.id, 'balance', {'n': 1})
+    rv = auth_client.get('/api/stream', headers={'Last-Event-ID': f'{hub.boot}-0'})
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/event-stream'
+    assert rv.headers['Cache-Control'] == 'no-cache'
+    assert 'event: balance' in rv.get_data(as_text=True)
+    assert not hub.has_subscribers()
+
+
+def test_pages_render_targets_for_live_events(auth_client, user):
+    acc = Account(name='Карта', balance=10, user_id=user.id)
+    db.session.add(acc)
+    db.session.commit()
+    assert f'data-account-balance="{acc.id}"' in auth_client.get('/accounts').get_data(as_text=True)
+    index = auth_client.get('/').get_data(as_text=True)
+    assert 'data-balance-total' in index and 'budget:balance' in index and 'id="live-alerts"' in index
+    assert 'budget:threshold' in auth_client.get('/budgets').get_data(as_text=True)
@@ -0,0 +1,54 @@
+import csv
+import gzip
+import io
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Account, Category, Transaction, TransactionType
+
+
+def _seed(user):
+    cat = Category(name='Еда', user_id=user.id)
+    acc = Account(name='Карта', user_id=user.id)
+    db.session.add_all([cat, acc])
+    db.session.flush()
+    for day in range(1, 6):
+        db.session.add(Transaction(date=datetime(2025, 2, day), amount=day, type=TransactionType.expense,
+                                   category_id=cat.id, account_id=acc.id, note=f'n{day}', user_id=user.id))
+    db.session.add(Transaction(date=datetime(2025, 2, 3), amount=100, type=TransactionType.income,
+                               note='чужая', user_id=None))
+    db.session.commit()
+
+
+def test_export_streams_joined_rows_in_one_query(auth_client, user, app):
+    _seed(user)
+    selects = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.lstrip().startswith('SELECT') and 'FROM transactions' in statement:
+            selects.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        rv = auth_client.get('/export')
+        assert rv.is_streamed
+        body = rv.get_data(as_text=True)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert [r['note'] for r in rows] == ['n5', 'n4', 'n3', 'n2', 'n1']
+    assert rows[0]['category'] == 'Еда' and rows[0]['account'] == 'Карта'
+    assert len(selects) == 1
+    assert 'attachment' in rv.headers['Content-Disposition']
+
+
+def test_export_applies_filters_and_gzip(auth_client, user):
+    _seed(user)
+    rv = auth_client.get('/export?date_from=2025-02-02&date_to=2025-02-03&gzip=1')
+    assert rv.mimetype == 'application/gzip'
+    assert rv.headers['Content-Disposition'].endswith('.csv.gz')
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(rv.get_data()).decode('utf-8'))))
+    assert [r['note'] for r in rows] == ['n3', 'n2']
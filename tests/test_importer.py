@@ -0,0 +1,92 @@
+import io
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from app import db, importer, rollups
+from app.models import Category, Transaction, TransactionType
+
+
+def _csv(n, category='Еда'):
+    lines = ['date,amount,type,category,note']
+    for i in range(n):
+        lines.append(f'2025-01-{i % 28 + 1:02d},{i + 1},expense,{category},row {i}')
+    return io.BytesIO('\n'.join(lines).encode('utf-8'))
+
+
+def test_import_in_chunks_with_bulk_inserts(app, user):
+    db.session.add(Category(name='Еда', user_id=user.id))
+    db.session.commit()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO transactions'):
+            statements.append(executemany)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        seen = []
+        result = importer.import_transactions(_csv(25), user.id, chunk_size=10,
+                                              progress=lambda r: seen.append(r.imported))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert result.imported == 25 and result.chunks == 3 and not result.failed
+    assert seen == [10, 20, 25]
+    # одна вставка executemany на кусок, без поштучных INSERT
+    assert statements == [True, True, True]
+    # существующая категория переиспользована, новая не создана
+    assert Category.query.count() == 1
+    assert Transaction.query.filter(Transaction.category_id != None).count() == 25
+    totals = rollups.totals_by_type(user.id, date(2025, 1, 1), date(2025, 2, 1))
+    assert totals[TransactionType.expense] == sum(range(1, 26))
+
+
+def test_failed_chunk_is_rolled_back_and_others_kept(app, user, monkeypatch):
+    real_insert = importer._insert_chunk
+    calls = []
+
+    def flaky(chunk, user_id, categories):
+        calls.append(1)
+        n = real_insert(chunk, user_id, categories)
+        if len(calls) == 2:
+            raise RuntimeError('boom')
+        return n
+
+    monkeypatch.setattr(importer, '_insert_chunk', flaky)
+    result = importer.import_transactions(_csv(25, category='Новая'), user.id, chunk_size=10)
+
+    assert result.imported == 15
+    assert result.failed == [(2, 11, 20, 'boom')]
+    assert Transaction.query.count() == 15
+    # категория создана в первом куске и пережила откат второго
+    assert Category.query.filter_by(name='Новая').count() == 1
+
+
+def test_bad_rows_skipped_and_missing_columns_rejected(app, user):
+    data = io.BytesIO('date,amount,type\n2025-01-01,10,income\nnot-a-date,5,expense\n2025-01-02,abc,expense\n'.encode())
+    result = importer.import_transactions(data, user.id)
+    assert (result.imported, result.skipped) == (1, 2)
+
+    with pytest.raises(importer.ImportFormatError):
+        importer.import_transactions(io.BytesIO(b'when,sum\n2025-01-01,1\n'), user.id)
+
+
+def test_import_view_reports_result(auth_client, user):
+    rv = auth_client.post('/import', data={'csv_file': (_csv(3), 'bank.csv')},
+                          content_type='multipart/form-data', follow_redirects=True)
+    assert 'Импортировано 3 записей' in rv.get_data(as_text=True)
+    assert Transaction.query.filter_by(user_id=user.id).count() == 3
+
+
+def test_import_without_user_uses_only_shared_categories(app, user):
+    mine = Category(name='Еда', user_id=user.id)
+    db.session.add(mine)
+    db.session.commit()
+    result = importer.import_transactions(_csv(3), None)
+    assert result.imported == 3
+    shared = Category.query.filter(Category.user_id == None).one()
+    assert shared.name == 'Еда' and shared.id != mine.id
+    assert {t.category_id for t in Transaction.query} == {shared.id}
@@ -0,0 +1,43 @@
+"""EXPLAIN QUERY PLAN для горячих запросов: ни один не должен сканировать таблицу целиком"""
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models import Budget, Notification, Recurring, Transaction, TransactionType
+
+NOW = datetime(2025, 6, 15)
+
+
+def _hot_queries():
+    return {
+        'transactions_list': db.select(Transaction).where(Transaction.user_id == 1).order_by(Transaction.date.desc()),
+        'transactions_period': db.select(Transaction).where(
+            Transaction.user_id == 1, Transaction.date >= datetime(2025, 6, 1), Transaction.date < datetime(2025, 7, 1)),
+        'sum_by_type': db.select(db.func.sum(Transaction.amount)).where(
+            Transaction.user_id == 1, Transaction.type == TransactionType.expense, Transaction.date >= datetime(2025, 6, 1)),
+        'budget_spent': db.select(db.func.sum(Transaction.amount)).where(
+            Transaction.category_id == 3, Transaction.type == TransactionType.expense,
+            Transaction.date >= datetime(2025, 6, 1), Transaction.date <= datetime(2025, 6, 30)),
+        'unread_notifications': db.select(db.func.count(Notification.id)).where(
+            Notification.user_id == 1, Notification.is_read == False),
+        'active_budgets': db.select(Budget).where(
+            Budget.user_id == 1, Budget.is_active == True, Budget.period_start <= NOW, Budget.period_end >= NOW),
+        'due_recurrings': db.select(Recurring).where(Recurring.active == True, Recurring.next_date <= NOW),
+    }
+
+
+def _plan(stmt):
+    compiled = stmt.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")]
+
+
+@pytest.mark.parametrize('name', [
+    'transactions_list', 'transactions_period', 'sum_by_type', 'budget_spent',
+    'unread_notifications', 'active_budgets', 'due_recurrings',
+])
+def test_hot_query_uses_index(app, name):
+    plan = _plan(_hot_queries()[name])
+    full_scans = [step for step in plan if step.startswith('SCAN') and 'USING' not in step]
+    assert not full_scans, f"{name}: {plan}"
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+
+from app import db
+from app.models import Account, Category, Tag, Transaction, TransactionType
+
+
+def _seed(user, n):
+    cats = [Category(name=f'cat{i}', user_id=user.id) for i in range(5)]
+    accs = [Account(name=f'acc{i}', user_id=user.id) for i in range(3)]
+    tag = Tag(name='t', user_id=user.id)
+    db.session.add_all(cats + accs + [tag])
+    db.session.flush()
+    now = datetime.now()
+    db.session.add_all([
+        Transaction(date=now, amount=i + 1, type=TransactionType.expense, category_id=cats[i % 5].id,
+                    account_id=accs[i % 3].id, user_id=user.id, note=f'n{i}', tags=[tag] if i % 2 else [])
+        for i in range(n)
+    ])
+    db.session.commit()
+
+
+def _statements(client, url):
+    db.session.expunge_all()
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        rv = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert rv.status_code == 200
+    return statements
+
+
+def test_relationships_are_never_loaded_implicitly(app, user):
+    _seed(user, 2)
+    db.session.expunge_all()
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        t = Transaction.query.first()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    # без подзапроса по тегам
+    assert len(statements) == 1
+    with pytest.raises(InvalidRequestError):
+        t.tags
+    with pytest.raises(InvalidRequestError):
+        t.category
+
+
+@pytest.mark.parametrize('url', ['/transactions', '/api/transactions',
+                                 f'/api/transactions/by-date?date={datetime.now():%Y-%m-%d}'])
+def test_listing_cost_is_constant(app, auth_client, user, strict_loading, url):
+    app.config['TRANSACTIONS_PAGE_SIZE'] = 1000
+    _seed(user, 10)
+    auth_client.get(url)
+    few = _statements(auth_client, url)
+    _seed(user, 990)
+    many = _statements(auth_client, url)
+    assert len(few) == len(many) <= 6
+
+
+@pytest.mark.parametrize('url', ['/', '/categories', '/report'])
+def test_pages_declare_their_loads(app, auth_client, user, strict_loading, url):
+    _seed(user, 20)
+    assert auth_client.get(url).status_code == 200
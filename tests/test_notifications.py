@@ -0,0 +1,87 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Debt, Goal, Notification, User
+from app.notifications import generate_all_notifications
+
+
+def _users(n):
+    users = [User(username=f'user{i}', password_hash='x') for i in range(n)]
+    db.session.add_all(users)
+    db.session.flush()
+    return users
+
+
+def _populate(users):
+    today = datetime.combine(date.today(), datetime.min.time())
+    for u in users:
+        db.session.add_all([
+            Debt(name='Займ', amount=100, paid_amount=40, due_date=today - timedelta(days=3), user_id=u.id),
+            Debt(name='Оплачен', amount=100, paid_amount=100, due_date=today - timedelta(days=3), user_id=u.id),
+            Debt(name='Мне должны', amount=50, is_owed_to_me=True, due_date=today - timedelta(days=3),
+                 user_id=u.id),
+            Goal(name='Отпуск', target_amount=1000, current_amount=250, target_date=today + timedelta(days=5),
+                 user_id=u.id),
+            Goal(name='Дом', target_amount=1000, target_date=today + timedelta(days=30), user_id=u.id),
+        ])
+    db.session.commit()
+
+
+def test_generation_is_set_based(app):
+    users = _users(30)
+    _populate(users)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        generate_all_notifications()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    # по одному INSERT ... SELECT на вид уведомлений, независимо от числа пользователей
+    assert len([s for s in statements if s.startswith('INSERT OR IGNORE INTO notifications')]) == 3
+    assert len(statements) <= 5
+    assert Notification.query.filter_by(type='debt_due').count() == 30
+    assert Notification.query.filter_by(type='goal_reminder').count() == 30
+
+    n = Notification.query.filter_by(type='debt_due', user_id=users[0].id).one()
+    assert n.title == 'Просроченный долг: Займ'
+    assert n.message == 'Долг просрочен на 3 дней. Осталось выплатить: 60.00'
+    assert n.is_read is False and n.created_at is not None
+    g = Notification.query.filter_by(type='goal_reminder', user_id=users[0].id).one()
+    assert g.message == 'До цели осталось 5 дней. Нужно накопить ещё 750.00'
+
+
+def test_dedupe_is_per_user_and_unread_only(app):
+    users = _users(2)
+    _populate(users[:1])
+    debt = Debt.query.filter_by(name='Займ').one()
+    # чужое уведомление с тем же related_id не мешает
+    db.session.add(Notification(type='debt_due', title='t', message='m', related_id=debt.id,
+                                user_id=users[1].id))
+    db.session.commit()
+
+    generate_all_notifications(user_id=users[0].id)
+    generate_all_notifications(user_id=users[0].id)
+    assert Notification.query.filter_by(type='debt_due', user_id=users[0].id).count() == 1
+
+    Notification.query.filter_by(user_id=users[0].id).update({'is_read': True})
+    db.session.commit()
+    generate_all_notifications()
+    assert Notification.query.filter_by(type='debt_due', user_id=users[0].id).count() == 2
+
+
+def test_unique_index_rejects_second_unread(app):
+    users = _users(1)
+    kwargs = dict(type='debt_due', title='t', message='m', related_id=1, user_id=users[0].id)
+    db.session.add(Notification(is_read=True, **kwargs))
+    db.session.add(Notification(**kwargs))
+    db.session.commit()
+    db.session.add(Notification(**kwargs))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
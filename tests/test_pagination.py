@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Transaction, TransactionType
+
+
+def _seed(user, n=7):
+    base = datetime(2025, 1, 1)
+    for i in range(n):
+        # по две операции на дату — проверяем упорядочивание по id внутри одного дня
+        db.session.add(Transaction(date=base + timedelta(days=i // 2), amount=i + 1,
+                                   type=TransactionType.expense, note=f'n{i}', user_id=user.id))
+    db.session.add(Transaction(date=base, amount=1000, type=TransactionType.income, note='salary', user_id=user.id))
+    db.session.commit()
+
+
+def test_api_walks_all_pages_without_duplicates(auth_client, user, app):
+    app.config['TRANSACTIONS_PAGE_SIZE'] = 3
+    _seed(user)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        url = '/api/transactions?type=expense' + (f'&cursor={cursor}' if cursor else '')
+        data = auth_client.get(url).get_json()
+        seen.extend(data['transactions'])
+        pages += 1
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert [t['note'] for t in seen] == ['n6', 'n5', 'n4', 'n3', 'n2', 'n1', 'n0']
+    # фильтр type=expense переносится в курсор
+    assert all(t['type'] == 'expense' for t in seen)
+
+
+def test_tampered_cursor_is_rejected(auth_client, user):
+    rv = auth_client.get('/api/transactions?cursor=garbage')
+    assert rv.status_code == 400
+    rv = auth_client.get('/transactions?cursor=garbage')
+    assert rv.status_code == 302
+
+
+def test_transactions_page_renders_next_link(auth_client, user, app):
+    app.config['TRANSACTIONS_PAGE_SIZE'] = 5
+    _seed(user)
+    html = auth_client.get('/transactions').get_data(as_text=True)
+    assert 'Показано операций: 5+' in html
+    assert 'cursor=' in html
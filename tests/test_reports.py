@@ -0,0 +1,80 @@
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import db, charts
+from app.models import Category, Goal, Transaction, TransactionType
+from app.reports import load_report
+
+
+def _add(user, cat, amount, type_, when):
+    db.session.add(Transaction(date=when, amount=amount, type=type_,
+                               category_id=cat.id if cat else None, user_id=user.id))
+
+
+def _populate(user, n):
+    food = Category(name='Еда', user_id=user.id)
+    savings = Category(name='Копилка', user_id=user.id)
+    db.session.add_all([food, savings])
+    db.session.flush()
+    for i in range(n):
+        _add(user, food, 10, TransactionType.expense, datetime(2024, 3, 1 + i % 28, 12))
+    _add(user, None, 5, TransactionType.expense, datetime(2024, 3, 31, 23))
+    _add(user, savings, 100, TransactionType.income, datetime(2024, 3, 31, 18))
+    _add(user, savings, 50, TransactionType.income, datetime(2024, 2, 10))
+    _add(user, savings, 999, TransactionType.income, datetime(2024, 4, 1))
+    _add(user, food, 7, TransactionType.expense, datetime(2024, 2, 10))
+    db.session.add_all([
+        Goal(name='Отпуск', target_amount=300, category_id=savings.id, user_id=user.id),
+        Goal(name='Без категории', target_amount=100, user_id=user.id),
+    ])
+    db.session.commit()
+
+
+def test_report_totals_categories_and_goals(app, user):
+    _populate(user, 4)
+    report = load_report(user.id, 2024, 3)
+
+    assert (report.income, report.expense) == (100, 45)
+    assert (report.prev_income, report.prev_expense) == (50, 7)
+    assert report.categories == [('Копилка', 100), ('Еда', 40), ('Без категории', 5)]
+    assert report.pie_data == [['income', 100], ['expense', 45]]
+
+    no_category, vacation = report.goals
+    assert (vacation.goal.name, vacation.progress, vacation.percent) == ('Отпуск', 150, 50)
+    assert (no_category.progress, no_category.percent) == (0, 0)
+
+
+def test_report_cost_does_not_depend_on_transactions(app, auth_client, user):
+    _populate(user, 200)
+    auth_client.get('/report?month=3&year=2024')
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        rv = auth_client.get('/report?month=3&year=2024')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert rv.status_code == 200
+    assert 'Отпуск' in rv.get_data(as_text=True)
+    assert not [s for s in statements if 'FROM transactions' in s]
+    assert len([s for s in statements if 'monthly_rollups' in s]) == 2
+
+
+def test_report_requests_charts_on_every_render(app, auth_client, user):
+    _populate(user, 4)
+    html = auth_client.get('/report?month=3&year=2024').get_data(as_text=True)
+    keys = sorted(set(re.findall(r'data-chart-key="([0-9a-f]{64})"', html)))
+    for key in keys:
+        assert charts.wait_chart(key) == 'ready'
+        os.remove(charts.chart_path(key))
+        os.remove(charts.job_path(key))
+
+    # графики вытеснены, данные не менялись — повторный показ ставит их в отрисовку заново
+    rv = auth_client.get('/report?month=3&year=2024')
+    assert 'X-Cache' not in rv.headers
+    assert all(os.path.exists(charts.job_path(key)) for key in keys)
+    assert all(charts.wait_chart(key) == 'ready' for key in keys)
@@ -0,0 +1,78 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+from app import db, retention
+from app.models import Notification, NotificationArchive, User
+
+
+def _notify(user_id, related_id, created_at=None, is_read=False):
+    n = Notification(type='t', title=f'n{related_id}', message='m', related_id=related_id,
+                     user_id=user_id, is_read=is_read, created_at=created_at or datetime.utcnow())
+    db.session.add(n)
+    return n
+
+
+def test_old_read_notifications_move_to_archive_in_batches(app, user):
+    old = datetime.utcnow() - timedelta(days=100)
+    for i in range(7):
+        _notify(user.id, i, created_at=old, is_read=True)
+    _notify(user.id, 100, created_at=old)  # непрочитанное остаётся
+    _notify(user.id, 101, is_read=True)  # свежее остаётся
+    db.session.commit()
+
+    deletes = []
+    listener = lambda conn, cursor, statement, *args: deletes.append(statement) \
+        if statement.startswith('DELETE FROM notifications') else None
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        moved = retention.archive_notifications(days=90, batch_size=3)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert moved == 7
+    assert len(deletes) == 3
+    assert sorted(n.related_id for n in Notification.query) == [100, 101]
+    archived = NotificationArchive.query.order_by(NotificationArchive.id).all()
+    assert [a.related_id for a in archived] == list(range(7))
+    assert archived[0].user_id == user.id and archived[0].created_at == old
+    assert retention.archive_notifications(days=90) == 0
+
+
+def test_daily_pass_runs_once_and_vacuums(app, user):
+    old = datetime.utcnow() - timedelta(days=100)
+    for i in range(300):
+        _notify(user.id, i, created_at=old, is_read=True).message = 'x' * 500
+    db.session.commit()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert retention.run_daily(date.today()) == 300
+        assert retention.run_daily(date.today()) == 0
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert statements.count('VACUUM') == 1
+    assert statements.count('ANALYZE') == 1
+
+
+def test_notifications_page_is_scoped_and_paginated(app, auth_client, user):
+    app.config['NOTIFICATIONS_PAGE_SIZE'] = 2
+    other = User(username='alice', password_hash='x')
+    db.session.add(other)
+    db.session.flush()
+    for i in range(5):
+        _notify(user.id, i)
+    _notify(other.id, 99)
+    db.session.commit()
+
+    first = auth_client.get('/notifications').get_data(as_text=True)
+    assert 'n4' in first and 'n3' in first and 'n2' not in first
+    assert 'n99' not in first
+    before = Notification.query.filter_by(user_id=user.id, related_id=3).one().id
+    assert f'before={before}' in first
+
+    last = auth_client.get(f'/notifications?before={before - 2}').get_data(as_text=True)
+    assert 'n0' in last and 'n1' not in last
+    assert 'before=' not in last
@@ -0,0 +1,96 @@
+from datetime import datetime, date
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import db, rollups
+from app.models import Category, MonthlyRollup, Transaction, TransactionType
+
+
+def _snapshot():
+    rows = db.session.query(
+        MonthlyRollup.user_id, MonthlyRollup.month, MonthlyRollup.category_id, MonthlyRollup.type,
+        db.func.sum(MonthlyRollup.total), db.func.sum(MonthlyRollup.count),
+    ).group_by(MonthlyRollup.user_id, MonthlyRollup.month, MonthlyRollup.category_id, MonthlyRollup.type)
+    return {tuple(r[:4]): (round(r[4], 2), r[5]) for r in rows if r[5]}
+
+
+def test_rollups_follow_insert_update_delete(app, user):
+    food = Category(name='Еда', user_id=user.id)
+    fun = Category(name='Досуг', user_id=user.id)
+    db.session.add_all([food, fun])
+    db.session.commit()
+
+    t1 = Transaction(date=datetime(2025, 3, 5), amount=100, type=TransactionType.expense, category=food, user_id=user.id)
+    t2 = Transaction(date=datetime(2025, 3, 20), amount=50, type=TransactionType.expense, category=food, user_id=user.id)
+    db.session.add_all([t1, t2])
+    db.session.commit()
+    assert _snapshot() == {(user.id, date(2025, 3, 1), food.id, TransactionType.expense): (150, 2)}
+
+    # объекты expired после commit — старые значения всё равно должны учитываться
+    t2.category = fun
+    t2.amount = 70
+    t1.date = datetime(2025, 4, 1)
+    db.session.commit()
+    assert _snapshot() == {
+        (user.id, date(2025, 4, 1), food.id, TransactionType.expense): (100, 1),
+        (user.id, date(2025, 3, 1), fun.id, TransactionType.expense): (70, 1),
+    }
+
+    db.session.delete(t1)
+    db.session.commit()
+    assert _snapshot() == {(user.id, date(2025, 3, 1), fun.id, TransactionType.expense): (70, 1)}
+
+    incremental = _snapshot()
+    rollups.rebuild()
+    assert _snapshot() == incremental
+
+
+def test_rollback_leaves_rollups_untouched(app, user):
+    db.session.add(Transaction(date=datetime(2025, 1, 1), amount=10, type=TransactionType.income, user_id=user.id))
+    db.session.flush()
+    db.session.rollback()
+    assert _snapshot() == {}
+
+
+def test_chart_endpoints_read_rollups(auth_client, user):
+    db.session.add_all([
+        Transaction(date=datetime(2025, 2, 3), amount=300, type=TransactionType.income, user_id=user.id),
+        Transaction(date=datetime(2025, 2, 4), amount=120, type=TransactionType.expense, user_id=user.id),
+        Transaction(date=datetime(2025, 2, 4), amount=999, type=TransactionType.expense, user_id=None),
+    ])
+    db.session.commit()
+
+    data = auth_client.get('/api/chart/income-expense?month=2&year=2025').get_json()
+    assert data == {'income': 300.0, 'expense': 120.0}
+
+    data = auth_client.get('/api/chart/categories?month=2&year=2025').get_json()
+    assert data['data'] == {'Без категории': 120.0}
+
+
+def test_concurrent_style_deltas_merge_into_one_row(app, user):
+    # две «параллельные» записи в одну группу, в том числе без категории (NULL)
+    for _ in range(2):
+        deltas = rollups.new_deltas()
+        rollups.add_delta(deltas, user.id, date(2025, 5, 2), None, TransactionType.expense, 10)
+        rollups.apply_deltas(deltas)
+    db.session.commit()
+    rows = MonthlyRollup.query.all()
+    assert [(r.category_id, r.total, r.count) for r in rows] == [(None, 20, 2)]
+
+    db.session.add(MonthlyRollup(user_id=user.id, month=date(2025, 5, 1), type=TransactionType.expense,
+                                 total=1, count=1))
+    with pytest.raises(IntegrityError):
+        db.session.flush()
+    db.session.rollback()
+
+
+def test_startup_does_not_backfill(app, user):
+    db.session.add(Transaction(date=datetime(2025, 1, 1), amount=10, type=TransactionType.income, user_id=user.id))
+    db.session.commit()
+    db.session.execute(MonthlyRollup.__table__.delete())
+    db.session.commit()
+    rollups.init_app(app)
+    assert _snapshot() == {}
+    rollups.ensure_built()
+    assert _snapshot() == {(user.id, date(2025, 1, 1), None, TransactionType.income): (10, 1)}
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models import (Account, Category, Debt, DebtType, Frequency, PlannedExpense, Recurring, Transaction,
+                        TransactionTemplate, TransactionType)
+from app.rows import (DebtRow, TransactionRow, as_rows, debt_rows, planned_expense_rows, recurring_rows,
+                      template_rows, transaction_rows)
+
+
+def _seed(user, n):
+    food = Category(name='Еда', color='#ff0000', user_id=user.id)
+    card = Account(name='Карта', currency='USD', user_id=user.id)
+    db.session.add_all([food, card])
+    db.session.flush()
+    now = datetime.now()
+    for i in range(n):
+        cat_id = food.id if i % 2 else None
+        db.session.add_all([
+            Transaction(date=now, amount=i + 1, type=TransactionType.expense, category_id=cat_id,
+                        account_id=card.id, user_id=user.id),
+            Recurring(start_date=now, next_date=now, amount=i + 1, type=TransactionType.expense,
+                      frequency=Frequency.monthly, category_id=cat_id, account_id=card.id, user_id=user.id),
+            PlannedExpense(name=f'p{i}', amount=i + 1, planned_date=now + timedelta(days=i),
+                           category_id=cat_id, is_completed=i % 3 == 0, user_id=user.id),
+            TransactionTemplate(name=f't{i}', amount=i + 1, type=TransactionType.expense,
+                                category_id=cat_id, account_id=card.id, user_id=user.id),
+            Debt(name=f'd{i}', amount=100, paid_amount=i, user_id=user.id),
+        ])
+    db.session.commit()
+
+
+def test_rows_carry_joined_names(app, user):
+    _seed(user, 2)
+    uid = user.id
+    db.session.expunge_all()
+    rows = as_rows(TransactionRow, transaction_rows(Transaction.query).order_by(Transaction.id))
+    assert [(r.category_name, r.category_color, r.account_name, r.account_currency) for r in rows] == [
+        (None, None, 'Карта', 'USD'), ('Еда', '#ff0000', 'Карта', 'USD')]
+    assert [r.category_name for r in recurring_rows(uid)] == ['Еда', None]
+    assert [r.name for r in planned_expense_rows(False, uid)] == ['p1']
+    assert [(t.name, t.account_name) for t in template_rows(uid)] == [('t0', 'Карта'), ('t1', 'Карта')]
+
+    debt = debt_rows(uid)[0]
+    assert isinstance(debt, DebtRow) and debt.remaining_amount == 99
+    assert not hasattr(debt, '__dict__')
+    with pytest.raises(AttributeError):
+        debt.amount = 0
+    # строки не сущности: сессия ничего не отслеживает
+    assert len(db.session.identity_map) == 0
+
+
+def test_credit_card_row_matches_model(app, user):
+    db.session.add(Debt(name='Кредитка', debt_type=DebtType.credit_card, amount=0, credit_limit=1000,
+                        current_balance=250, user_id=user.id))
+    db.session.commit()
+    model = Debt.query.one()
+    row = debt_rows(user.id)[0]
+    assert (row.remaining_amount, row.available_credit, row.utilization_rate) == (
+        model.remaining_amount, model.available_credit, model.utilization_rate)
+
+
+@pytest.mark.parametrize('url', ['/transactions', '/recurring', '/planned', '/templates', '/debts'])
+def test_list_pages_render_from_rows(app, auth_client, user, strict_loading, url):
+    _seed(user, 5)
+    auth_client.get(url)
+    app.extensions['result_cache'].clear()
+    db.session.expunge_all()
+
+    def count():
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            rv = auth_client.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert rv.status_code == 200
+        return rv, statements
+
+    rv, few = count()
+    if url != '/debts':
+        assert 'Еда' in rv.get_data(as_text=True)
+    _seed(user, 50)
+    app.extensions['result_cache'].clear()
+    db.session.expunge_all()
+    _, many = count()
+    assert len(few) == len(many)
@@ -0,0 +1,78 @@
+from datetime import datetime, date, timedelta
+
+from app import db, scheduler
+from app.models import Recurring, Transaction, TransactionType, Frequency, SchedulerWatermark, User
+
+
+def _daily_rule(user, start):
+    r = Recurring(start_date=start, next_date=start, amount=10, type=TransactionType.expense,
+                  frequency=Frequency.daily, user_id=user.id, note='coffee')
+    db.session.add(r)
+    db.session.commit()
+    return r
+
+
+def test_run_due_jobs_catches_up_missed_days(app, user):
+    today = datetime.combine(date.today(), datetime.min.time())
+    _daily_rule(user, today - timedelta(days=4))
+
+    created = scheduler.run_due_jobs()
+
+    assert created == 5
+    assert Transaction.query.filter_by(user_id=user.id).count() == 5
+    wm = SchedulerWatermark.query.filter_by(user_id=user.id).one()
+    assert wm.generated_until == today
+
+    # повторный проход за тот же день ничего не создаёт
+    assert scheduler.run_due_jobs() == 0
+
+
+def test_run_due_jobs_only_touches_stale_users(app, user):
+    today = datetime.combine(date.today(), datetime.min.time())
+    other = User(username='carol', password_hash='x')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add(SchedulerWatermark(user_id=other.id, generated_until=today))
+    db.session.commit()
+    rule = Recurring(start_date=today, next_date=today, amount=5, type=TransactionType.income,
+                     frequency=Frequency.daily, user_id=other.id)
+    db.session.add(rule)
+    db.session.commit()
+
+    scheduler.run_due_jobs()
+
+    # отметка пользователя carol уже актуальна — его правила не сканируются
+    assert Transaction.query.filter_by(user_id=other.id).count() == 0
+
+
+def test_request_does_not_rescan_current_user(auth_client, user, app):
+    today = datetime.combine(date.today(), datetime.min.time())
+    _daily_rule(user, today)
+
+    auth_client.get('/')
+    assert Transaction.query.filter_by(user_id=user.id).count() == 1
+    assert SchedulerWatermark.query.filter_by(user_id=user.id).count() == 1
+
+    # правило, добавленное в обход формы, подхватит только следующий проход планировщика
+    _daily_rule(user, today)
+    auth_client.get('/')
+    assert Transaction.query.filter_by(user_id=user.id).count() == 1
+
+
+def test_window_is_generated_once(app, user):
+    today = datetime.combine(date.today(), datetime.min.time())
+    rule = _daily_rule(user, today - timedelta(days=2))
+
+    assert scheduler.run_for_user(user.id, today) == 3
+    # второй процесс прочитал правило до commit первого: next_date у него ещё старый,
+    # но окно уже забрано — повторной генерации нет
+    rule.next_date = today - timedelta(days=2)
+    db.session.commit()
+    assert scheduler.run_for_user(user.id, today) == 0
+    assert Transaction.query.filter_by(user_id=user.id).count() == 3
+    assert SchedulerWatermark.query.filter_by(user_id=user.id).one().generated_until == today
+
+    # следующий день — новое окно
+    rule.next_date = today + timedelta(days=1)
+    db.session.commit()
+    assert scheduler.run_for_user(user.id, today + timedelta(days=1)) == 1
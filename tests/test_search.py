@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from app import db
+from app.models import Category, Transaction, TransactionType
+from app import search
+
+
+def _add(user, note, category=None, amount=10, day=1):
+    t = Transaction(date=datetime(2025, 3, day), amount=amount, type=TransactionType.expense,
+                    note=note, category_id=category.id if category else None, user_id=user.id)
+    db.session.add(t)
+    db.session.commit()
+    return t
+
+
+def _found(query):
+    qs = search.filter_query(Transaction.query, query)
+    return sorted(t.note for t in qs)
+
+
+def test_prefix_and_case_insensitive_cyrillic(app, user):
+    assert search.is_enabled()
+    _add(user, 'Продукты в Пятёрочке')
+    _add(user, 'Такси домой')
+    assert _found('пятерочк') == ['Продукты в Пятёрочке']
+    assert _found('ПРОД') == ['Продукты в Пятёрочке']
+    assert _found('такси дом') == ['Такси домой']
+    assert _found('такси продукты') == []
+
+
+def test_category_name_is_indexed_and_follows_rename(app, user):
+    cat = Category(name='Кафе', user_id=user.id)
+    db.session.add(cat)
+    db.session.commit()
+    _add(user, 'обед', category=cat)
+    assert _found('кафе') == ['обед']
+
+    cat.name = 'Рестораны'
+    db.session.commit()
+    assert _found('кафе') == []
+    assert _found('ресторан') == ['обед']
+
+
+def test_update_and_delete_keep_index_in_sync(app, user):
+    t = _add(user, 'бензин')
+    t.note = 'парковка'
+    db.session.commit()
+    assert _found('бензин') == []
+    assert _found('парковка') == ['парковка']
+
+    db.session.delete(t)
+    db.session.commit()
+    assert _found('парковка') == []
+
+
+def test_ranked_api_is_user_scoped_and_ordered(auth_client, user, app):
+    cat = Category(name='Кофе', user_id=user.id)
+    db.session.add(cat)
+    db.session.commit()
+    _add(user, 'зерно', category=cat, day=2)
+    _add(user, 'кофе с собой', day=1)
+    db.session.add(Transaction(date=datetime(2025, 3, 3), amount=1, type=TransactionType.expense,
+                               note='кофе', user_id=None))
+    db.session.commit()
+
+    data = auth_client.get('/api/transactions/search?q=коф').get_json()
+    # совпадение в примечании важнее совпадения в категории; чужая операция не видна
+    assert [t['note'] for t in data['transactions']] == ['кофе с собой', 'зерно']
+
+
+def test_transactions_page_filters_by_index(auth_client, user):
+    _add(user, 'Аптека')
+    _add(user, 'Кино')
+    html = auth_client.get('/transactions?query=апт').get_data(as_text=True)
+    assert 'Аптека' in html
+    assert 'Кино' not in html
@@ -0,0 +1,83 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models import Account, Tag, Transaction, TransactionType
+from app.series import build_series, bucket_starts
+
+
+def _tx(user, when, amount, type_=TransactionType.expense, **kw):
+    t = Transaction(date=when, amount=amount, type=type_, user_id=user.id, **kw)
+    db.session.add(t)
+    return t
+
+
+@pytest.mark.parametrize('granularity, first, count', [
+    ('day', '2024-12-30', 35),
+    ('week', '2024-12-30', 5),      # понедельник недели, в которую входит 30.12
+    ('month', '2024-12-01', 3),
+    ('quarter', '2024-10-01', 2),
+    ('year', '2024-01-01', 2),
+])
+def test_bucket_starts(granularity, first, count):
+    buckets = bucket_starts(date(2024, 12, 30), date(2025, 2, 2), granularity)
+    assert str(buckets[0]) == first
+    assert len(buckets) == count
+
+
+def test_monthly_series_is_gap_filled_in_one_query(app, user):
+    _tx(user, datetime(2021, 1, 15), 100, TransactionType.income)
+    _tx(user, datetime(2021, 1, 20), 30)
+    _tx(user, datetime(2025, 12, 31, 23), 5)
+    db.session.commit()
+    uid = user.id
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        data = build_series(uid, date(2021, 1, 1), date(2025, 12, 31), 'month')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert len(statements) == 1
+    assert len(data['buckets']) == 60
+    assert (data['income'][0], data['expense'][0], data['net'][0]) == (100, 30, 70)
+    assert data['expense'][-1] == 5
+    assert sum(data['expense']) == 35
+
+
+def test_quarter_and_week_buckets_from_transactions(app, user):
+    acc = Account(name='Карта', user_id=user.id)
+    db.session.add(acc)
+    db.session.flush()
+    _tx(user, datetime(2025, 2, 10), 10, account_id=acc.id)
+    _tx(user, datetime(2025, 3, 31), 20)
+    _tx(user, datetime(2025, 4, 1), 40)
+    db.session.commit()
+
+    q = build_series(user.id, date(2025, 1, 1), date(2025, 6, 30), 'quarter')
+    assert q['buckets'] == ['2025-01-01', '2025-04-01'] and q['expense'] == [30, 40]
+    by_account = build_series(user.id, date(2025, 1, 1), date(2025, 6, 30), 'quarter', account_id=acc.id)
+    assert by_account['expense'] == [10, 0]
+
+    w = build_series(user.id, date(2025, 3, 30), date(2025, 4, 6), 'week')
+    # 30.03.2025 — воскресенье, 31.03 и 01.04 — следующая неделя
+    assert w['buckets'] == ['2025-03-24', '2025-03-31'] and w['expense'] == [0, 60]
+
+
+def test_series_api_with_tag_filter_and_validation(auth_client, user):
+    tag = Tag(name='отпуск', user_id=user.id)
+    t = _tx(user, datetime(2025, 5, 3), 70)
+    t.tags.append(tag)
+    _tx(user, datetime(2025, 5, 4), 5)
+    db.session.commit()
+
+    data = auth_client.get(f'/api/chart/series?from=2025-05-01&to=2025-05-05&granularity=day&tag={tag.id}').get_json()
+    assert data['expense'] == [0, 0, 70, 0, 0]
+    assert len(auth_client.get('/api/chart/series').get_json()['buckets']) == 12
+    assert auth_client.get('/api/chart/series?granularity=hour').status_code == 400
+    assert auth_client.get('/api/chart/series?from=2025-02-01&to=2025-01-01').status_code == 400
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+from app import db, tracking
+from app.models import Transaction, TransactionType
+
+
+@pytest.fixture
+def seen():
+    calls = []
+    handler = tracking.on_flush(lambda session, changes: calls.append(changes))
+    yield calls
+    tracking._handlers.remove(handler)
+
+
+def test_handlers_get_old_and_new_values_per_flush(app, user, seen):
+    t = Transaction(date=datetime(2025, 3, 5), amount=100, type=TransactionType.expense, user_id=user.id)
+    db.session.add(t)
+    db.session.commit()
+    (insert,), = [c for c in seen if c]
+    assert insert.old is None and insert.new.amount == 100
+
+    seen.clear()
+    # объект expired после commit — прежнее значение всё равно известно
+    t.amount = 70
+    db.session.commit()
+    (update,), = [c for c in seen if c]
+    assert (update.old.amount, update.new.amount) == (100, 70)
+    assert list(tracking.changed([update], ('category_id', 'date'))) == []
+    assert list(tracking.changed([update], ('amount',))) == [update]
+
+    seen.clear()
+    db.session.delete(t)
+    db.session.commit()
+    (delete,), = [c for c in seen if c]
+    assert delete.old.amount == 70 and delete.new is None
+
+
+def test_rollback_forgets_old_values(app, user, seen):
+    t = Transaction(date=datetime(2025, 3, 5), amount=100, type=TransactionType.expense, user_id=user.id)
+    db.session.add(t)
+    db.session.commit()
+    seen.clear()
+    t.amount = 1
+    db.session.flush()
+    db.session.rollback()
+    # откаченная правка видна только в своём flush; после отката правка примечания изменений не даёт
+    t.note = 'x'
+    db.session.commit()
+    assert [c for c in seen if c] == [[tracking.Change(
+        tracking.Values(user.id, None, None, datetime(2025, 3, 5), TransactionType.expense, 100),
+        tracking.Values(user.id, None, None, datetime(2025, 3, 5), TransactionType.expense, 1),
+    )]]
@@ -0,0 +1,97 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+from app import db, unread
+from app.models import Debt, Notification, NotificationCounter, User
+from app.notifications import generate_all_notifications
+
+
+def _counter(owner_id):
+    return db.session.query(NotificationCounter.unread).filter_by(owner_id=owner_id).scalar() or 0
+
+
+def _notify(user_id, related_id, **kwargs):
+    n = Notification(type='t', title='t', message='m', related_id=related_id, user_id=user_id, **kwargs)
+    db.session.add(n)
+    return n
+
+
+def test_counter_follows_notification_writes(app, user):
+    other = User(username='alice', password_hash='x')
+    db.session.add(other)
+    db.session.flush()
+    a = _notify(user.id, 1)
+    _notify(user.id, 2)
+    _notify(user.id, 3, is_read=True)
+    _notify(other.id, 1)
+    _notify(None, 1)
+    db.session.commit()
+    assert (_counter(user.id), _counter(other.id), _counter(0)) == (2, 1, 1)
+
+    a.is_read = True
+    db.session.commit()
+    assert _counter(user.id) == 1
+
+    db.session.add(Debt(name='Займ', amount=10, due_date=datetime.combine(date.today(), datetime.min.time())
+                        - timedelta(days=1), user_id=user.id))
+    db.session.commit()
+    # INSERT ... SELECT в обход ORM тоже учитывается
+    generate_all_notifications()
+    assert _counter(user.id) == 2
+
+    Notification.query.filter_by(user_id=user.id, related_id=2).delete()
+    db.session.commit()
+    assert _counter(user.id) == 1
+    assert unread.count(user.id) == 1
+
+
+def test_pages_render_from_cache_and_see_writes(auth_client, user):
+    n = _notify(user.id, 1)
+    _notify(user.id, 2)
+    db.session.commit()
+    auth_client.get('/accounts')
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        rv = auth_client.get('/accounts')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert rv.status_code == 200
+    assert not [s for s in statements if 'notification' in s]
+    assert unread.count(user.id) == 2
+
+    # запись в этом процессе сбрасывает кеш после commit
+    auth_client.post(f'/notifications/read/{n.id}')
+    assert unread.count(user.id) == 1
+    auth_client.post('/notifications/read-all')
+    assert unread.count(user.id) == 0
+
+
+def test_mark_all_read_is_scoped_to_user(auth_client, user):
+    other = User(username='alice', password_hash='x')
+    db.session.add(other)
+    db.session.flush()
+    _notify(user.id, 1)
+    _notify(other.id, 1)
+    db.session.commit()
+
+    auth_client.post('/notifications/read-all')
+    assert _counter(user.id) == 0
+    assert _counter(other.id) == 1
+    assert Notification.query.filter_by(user_id=other.id, is_read=False).count() == 1
+
+
+def test_rebuild_command_recounts_existing_rows(app, user):
+    _notify(user.id, 1)
+    _notify(user.id, 2)
+    db.session.commit()
+    db.session.execute(NotificationCounter.__table__.delete())
+    db.session.commit()
+    assert _counter(user.id) == 0
+
+    result = app.test_cli_runner().invoke(args=['rebuild-unread'])
+    assert result.exit_code == 0
+    assert _counter(user.id) == 2